@@ -0,0 +1,114 @@
+"""Keeps the live check-in tabs a fixed width.
+
+TabArchiver leaves the newest `keep` period columns of a tab in place. It
+moves older ones into one archive tab per quarter ("Developers 2024-Q1"),
+matching rows by name and creating the archive tab on first use. A column
+is deleted from the live tab only after it is in its archive. A column
+already archived is overwritten rather than copied again, so a run that
+was interrupted can simply be repeated. The tab writer's lock is held
+throughout, so no check-in is written while columns shift.
+"""
+import logging
+
+from gspread import WorksheetNotFound
+from gspread.utils import absolute_range_name, rowcol_to_a1
+
+from metrics import SHEETS_ARCHIVED_COLUMNS
+from periods import parse_label, quarter
+from sheets import PRIORITY_BACKGROUND, TabIndex, column_range
+
+log = logging.getLogger(__name__)
+
+
+def archive_tab_name(tab_name, day):
+    return f"{tab_name} {quarter(day)}"
+
+
+def column_runs(cols):
+    """[(first, last), ...] for each run of consecutive column numbers, rightmost first."""
+    runs = []
+    for col in sorted(cols):
+        if runs and runs[-1][1] == col - 1:
+            runs[-1][1] = col
+        else:
+            runs.append([col, col])
+    return [tuple(run) for run in reversed(runs)]
+
+
+class TabArchiver:
+    def __init__(self, io, index, writer, keep=12):
+        self.io = io
+        self.index = index
+        self.writer = writer
+        self.keep = keep
+
+    async def archive(self, tab_name):
+        """Move the tab's old period columns to archive tabs. Returns how many were moved."""
+        if self.keep <= 0:
+            return 0
+        async with self.writer.tab(tab_name).exclusive():
+            # Work from the sheet as it is now, not from the cached layout
+            await self.index.verify(tab_name)
+            layout = self.index.cached(tab_name)
+            periods = sorted((day, col) for label, col in layout.columns.items()
+                             if (day := parse_label(label)) is not None)
+            old = periods[:-self.keep]
+            if not old:
+                return 0
+            ranges = [absolute_range_name(tab_name, "A:A")]
+            ranges += [column_range(tab_name, col) for _, col in old]
+            value_ranges = await self.io.values_batch_get(ranges, "COLUMNS", priority=PRIORITY_BACKGROUND)
+            columns = [(value_range.get("values") or [[]])[0] for value_range in value_ranges]
+            names = columns[0]
+            by_archive = {}
+            for (day, _), values in zip(old, columns[1:]):
+                by_archive.setdefault(archive_tab_name(tab_name, day), []).append(values)
+            for archive_name, archived in by_archive.items():
+                await self._copy(archive_name, names, archived)
+            for first, last in column_runs(col for _, col in old):
+                await self.io.delete_columns(tab_name, first, last, priority=PRIORITY_BACKGROUND)
+            self.index.invalidate(tab_name)
+        SHEETS_ARCHIVED_COLUMNS.inc(len(old), tab=tab_name)
+        log.info("Archived %d columns of %s into %s", len(old), tab_name, ", ".join(by_archive),
+                 extra={"tab": tab_name, "columns": len(old)})
+        return len(old)
+
+    async def _copy(self, archive_name, names, columns):
+        """Write `columns` (header first, rows aligned with `names`) into the archive tab."""
+        try:
+            await self.io.worksheet(archive_name)
+            value_ranges = await self.io.values_batch_get(
+                [absolute_range_name(archive_name, "A:A"), absolute_range_name(archive_name, "1:1")], "COLUMNS",
+                priority=PRIORITY_BACKGROUND)
+            archive_names = (value_ranges[0].get("values") or [[]])[0]
+            header = [column[0] if column else "" for column in value_ranges[1].get("values", [])]
+        except WorksheetNotFound:
+            await self.io.add_worksheet(archive_name, len(names) + 1, len(columns) + 1, priority=PRIORITY_BACKGROUND)
+            archive_names, header = [], []
+        layout = TabIndex(archive_name, archive_names, header)
+        data = []
+        if not header:
+            layout.col_count = 1
+            data.append({"range": "A1", "values": [[names[0] if names else "Name"]]})
+        rows = {}
+        for values in columns:
+            label = values[0]
+            col = layout.find_column(label)
+            if col is None:
+                col = layout.add_column(label)
+                data.append({"range": rowcol_to_a1(1, col), "values": [[label]]})
+            for row, value in enumerate(values[1:], start=2):
+                if not value:
+                    continue
+                if row not in rows:
+                    name = names[row - 1] if row <= len(names) else ""
+                    rows[row] = layout.find_row(name) if name else None
+                    if rows[row] is None:
+                        rows[row] = layout.add_row(name)
+                        if name:
+                            data.append({"range": rowcol_to_a1(rows[row], 1), "values": [[name]]})
+                data.append({"range": rowcol_to_a1(rows[row], col), "values": [[value]]})
+        if not data:
+            return
+        await self.io.ensure_size(archive_name, layout.row_count, layout.col_count, priority=PRIORITY_BACKGROUND)
+        await self.io.batch_update(archive_name, data, priority=PRIORITY_BACKGROUND)
@@ -0,0 +1,219 @@
+"""Offline benchmark for the check-in and broadcast paths.
+
+Runs the bot's real on_message, telegram_message_handler and
+send_group_checkin against the fakes in fakes.py, with the batching,
+concurrency and pacing settings from the environment, and reports for
+each roster size:
+
+  ack p50/p99    handler start until the user sees the reaction
+  sync p50/p99   message received until it is written to the sheet
+  calls/checkin  Sheets, Discord and Telegram API calls per check-in
+  broadcast      check-in DMs sent per second by /developer_checkin
+
+Usage:
+    python bench.py --sizes 10 50 200 --sheets-latency 0.2 --history 26
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from fakes import (FakeDiscordAPI, FakeDiscordClient, FakeDiscordUser, FakeInteraction, FakeSpreadsheet,
+                   FakeTelegramBot, OfflineBot, telegram_update)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+class World:
+    """Fake backends and a roster of `size` members per group, half on each platform."""
+
+    def __init__(self, bot, size, args):
+        self.spreadsheet = FakeSpreadsheet(latency=args.sheets_latency, quota_per_minute=args.sheets_quota)
+        self.discord_api = FakeDiscordAPI(latency=args.discord_latency, rate_per_second=args.discord_rate)
+        self.telegram_bot = FakeTelegramBot(latency=args.telegram_latency, rate_per_second=args.telegram_rate)
+        self.discord_users = []
+        self.telegram_users = []
+        self.groups = {}
+        today = datetime.now()
+        periods = [(today - timedelta(weeks=w)).strftime("%Y-%m-%d") for w in range(args.history, 0, -1)]
+        for g, (group_key, tab) in enumerate(bot.GROUP_TABS.items()):
+            discord_members = [FakeDiscordUser(self.discord_api, 10_000 * (g + 1) + i, f"{group_key}-d{i}")
+                               for i in range(size - size // 2)]
+            telegram_members = [(1_000_000 * (g + 1) + i, f"{group_key}_t{i}") for i in range(size // 2)]
+            self.discord_users += [(tab, user) for user in discord_members]
+            self.telegram_users += [(tab, tg_id, name) for tg_id, name in telegram_members]
+            self.groups[group_key] = {
+                "discord": [user.id for user in discord_members],
+                "telegram": [{"id": tg_id, "username": name} for tg_id, name in telegram_members],
+            }
+            names = [user.name for user in discord_members] + [f"telegram:{name}" for _, name in telegram_members]
+            self.spreadsheet.add_tab(tab, names, periods)
+        self.client = FakeDiscordClient(self.discord_api, [user for _, user in self.discord_users])
+
+
+async def run_checkins(bot, harness, world, arrival_rate):
+    received = {}
+    acks = []
+
+    async def one(handler, text):
+        start = time.monotonic()
+        received[text] = start
+        await handler()
+        acks.append(time.monotonic() - start)
+
+    tasks = []
+    for i, (_, user) in enumerate(world.discord_users):
+        text = f"discord check-in {i}: shipped the thing"
+        tasks.append((lambda m=user.dm(text): bot.on_message(m), text))
+    for i, (_, tg_id, name) in enumerate(world.telegram_users):
+        text = f"telegram check-in {i}: shipped the thing"
+        update, context = telegram_update(world.telegram_bot, tg_id, name, text)
+        tasks.append((lambda u=update, c=context: bot.telegram_message_handler(u, c), text))
+
+    calls_before = world.spreadsheet.calls.total()
+    harness.start()
+    running = []
+    for handler, text in tasks:
+        running.append(asyncio.create_task(one(handler, text)))
+        if arrival_rate:
+            await asyncio.sleep(1.0 / arrival_rate)
+    await asyncio.gather(*running)
+    await harness.drain()
+
+    written = {}
+    for sheet in world.spreadsheet.tabs.values():
+        for at, _, _, value in sheet.writes:
+            for line in value.split("\n"):
+                if line in received and line not in written:
+                    written[line] = at
+    syncs = [written[text] - received[text] for text in written]
+    return {
+        "checkins": len(tasks),
+        "ack_p50_ms": percentile(acks, 50) * 1000,
+        "ack_p99_ms": percentile(acks, 99) * 1000,
+        "sync_p50_ms": percentile(syncs, 50) * 1000,
+        "sync_p99_ms": percentile(syncs, 99) * 1000,
+        "unsynced": len(tasks) - len(written),
+        "sheets_calls": world.spreadsheet.calls.total() - calls_before,
+    }
+
+
+async def run_broadcast(bot, world, group_key):
+    admin = FakeDiscordUser(world.discord_api, 2, "admin")
+    interaction = FakeInteraction(world.discord_api, admin)
+    before = world.discord_api.calls.counts["send_message"] + world.telegram_bot.calls.counts["send_message"]
+    start = time.monotonic()
+    await bot.send_group_checkin(interaction, group_key, "Check-in sent.")
+    elapsed = time.monotonic() - start
+    sent = world.discord_api.calls.counts["send_message"] + world.telegram_bot.calls.counts["send_message"] - before
+    recipients = len(bot.group_recipients(group_key))
+    return {
+        "broadcast_recipients": recipients,
+        "broadcast_seconds": elapsed,
+        "broadcast_per_second": recipients / elapsed if elapsed else 0.0,
+        "broadcast_send_attempts": sent,
+        "broadcast_report": interaction.followup.messages[-1].content,
+    }
+
+
+def bench_size(bot, size, args):
+    world = World(bot, size, args)
+    with tempfile.TemporaryDirectory() as workdir:
+        with OfflineBot(bot, workdir, world.spreadsheet, world.client, world.telegram_bot, world.groups,
+                        flush_interval=args.flush_interval) as harness:
+            async def scenario():
+                try:
+                    result = await run_checkins(bot, harness, world, args.arrival_rate)
+                    discord_calls = world.discord_api.calls.total()
+                    telegram_calls = world.telegram_bot.calls.total()
+                    result["discord_calls"] = discord_calls
+                    result["telegram_calls"] = telegram_calls
+                    result.update(await run_broadcast(bot, world, "developers"))
+                    return result
+                finally:
+                    await harness.stop()
+
+            result = asyncio.run(scenario())
+    result["size"] = size
+    result["sheet_rows"] = size + 1
+    result["sheet_columns"] = args.history + 1
+    n = result["checkins"]
+    result["calls_per_checkin"] = {
+        "sheets": result["sheets_calls"] / n,
+        "discord": result["discord_calls"] / n,
+        "telegram": result["telegram_calls"] / n,
+    }
+    return result
+
+
+def print_table(results, out):
+    header = (f"{'size':>6} {'checkins':>8} {'ack p50':>9} {'ack p99':>9} {'sync p50':>9} {'sync p99':>9} "
+              f"{'sheets/ci':>9} {'dc/ci':>6} {'tg/ci':>6} {'bcast/s':>8}")
+    print(header, file=out)
+    for r in results:
+        calls = r["calls_per_checkin"]
+        print(f"{r['size']:>6} {r['checkins']:>8} {r['ack_p50_ms']:>7.1f}ms {r['ack_p99_ms']:>7.1f}ms "
+              f"{r['sync_p50_ms']:>7.0f}ms {r['sync_p99_ms']:>7.0f}ms {calls['sheets']:>9.3f} "
+              f"{calls['discord']:>6.2f} {calls['telegram']:>6.2f} {r['broadcast_per_second']:>8.1f}", file=out)
+        if r["unsynced"]:
+            print(f"       {r['unsynced']} check-ins never reached the sheet", file=out)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200], help="members per group")
+    parser.add_argument("--history", type=int, default=12, help="past period columns already in each tab")
+    parser.add_argument("--arrival-rate", type=float, default=50.0, help="check-ins per second (0 = all at once)")
+    parser.add_argument("--flush-interval", type=float, default=None, help="override SHEET_FLUSH_INTERVAL")
+    parser.add_argument("--sheets-latency", type=float, default=0.15, help="seconds per Sheets call")
+    parser.add_argument("--sheets-quota", type=int, default=300, help="Sheets calls per minute before 429s")
+    parser.add_argument("--discord-latency", type=float, default=0.05)
+    parser.add_argument("--discord-rate", type=float, default=50, help="Discord calls per second before 429s")
+    parser.add_argument("--telegram-latency", type=float, default=0.05)
+    parser.add_argument("--telegram-rate", type=float, default=30, help="Telegram calls per second before 429s")
+    parser.add_argument("--json", metavar="PATH", help="also write the raw results to PATH")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's own log output")
+    parser.add_argument("--log-level", default="INFO", help="log level with --verbose")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The bot module builds its Telegram application at import time and needs a well-formed token
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:offline-benchmark")
+    import bot
+    from logs import setup_logging, stop_logging
+
+    # With --verbose the bot logs through its usual queued pipeline, so logging cost is part of the numbers
+    listener = setup_logging(level=args.log_level.upper(), fmt="text") if args.verbose else None
+    if listener is None:
+        logging.disable(logging.ERROR)
+    results = []
+    try:
+        for size in args.sizes:
+            results.append(bench_size(bot, size, args))
+            print(f"size {size}: done", file=sys.stderr)
+    finally:
+        if listener is not None:
+            stop_logging(listener)
+    print_table(results, sys.stdout)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
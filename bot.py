@@ -4,106 +4,193 @@ from discord.ext import commands, tasks
 from discord import app_commands
 from datetime import datetime, timedelta
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 import asyncio
-import json
+import io
+import logging
+import secrets
+import time
 from dotenv import load_dotenv
 from typing import Literal
 # --- Telegram imports ---
 from telegram import Update, Bot as TelegramBot
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from archive import TabArchiver
+from broadcast import BroadcastEngine, PlatformLane, Recipient, format_report
+from command_sync import CommandSync
+from discord_users import MemberDirectory, UserResolver
+from ipc import WakeSocket
+from journal import CheckinJournal, JournalSyncer
+from logs import setup_logging, stop_logging
+from membership import MembershipRegistry, validate_groups, validate_telegram_users
+from periods import CheckinPeriods
+from reminders import Reminders
+from report import CheckinReporter, Member
+from metrics import (REGISTRY, CHECKINS, CHECKIN_ACK_SECONDS, CHECKIN_SYNC_SECONDS, REACTION_SECONDS,
+                     SHEETS_WRITER_QUEUE, EVENT_LOOP_TASKS, monitor_event_loop_lag, start_metrics_server)
+from state_store import JsonStateStore, StateWatcher
+from telegram_webhook import TelegramWebhook
+from scheduler import CheckinScheduler
+from sheets import SheetSession, SheetsIO, SheetsQuota, SheetIndex, SheetWriter, CheckinLayoutError, SHEET_NAME
+
+# Load environment variables
+load_dotenv()
+
+log = logging.getLogger("bot")
+discord_log = logging.getLogger("bot.discord")
+telegram_log = logging.getLogger("bot.telegram")
 
 GROUPS_FILE = "groups.json"
 AUTHORIZED_USERS_FILE = "authorized_users.json"
+TELEGRAM_USERS_FILE = "telegram_users.json"
+CHECKIN_MESSAGES_FILE = "checkin_messages.json"
+
+# State files are written atomically, off the event loop, at most once per STATE_WRITE_DELAY seconds.
+# With STATE_CHANGELOG enabled, roster edits append to a .log file instead of rewriting the whole file.
+STATE_WRITE_DELAY = float(os.getenv("STATE_WRITE_DELAY", "0.5"))
+STATE_CHANGELOG = os.getenv("STATE_CHANGELOG", "").lower() in ("true", "1", "yes")
+authorized_users_store = JsonStateStore(AUTHORIZED_USERS_FILE, delay=STATE_WRITE_DELAY)
+groups_store = JsonStateStore(GROUPS_FILE, delay=STATE_WRITE_DELAY, changelog=STATE_CHANGELOG, indent=2)
+telegram_users_store = JsonStateStore(TELEGRAM_USERS_FILE, delay=STATE_WRITE_DELAY, changelog=STATE_CHANGELOG, indent=2)
+checkin_messages_store = JsonStateStore(CHECKIN_MESSAGES_FILE, delay=STATE_WRITE_DELAY)
 
 def load_authorized_users():
-    if os.path.exists(AUTHORIZED_USERS_FILE):
-        with open(AUTHORIZED_USERS_FILE, "r") as f:
-            data = json.load(f)
-            return data.get("users", [])
-    return []
+    return authorized_users_store.load({}).get("users", [])
 
 def save_authorized_users(users):
-    with open(AUTHORIZED_USERS_FILE, "w") as f:
-        json.dump({"users": users}, f)
+    authorized_users_store.save({"users": users})
 
 authorized_users = load_authorized_users()
 
 # --- Group Handling: Support Discord and Telegram users as objects ---
 def load_groups():
-    if os.path.exists(GROUPS_FILE):
-        with open(GROUPS_FILE, "r") as f:
-            data = json.load(f)
-            # Ensure both Discord and Telegram lists exist
-            for group in ["product_managers", "developers"]:
-                if group not in data:
-                    data[group] = {"discord": [], "telegram": []}
-                else:
-                    if "discord" not in data[group]:
-                        data[group]["discord"] = []
-                    if "telegram" not in data[group]:
-                        data[group]["telegram"] = []
-            return data
-    # Default structure
-    return {
-        "product_managers": {"discord": [], "telegram": []},
-        "developers": {"discord": [], "telegram": []}
-    }
-
-def save_groups(groups):
-    with open(GROUPS_FILE, "w") as f:
-        json.dump(groups, f, indent=2)
+    data = groups_store.load({})
+    # Ensure both Discord and Telegram lists exist
+    for group in ["product_managers", "developers"]:
+        if group not in data:
+            data[group] = {"discord": [], "telegram": []}
+        else:
+            if "discord" not in data[group]:
+                data[group]["discord"] = []
+            if "telegram" not in data[group]:
+                data[group]["telegram"] = []
+    return data
+
+def save_groups(groups, change=None):
+    groups_store.save(groups, change)
 
 # --- Telegram user mapping ---
-TELEGRAM_USERS_FILE = "telegram_users.json"
 def load_telegram_users():
-    if os.path.exists(TELEGRAM_USERS_FILE):
-        with open(TELEGRAM_USERS_FILE, "r") as f:
-            return json.load(f)
-    return {}
-def save_telegram_users(users):
-    with open(TELEGRAM_USERS_FILE, "w") as f:
-        json.dump(users, f, indent=2)
+    return telegram_users_store.load({})
+def save_telegram_users(users, change=None):
+    telegram_users_store.save(users, change)
 telegram_users = load_telegram_users()
 
-# Load environment variables
-load_dotenv()
-
 DISCORD_BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN")
 GUILD_ID = os.getenv("DISCORD_GUILD_ID")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
+# BOT_ROLE=all runs everything in one process. Otherwise run one process each with discord, telegram and
+# sheets (the worker that copies journaled check-ins to Google Sheets); they share the journal and state files.
+BOT_ROLES = ("all", "discord", "telegram", "sheets")
+BOT_ROLE = os.getenv("BOT_ROLE", "all").lower()
+if BOT_ROLE not in BOT_ROLES:
+    raise ValueError(f"BOT_ROLE must be one of {', '.join(BOT_ROLES)}, not {BOT_ROLE!r}")
+
+def runs(role):
+    return BOT_ROLE in ("all", role)
+
 # --- Load groups structure ---
 groups = load_groups()
+# Hashed indexes over groups and telegram_users; all membership changes go through it
+membership = MembershipRegistry(groups, telegram_users)
 
 # Persistent check-in messages
-CHECKIN_MESSAGES_FILE = "checkin_messages.json"
 def load_checkin_messages():
-    import json
-    if os.path.exists(CHECKIN_MESSAGES_FILE):
-        with open(CHECKIN_MESSAGES_FILE, "r") as f:
-            return json.load(f)
-    return {
+    return checkin_messages_store.load({
         "product_managers": "Hey Product Managers! Please provide your weekly update:",
         "developers": "Hey Developers! Please share your weekly progress:"
-    }
+    })
 def save_checkin_messages():
-    import json
-    with open(CHECKIN_MESSAGES_FILE, "w") as f:
-        json.dump(checkin_messages, f)
+    checkin_messages_store.save(checkin_messages)
+
+def flush_state_sync():
+    for store in (authorized_users_store, groups_store, telegram_users_store, checkin_messages_store):
+        store.flush_sync()
+
+async def flush_state():
+    for store in (authorized_users_store, groups_store, telegram_users_store, checkin_messages_store):
+        await store.flush()
 
 checkin_messages = load_checkin_messages()
 
-# Google Sheets setup using env variables
-SHEET_NAME = "Weekly Checkins"
+def validate_authorized_users(users):
+    if not isinstance(users, list) or not all(isinstance(u, int) and not isinstance(u, bool) for u in users):
+        raise ValueError("users must be a list of numeric Discord ids")
+    return users
+
+def validate_checkin_messages(messages):
+    if not isinstance(messages, dict):
+        raise ValueError("check-in messages must be a JSON object")
+    for group_key in ("product_managers", "developers"):
+        if not isinstance(messages.get(group_key), str) or not messages[group_key].strip():
+            raise ValueError(f"missing check-in message for {group_key}")
+    return messages
+
+# Swapped in place, so everything holding these objects sees the new contents
+def replace_groups(data):
+    groups.clear()
+    groups.update(data)
+    membership.rebuild()
+
+def replace_telegram_users(data):
+    telegram_users.clear()
+    telegram_users.update(data)
+    membership.rebuild()
+
+def replace_authorized_users(users):
+    authorized_users[:] = users
+
+def replace_checkin_messages(messages):
+    checkin_messages.clear()
+    checkin_messages.update(messages)
+
+# State files edited by hand, or by another process in split mode, are reloaded once they validate
+state_watcher = StateWatcher()
+state_watcher.watch(groups_store, lambda: validate_groups(load_groups()), replace_groups)
+state_watcher.watch(telegram_users_store, lambda: validate_telegram_users(load_telegram_users()),
+                    replace_telegram_users)
+state_watcher.watch(authorized_users_store, lambda: validate_authorized_users(load_authorized_users()),
+                    replace_authorized_users)
+state_watcher.watch(checkin_messages_store, lambda: validate_checkin_messages(load_checkin_messages()),
+                    replace_checkin_messages)
+
+@tasks.loop(seconds=float(os.getenv("STATE_WATCH_INTERVAL", "2")))
+async def watch_state_files():
+    await state_watcher.check()
+
+# Google Sheets tabs
 SHEET_PM_TAB = "Product Managers"
 SHEET_DEV_TAB = "Developers"
+GROUP_TABS = {"product_managers": SHEET_PM_TAB, "developers": SHEET_DEV_TAB}
 
 intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 tree = bot.tree
+# Slash commands are synced only when they change, to COMMAND_SYNC_SCOPE: "global", or "guild" (visible at once)
+COMMAND_SYNC_FILE = os.getenv("COMMAND_SYNC_FILE", "command_sync.json")
+command_sync = CommandSync(tree, JsonStateStore(COMMAND_SYNC_FILE, delay=STATE_WRITE_DELAY),
+                           scope=os.getenv("COMMAND_SYNC_SCOPE", "global"), guild_id=GUILD_ID)
+# Guild members indexed by username, display name and legacy tag for add/remove and autocomplete
+member_directory = MemberDirectory()
+# Discord user lookups: gateway cache, then a TTL/LRU cache, then the API
+user_resolver = UserResolver(
+    bot,
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "2000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "3600")),
+    concurrency=int(os.getenv("USER_FETCH_CONCURRENCY", "5")),
+)
 
 # --- Telegram bot setup ---
 telegram_bot = TelegramBot(token=TELEGRAM_BOT_TOKEN)
@@ -120,61 +207,32 @@ telegram_app = Application.builder().token(TELEGRAM_BOT_TOKEN).request(request).
 
 # --- Telegram message handler for check-ins ---
 async def telegram_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    received = time.perf_counter()
     user = update.effective_user
     tg_id = user.id
     text = update.message.text
-    print(f"[TELEGRAM CHECKIN] Received from {tg_id} (@{user.username}): {text}")
+    telegram_log.debug("Check-in received: %s", text, extra={"user_id": tg_id, "username": user.username})
     # No auto-registration here
     # Find group membership (now objects)
-    tab = None
-    user_obj_pm = next((u for u in groups["product_managers"]["telegram"] if u["id"] == tg_id), None)
-    user_obj_dev = next((u for u in groups["developers"]["telegram"] if u["id"] == tg_id), None)
-    if user_obj_pm:
-        tab = SHEET_PM_TAB
-        username = f"telegram:{user.username or tg_id}"
-    elif user_obj_dev:
-        tab = SHEET_DEV_TAB
+    tab = GROUP_TABS.get(membership.telegram_group(tg_id))
+    if tab:
         username = f"telegram:{user.username or tg_id}"
     else:
         await context.bot.send_message(chat_id=tg_id, text="You are not in a group.")
-        print(f"[TELEGRAM CHECKIN] User {tg_id} not in any group.")
+        telegram_log.info("Check-in from user not in any group", extra={"user_id": tg_id})
         return
     try:
-        sheet = get_gsheet(tab)
         week_str = get_week_str()
-        print(f"[TELEGRAM CHECKIN] Recording for {username} in {tab} at {week_str}")
-        # Find row for user
-        cell = sheet.find(username)
-        if not cell:
-            print(f"[TELEGRAM CHECKIN] Username {username} not found in sheet {tab}, adding new row.")
-            # Find first empty row
-            rows = sheet.get_all_values()
-            row = len(rows) + 1
-            # Insert username in first column
-            sheet.update_cell(row, 1, username)
-        else:
-            row = cell.row
-        # Find column for week
-        week_cell = sheet.find(week_str)
-        if not week_cell:
-            print(f"[TELEGRAM CHECKIN] Week {week_str} not found in sheet {tab}, adding new column.")
-            # Get all values to determine where to add the new column
-            values = sheet.get_all_values()
-            header = values[0] if values else []
-            col = len(header) + 1
-            sheet.update_cell(1, col, week_str)
-        else:
-            col = week_cell.col
-        existing = sheet.cell(row, col).value
-        if existing:
-            new_value = existing + "\n" + text
-        else:
-            new_value = text
-        sheet.update_cell(row, col, new_value)
+        entry_id = await checkin_journal.append("telegram", tg_id, tab, [username], username, week_str, text)
+        checkin_journaled()
+        CHECKINS.inc(platform="telegram", tab=tab)
+        telegram_log.info("Journaled check-in %s for %s", entry_id, username,
+                          extra={"entry_id": entry_id, "user_id": tg_id, "tab": tab, "period": week_str})
         # React to the user's message with the 👌 emoji using set_message_reaction (python-telegram-bot v20+)
         from telegram import ReactionTypeEmoji
         reacted = False
         for emoji in ["👌", "👀"]:
+            start = time.perf_counter()
             try:
                 await context.bot.set_message_reaction(
                     chat_id=update.effective_message.chat_id,
@@ -182,19 +240,21 @@ async def telegram_message_handler(update: Update, context: ContextTypes.DEFAULT
                     reaction=[ReactionTypeEmoji(emoji)],
                     is_big=False
                 )
+                REACTION_SECONDS.observe(time.perf_counter() - start, platform="telegram", outcome="ok")
                 reacted = True
                 break
             except Exception as e:
-                print(f"[TELEGRAM CHECKIN] Failed to react with {emoji}: {e}")
+                REACTION_SECONDS.observe(time.perf_counter() - start, platform="telegram", outcome="error")
+                telegram_log.warning("Failed to react with %s: %s", emoji, e, extra={"user_id": tg_id})
                 continue
         if not reacted:
             try:
                 await update.message.reply_text("Check-in recorded!")
             except Exception:
                 pass
-        print(f"[TELEGRAM CHECKIN] Successfully recorded check-in for {username} in {tab}")
-    except Exception as e:
-        print(f"[TELEGRAM CHECKIN] Failed to record check-in for {username}: {e}")
+        CHECKIN_ACK_SECONDS.observe(time.perf_counter() - received, platform="telegram")
+    except Exception:
+        telegram_log.exception("Failed to record check-in for %s", username, extra={"user_id": tg_id})
         try:
             await update.message.reply_text("There was an error recording your check-in. Please contact the admin.")
         except Exception:
@@ -206,18 +266,16 @@ async def telegram_register_handler(update: Update, context: ContextTypes.DEFAUL
     tg_id = user.id
     username = user.username
     global telegram_users
-    print(f"[TELEGRAM REGISTER] User: {username}, ID: {tg_id}")
+    telegram_log.info("Register request from @%s", username, extra={"user_id": tg_id})
     if not username:
-        print(f"[TELEGRAM REGISTER] User {tg_id} has no username set.")
+        telegram_log.info("Register request without a username", extra={"user_id": tg_id})
         await context.bot.send_message(chat_id=tg_id, text="You must set a Telegram username in your profile to register with the bot.")
         return
-    telegram_users[str(tg_id)] = username
-    save_telegram_users(telegram_users)
+    save_telegram_users(telegram_users, membership.register_telegram(tg_id, username))
     try:
-        print(f"[TELEGRAM REGISTER] Sending confirmation to {tg_id} (@{username})")
         await context.bot.send_message(chat_id=tg_id, text=f"Registered! Username: @{username}, ID: {tg_id}")
     except Exception as e:
-        print(f"[TELEGRAM REGISTER] Failed to send confirmation to {tg_id}: {e}")
+        telegram_log.warning("Failed to send register confirmation: %s", e, extra={"user_id": tg_id})
 
 # Register /register command for Telegram
 from telegram.ext import CommandHandler, MessageHandler, filters
@@ -225,33 +283,268 @@ telegram_app.add_handler(CommandHandler("register", telegram_register_handler))
 # Register message handler for Telegram check-ins (non-command messages)
 telegram_app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, telegram_message_handler))
 
+# TELEGRAM_MODE=polling (default) or webhook. In webhook mode Telegram POSTs updates to TELEGRAM_WEBHOOK_URL, which
+# should reach TELEGRAM_WEBHOOK_HOST:TELEGRAM_WEBHOOK_PORT. Without TELEGRAM_WEBHOOK_SECRET one is generated once
+# and kept in TELEGRAM_WEBHOOK_FILE, so every start and every process checks for the secret Telegram was given.
+TELEGRAM_MODE = os.getenv("TELEGRAM_MODE", "polling").lower()
+if TELEGRAM_MODE not in ("polling", "webhook"):
+    raise ValueError(f"TELEGRAM_MODE must be polling or webhook, not {TELEGRAM_MODE!r}")
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+if TELEGRAM_MODE == "webhook" and runs("telegram") and not TELEGRAM_WEBHOOK_URL:
+    raise ValueError("TELEGRAM_MODE=webhook needs TELEGRAM_WEBHOOK_URL, the public URL Telegram should send updates to")
+TELEGRAM_WEBHOOK_FILE = os.getenv("TELEGRAM_WEBHOOK_FILE", "telegram_webhook.json")
+
+def load_webhook_secret(path=TELEGRAM_WEBHOOK_FILE):
+    secret = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+    if secret or TELEGRAM_MODE != "webhook":
+        return secret
+    store = JsonStateStore(path)
+    data = store.load({})
+    if not data.get("secret"):
+        data["secret"] = secrets.token_urlsafe(32)
+        # No event loop yet, so this writes straight away
+        store.save(data)
+    return data["secret"]
+
+telegram_webhook = TelegramWebhook(
+    telegram_app,
+    secret=load_webhook_secret(),
+    host=os.getenv("TELEGRAM_WEBHOOK_HOST", "127.0.0.1"),
+    port=int(os.getenv("TELEGRAM_WEBHOOK_PORT", "8443")),
+    path=os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram"),
+    concurrency=int(os.getenv("TELEGRAM_WEBHOOK_CONCURRENCY", "8")),
+)
+
 # Helper: Get week string
 
+# Check-ins go in one column per period: CHECKIN_PERIOD=weekly (weeks starting on CHECKIN_WEEK_START) or daily.
+# Columns are labelled with the period's first day.
+checkin_periods = CheckinPeriods(os.getenv("CHECKIN_PERIOD", "weekly"), os.getenv("CHECKIN_WEEK_START", "monday"))
+
 def get_week_str():
-    today = datetime.now()
-    return today.strftime("%Y-%m-%d")
+    return checkin_periods.label()
 
 # Google Sheets Helper
 
+# One authorized client and spreadsheet handle shared by every check-in
+sheet_session = SheetSession(spreadsheet_key=os.getenv("GOOGLE_SHEET_ID"), spreadsheet_name=SHEET_NAME)
+
 def get_gsheet(tab_name):
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    creds_dict = {
-        "type": os.getenv("GOOGLE_TYPE"),
-        "project_id": os.getenv("GOOGLE_PROJECT_ID"),
-        "private_key_id": os.getenv("GOOGLE_PRIVATE_KEY_ID"),
-        "private_key": os.getenv("GOOGLE_PRIVATE_KEY").replace('\\n', '\n'),
-        "client_email": os.getenv("GOOGLE_CLIENT_EMAIL"),
-        "client_id": os.getenv("GOOGLE_CLIENT_ID"),
-        "auth_uri": os.getenv("GOOGLE_AUTH_URI"),
-        "token_uri": os.getenv("GOOGLE_TOKEN_URI"),
-        "auth_provider_x509_cert_url": os.getenv("GOOGLE_AUTH_PROVIDER_X509_CERT_URL"),
-        "client_x509_cert_url": os.getenv("GOOGLE_CLIENT_X509_CERT_URL"),
-        "universe_domain": os.getenv("GOOGLE_UNIVERSE_DOMAIN")
-    }
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    client = gspread.authorize(creds)
-    sheet = client.open(SHEET_NAME).worksheet(tab_name)
-    return sheet
+    return sheet_session.worksheet(tab_name)
+
+# Processes sharing a Google project each keep to SHEETS_QUOTA_SHARE of the budget. Reports come from the journal,
+# so in split mode only the sheets process calls Sheets and by default it has the whole budget.
+SHEETS_QUOTA_SHARE = float(os.getenv("SHEETS_QUOTA_SHARE", "1"))
+
+# All blocking gspread calls from coroutines go through this pool, within Google's per-minute quotas
+sheets_io = SheetsIO(
+    sheet_session,
+    max_workers=int(os.getenv("SHEETS_MAX_CONCURRENCY", "4")),
+    timeout=float(os.getenv("SHEETS_CALL_TIMEOUT", "30")),
+    quota=SheetsQuota(
+        reads_per_minute=float(os.getenv("SHEETS_READS_PER_MINUTE", "60")),
+        writes_per_minute=float(os.getenv("SHEETS_WRITES_PER_MINUTE", "60")),
+        burst=int(os.getenv("SHEETS_QUOTA_BURST", "10")),
+    ).share(SHEETS_QUOTA_SHARE),
+    quota_retries=int(os.getenv("SHEETS_QUOTA_RETRIES", "5")),
+)
+
+# Row/column layout of each tab, so a check-in is a single targeted write
+sheet_index = SheetIndex(sheets_io)
+SHEET_INDEX_VERIFY_MINUTES = float(os.getenv("SHEET_INDEX_VERIFY_MINUTES", "15"))
+
+def forget_tab(tab_name):
+    """Drop cached worksheet and index state for a tab (or all tabs when None)."""
+    sheet_session.invalidate(tab_name)
+    sheet_index.invalidate(tab_name)
+
+# Single writer per tab: check-ins are merged into one batch_update per flush
+sheet_writer = SheetWriter(
+    sheets_io,
+    sheet_index,
+    flush_interval=float(os.getenv("SHEET_FLUSH_INTERVAL", "1.0")),
+    max_batch=int(os.getenv("SHEET_FLUSH_MAX_BATCH", "50")),
+)
+
+# Only the newest CHECKIN_LIVE_PERIODS period columns stay in each tab; older ones move to "<tab> <year>-Q<n>"
+# archive tabs every ARCHIVE_CHECK_HOURS. 0 keeps everything in the live tab.
+CHECKIN_LIVE_PERIODS = int(os.getenv("CHECKIN_LIVE_PERIODS", "12"))
+sheet_archiver = TabArchiver(sheets_io, sheet_index, sheet_writer, keep=CHECKIN_LIVE_PERIODS)
+
+async def record_checkin(tab_name, names, display_name, period, text, replace=False):
+    """Append `text` to the user's cell for `period`, adding the user row or period column if needed.
+
+    With `replace`, `text` becomes the cell's whole value instead.
+
+    `names` are the spellings the user may already be listed under in column A;
+    `display_name` is what gets written for a new row. Returns (row, col) once written.
+    """
+    return await sheet_writer.submit(tab_name, names, display_name, period, text, replace)
+
+# Check-ins are journaled locally and acknowledged right away. The journal is the record and the sheet a read-only
+# projection of it: each user's cell is overwritten with their journaled messages for the period, in the row found
+# under any name they have checked in with, so a rename doesn't start a new row.
+CHECKIN_JOURNAL_FILE = os.getenv("CHECKIN_JOURNAL_FILE", "checkin_journal.db")
+checkin_journal = CheckinJournal(CHECKIN_JOURNAL_FILE)
+
+async def deliver_checkin(entry):
+    try:
+        messages = await checkin_journal.cell_messages(entry.tab, entry.period, entry.platform, entry.user_id)
+        names = await checkin_journal.user_names(entry.tab, entry.platform, entry.user_id)
+        placement = await record_checkin(entry.tab, names, entry.display_name, entry.period, "\n".join(messages),
+                                         replace=True)
+        CHECKIN_SYNC_SECONDS.observe(time.time() - entry.received_at, tab=entry.tab)
+        return placement
+    except gspread.SpreadsheetNotFound:
+        forget_tab(None)
+        raise
+    except gspread.exceptions.GSpreadException:
+        # The tab may have been renamed or deleted, reopen it on the next attempt
+        forget_tab(entry.tab)
+        raise
+
+journal_syncer = JournalSyncer(
+    checkin_journal,
+    deliver_checkin,
+    poll_interval=float(os.getenv("JOURNAL_SYNC_INTERVAL", "5")),
+    permanent_errors=(CheckinLayoutError,),
+    # A sender's messages wait until they've been quiet this long, so a burst becomes one cell write,
+    # but never longer than CHECKIN_COALESCE_MAX_SECONDS after the first of them
+    quiet=float(os.getenv("CHECKIN_COALESCE_SECONDS", "5")),
+    max_hold=float(os.getenv("CHECKIN_COALESCE_MAX_SECONDS", "60")),
+)
+
+# In split mode the front-ends wake the sheets process's syncer through a Unix socket
+journal_wakeup = WakeSocket(os.getenv("JOURNAL_WAKE_SOCKET", CHECKIN_JOURNAL_FILE + ".wake"))
+
+def checkin_journaled():
+    if BOT_ROLE == "all":
+        journal_syncer.wake()
+    else:
+        journal_wakeup.notify()
+
+@tasks.loop(minutes=SHEET_INDEX_VERIFY_MINUTES)
+async def verify_sheet_indexes():
+    for tab_name in sheet_index.tabs():
+        try:
+            await sheet_index.verify(tab_name)
+        except Exception as e:
+            log.warning("Failed to verify sheet index for %s: %s", tab_name, e)
+            forget_tab(tab_name)
+
+@tasks.loop(hours=float(os.getenv("ARCHIVE_CHECK_HOURS", "6")))
+async def archive_old_periods():
+    for tab_name in GROUP_TABS.values():
+        try:
+            await sheet_archiver.archive(tab_name)
+        except Exception:
+            log.exception("Archiving old columns of %s failed", tab_name)
+            forget_tab(tab_name)
+
+SHEET_TOKEN_REFRESH_MINUTES = float(os.getenv("SHEET_TOKEN_REFRESH_MINUTES", "5"))
+
+@tasks.loop(minutes=SHEET_TOKEN_REFRESH_MINUTES)
+async def refresh_sheet_token():
+    try:
+        await sheets_io.run(sheet_session.refresh_token)
+    except Exception as e:
+        log.warning("Sheets token refresh failed: %s", e)
+
+# Prometheus-format metrics on http://METRICS_HOST:METRICS_PORT/metrics; an empty or 0 port turns it off
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108") or 0)
+metrics_runner = None
+event_loop_monitor = None
+
+SHEETS_WRITER_QUEUE.set_function(lambda: {(tab,): depth for tab, depth in sheet_writer.queue_depths().items()})
+
+async def start_metrics():
+    global metrics_runner, event_loop_monitor
+    loop = asyncio.get_running_loop()
+    EVENT_LOOP_TASKS.set_function(lambda: len(asyncio.all_tasks(loop)))
+    if event_loop_monitor is None:
+        event_loop_monitor = asyncio.create_task(monitor_event_loop_lag(), name="event-loop-lag")
+    if METRICS_PORT and metrics_runner is None:
+        try:
+            metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+            log.info("Serving metrics on http://%s:%s/metrics", METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            log.error("Could not start metrics endpoint: %s", e)
+
+async def stop_metrics():
+    global metrics_runner, event_loop_monitor
+    if event_loop_monitor is not None:
+        event_loop_monitor.cancel()
+        event_loop_monitor = None
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+        metrics_runner = None
+
+async def start_background_services():
+    await start_metrics()
+    if not watch_state_files.is_running():
+        watch_state_files.start()
+    # Discord reads Sheets for reports, the sheets worker writes check-ins
+    if (runs("discord") or runs("sheets")) and not refresh_sheet_token.is_running():
+        refresh_sheet_token.start()
+    if runs("sheets"):
+        if not verify_sheet_indexes.is_running():
+            verify_sheet_indexes.start()
+        if CHECKIN_LIVE_PERIODS > 0 and not archive_old_periods.is_running():
+            archive_old_periods.start()
+        # Replays anything left pending by a previous run
+        journal_syncer.start()
+        if BOT_ROLE == "sheets":
+            await journal_wakeup.listen(journal_syncer.wake)
+    if runs("discord"):
+        if not run_checkin_schedules.is_running():
+            run_checkin_schedules.start()
+        if not run_reminders.is_running():
+            run_reminders.start()
+
+# Check-in broadcast
+
+async def send_discord_dm(user_id, text):
+    user = await user_resolver.resolve(user_id)
+    await user.send(text)
+
+async def send_telegram_dm(chat_id, text):
+    await telegram_bot.send_message(chat_id=chat_id, text=text)
+
+# Discord allows a bot 50 requests a second overall. A DM to someone not seen before costs two (open the channel,
+# then send), so 20 sends a second leaves room for everything else: a few hundred members in well under a minute.
+broadcast_engine = BroadcastEngine({
+    "discord": PlatformLane(
+        "Discord", send_discord_dm,
+        concurrency=int(os.getenv("DISCORD_SEND_CONCURRENCY", "10")),
+        rate_per_second=float(os.getenv("DISCORD_SEND_RATE", "20")),
+    ),
+    "telegram": PlatformLane(
+        "Telegram", send_telegram_dm,
+        concurrency=int(os.getenv("TELEGRAM_SEND_CONCURRENCY", "10")),
+        rate_per_second=float(os.getenv("TELEGRAM_SEND_RATE", "25")),
+    ),
+})
+
+def group_recipients(group_key):
+    recipients = [Recipient("discord", user_id, f"Discord {user_id}") for user_id in groups[group_key]["discord"]]
+    for tg_user in groups[group_key]["telegram"]:
+        tg_id = tg_user["id"] if isinstance(tg_user, dict) else tg_user
+        username = tg_user["username"] if isinstance(tg_user, dict) else None
+        recipients.append(Recipient("telegram", tg_id, f"Telegram @{username if username else tg_id}"))
+    return recipients
+
+async def send_group_checkin(interaction, group_key, title):
+    await interaction.response.defer(ephemeral=True)
+    recipients = group_recipients(group_key)
+    log.info("Sending %s check-in to %d recipients", group_key, len(recipients), extra={"group": group_key})
+    status = await interaction.followup.send(f"Sending check-in to {len(recipients)} members…", ephemeral=True, wait=True)
+
+    async def progress(done, total):
+        await status.edit(content=f"Sending check-in… {done}/{total}")
+
+    results = await broadcast_engine.broadcast(recipients, checkin_messages[group_key], progress=progress)
+    await status.edit(content=format_report(title, results))
 
 # Slash command: Send check-in to developers
 
@@ -260,31 +553,7 @@ async def developer_checkin_slash(interaction: discord.Interaction):
     if not is_authorized(interaction):
         await interaction.response.send_message("You must be an admin to use this command.", ephemeral=True)
         return
-    await interaction.response.defer(ephemeral=True)
-    delivery_report = []
-    # Discord delivery
-    for user_id in groups["developers"]["discord"]:
-        try:
-            user = await bot.fetch_user(user_id)
-            if user:
-                await user.send(checkin_messages["developers"])
-                delivery_report.append(f"Discord {user_id}: ✅")
-            else:
-                delivery_report.append(f"Discord {user_id}: ❌")
-        except Exception:
-            delivery_report.append(f"Discord {user_id}: ❌")
-    # Telegram delivery
-    for tg_user in groups["developers"]["telegram"]:
-        tg_id = tg_user["id"] if isinstance(tg_user, dict) else tg_user
-        username = tg_user["username"] if isinstance(tg_user, dict) else None
-        try:
-            print(f"[TELEGRAM DEV CHECKIN] Sending to {tg_id} (@{username})")
-            await telegram_bot.send_message(chat_id=tg_id, text=checkin_messages["developers"])
-            delivery_report.append(f"Telegram @{username if username else tg_id}: ✅")
-        except Exception as e:
-            print(f"[TELEGRAM DEV CHECKIN] Failed to send to {tg_id} (@{username}): {e}")
-            delivery_report.append(f"Telegram @{username if username else tg_id}: ❌")
-    await interaction.followup.send("Developer check-in sent.\n" + "\n".join(delivery_report), ephemeral=True)
+    await send_group_checkin(interaction, "developers", "Developer check-in sent.")
 
 
 # Slash command: Send check-in to product managers
@@ -294,107 +563,53 @@ async def pm_checkin_slash(interaction: discord.Interaction):
     if not is_authorized(interaction):
         await interaction.response.send_message("You must be an admin to use this command.", ephemeral=True)
         return
-    await interaction.response.defer(ephemeral=True)
-    delivery_report = []
-    # Discord delivery
-    for user_id in groups["product_managers"]["discord"]:
-        try:
-            user = await bot.fetch_user(user_id)
-            if user:
-                await user.send(checkin_messages["product_managers"])
-                delivery_report.append(f"Discord {user_id}: ✅")
-            else:
-                delivery_report.append(f"Discord {user_id}: ❌")
-        except Exception:
-            delivery_report.append(f"Discord {user_id}: ❌")
-    # Telegram delivery
-    for tg_user in groups["product_managers"]["telegram"]:
-        tg_id = tg_user["id"] if isinstance(tg_user, dict) else tg_user
-        username = tg_user["username"] if isinstance(tg_user, dict) else None
-        try:
-            print(f"[TELEGRAM PM CHECKIN] Sending to {tg_id} (@{username})")
-            await telegram_bot.send_message(chat_id=tg_id, text=checkin_messages["product_managers"])
-            delivery_report.append(f"Telegram @{username if username else tg_id}: ✅")
-        except Exception as e:
-            print(f"[TELEGRAM PM CHECKIN] Failed to send to {tg_id} (@{username}): {e}")
-            delivery_report.append(f"Telegram @{username if username else tg_id}: ❌")
-    await interaction.followup.send("Product manager check-in sent.\n" + "\n".join(delivery_report), ephemeral=True)
+    await send_group_checkin(interaction, "product_managers", "Product manager check-in sent.")
 
 
 # Record responses
 
+def discord_sheet_name(user):
+    # Use username#discriminator for readability, but treat #0 as equivalent to no discriminator
+    discriminator = str(getattr(user, 'discriminator', ''))
+    if discriminator == '0' or discriminator == '' or discriminator is None:
+        return user.name
+    return f"{user.name}#{discriminator}"
+
 @bot.event
 async def on_message(message):
     # Only handle DMs from users (not the bot itself)
     if message.author == bot.user or not isinstance(message.channel, discord.DMChannel):
         return
+    received = time.perf_counter()
     user_id = message.author.id
     week_str = get_week_str()
     # Determine group and readable username
-    tab = None
     username = None
-    if user_id in groups["product_managers"]["discord"]:
-        tab = SHEET_PM_TAB
-    elif user_id in groups["developers"]["discord"]:
-        tab = SHEET_DEV_TAB
-    else:
+    tab = GROUP_TABS.get(membership.discord_group(user_id))
+    if not tab:
         return
-    # Use username#discriminator for readability, but treat #0 as equivalent to no discriminator
     raw_username = message.author.name
-    discriminator = str(getattr(message.author, 'discriminator', ''))
-    # If discriminator is '0', treat as no discriminator
-    if discriminator == '0' or discriminator == '' or discriminator is None:
-        username = raw_username
-    else:
-        username = f"{raw_username}#{discriminator}"
-    print(f"[DISCORD CHECKIN] DM from {username} (id={user_id}) for week '{week_str}': {message.content}")
+    username = discord_sheet_name(message.author)
+    discord_log.debug("Check-in received: %s", message.content, extra={"user_id": user_id, "username": username})
     try:
-        sheet = get_gsheet(tab)
-        # Find or add user row
-        values = sheet.get_all_values()
-        header = values[0] if values else []
-        row = None
-        for i in range(1, len(values)):
-            sheet_name = values[i][0] if values[i] else ""
-            # Compare ignoring '#0' discriminator
-            sheet_name_trimmed = sheet_name if not sheet_name.endswith('#0') else sheet_name[:-2]
-            if sheet_name_trimmed == raw_username or sheet_name == username:
-                row = i + 1  # 1-based
-                print(f"[DISCORD CHECKIN] Found row {row} for user {sheet_name}")
-                break
-        if row is None:
-            row = len(values) + 1
-            sheet.update_cell(row, 1, username)
-            print(f"[DISCORD CHECKIN] Added new row {row} for user {username}")
-        # Find or add week column
-        col = None
-        if week_str in header:
-            col = header.index(week_str) + 1
-            print(f"[DISCORD CHECKIN] Found column {col} for week {week_str}")
-        else:
-            col = len(header) + 1
-            sheet.update_cell(1, col, week_str)
-            print(f"[DISCORD CHECKIN] Added new column {col} for week {week_str}")
-        # Write message content
-        if col == 1 or row == 1:
-            await message.channel.send("Internal error: refusing to write message to username column or header row.")
-            print(f"[DISCORD CHECKIN] Refused to write to col={col}, row={row}")
-            return
-        existing = sheet.cell(row, col).value
-        if existing:
-            new_value = existing + "\n" + message.content
-        else:
-            new_value = message.content
-        sheet.update_cell(row, col, new_value)
-        print(f"[DISCORD CHECKIN] Updated cell ({row}, {col}) for {username}")
-        await message.add_reaction("✅")
-    except gspread.SpreadsheetNotFound:
-        await message.channel.send("Sorry, the check-in spreadsheet could not be found. Please contact the admin.")
-        print(f"[DISCORD CHECKIN] Spreadsheet not found for {username}")
-        return
-    except Exception as e:
+        entry_id = await checkin_journal.append(
+            "discord", user_id, tab, [username, raw_username], username, week_str, message.content
+        )
+        checkin_journaled()
+        CHECKINS.inc(platform="discord", tab=tab)
+        discord_log.info("Journaled check-in %s for %s", entry_id, username,
+                         extra={"entry_id": entry_id, "user_id": user_id, "tab": tab, "period": week_str})
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            await message.add_reaction("✅")
+            outcome = "ok"
+        finally:
+            REACTION_SECONDS.observe(time.perf_counter() - start, platform="discord", outcome=outcome)
+        CHECKIN_ACK_SECONDS.observe(time.perf_counter() - received, platform="discord")
+    except Exception:
         await message.channel.send("There was an error recording your check-in. Please contact the admin.")
-        print(f"[DISCORD CHECKIN] Error for {username}: {e}")
+        discord_log.exception("Failed to record check-in for %s", username, extra={"user_id": user_id})
     await bot.process_commands(message)
 
 
@@ -451,14 +666,16 @@ async def list_authorized_users_slash(interaction: discord.Interaction):
     if not authorized_users:
         await interaction.response.send_message("No authorized users set.", ephemeral=True)
         return
+    await interaction.response.defer(ephemeral=True)
+    users = await user_resolver.resolve_many(authorized_users)
     mentions = []
     for uid in authorized_users:
-        user = await bot.fetch_user(uid)
+        user = users.get(uid)
         if user:
             mentions.append(user.mention)
         else:
             mentions.append(f"<@{uid}>")
-    await interaction.response.send_message("Authorized users: " + ", ".join(mentions), ephemeral=True)
+    await interaction.followup.send("Authorized users: " + ", ".join(mentions), ephemeral=True)
 
 @tree.command(name="set_checkin_message", description="Set the check-in message for a group (admin only)")
 @app_commands.describe(group="Which group to set the check-in message for", message="Check-in message text")
@@ -480,76 +697,75 @@ async def set_checkin_message_slash(
     await interaction.response.send_message(f"Check-in message for {group} updated.", ephemeral=True)
     # Only one response per interaction
 
+# --- Discord member lookup for add/remove ---
+async def find_discord_member_id(guild, user, action):
+    """Resolve a mention, username, display name or legacy name#1234 tag to a member ID."""
+    # Support Discord mentions (e.g. <@123456789>)
+    if user.startswith('<@') and user.endswith('>'):
+        try:
+            return int(user.strip('<@!>'))
+        except ValueError as e:
+            discord_log.info("Could not parse mention ID from %r: %s", user, e, extra={"action": action})
+    username = user.lstrip("@")
+    found_id = member_directory.lookup(guild.id, username)
+    if found_id:
+        discord_log.debug("Found %r in guild %s: id=%s", username, guild.id, found_id, extra={"action": action})
+        return found_id
+    # Not in the member cache: ask the API for legacy username#discriminator tags
+    uname, _, discrim = username.partition('#')
+    if not discrim:
+        discord_log.info("No member matching %r in guild %s", username, guild.id, extra={"action": action})
+        return None
+    for member in await guild.query_members(query=uname, limit=100):
+        if member.name == uname and str(getattr(member, 'discriminator', '')) == discrim:
+            member_directory.add(member)
+            discord_log.debug("Found %r by API: id=%s", username, member.id, extra={"action": action})
+            return member.id
+    discord_log.info("No member matching %r in guild %s", username, guild.id, extra={"action": action})
+    return None
+
+async def group_user_autocomplete(interaction: discord.Interaction, current: str):
+    if interaction.namespace.user_type == "telegram":
+        return [app_commands.Choice(name=f"@{name}", value=f"@{name}") for name in membership.search_telegram(current.lstrip("@"))]
+    if interaction.guild is None:
+        return []
+    return [
+        app_commands.Choice(name=label[:100], value=f"<@{member_id}>")
+        for member_id, label in member_directory.search(interaction.guild.id, current.lstrip("@"))
+    ]
+
 # --- Slash Command: Add Discord/Telegram User to Group ---
 @tree.command(name="add_to_group", description="Add a user to a group (admin only)")
 @app_commands.describe(group="Group name: product_managers or developers", user_type="discord or telegram", user="Discord or Telegram username to add (for Telegram, use @username)")
+@app_commands.autocomplete(user=group_user_autocomplete)
 async def add_to_group_slash(interaction: discord.Interaction, group: Literal["product_managers", "developers"], user_type: Literal["discord", "telegram"], user: str):
     if not is_authorized(interaction):
         await interaction.response.send_message("You must be an admin to use this command.", ephemeral=True)
         return
     if user_type == "discord":
         try:
-            # Support Discord mentions (e.g. <@123456789>)
-            found_id = None
-            log_lines = [f"[DISCORD ADD] Raw user argument: '{user}'"]
-            if user.startswith('<@') and user.endswith('>'):
-                # Extract user ID from mention
-                mention_id = user.strip('<@!>')
-                log_lines.append(f"[DISCORD ADD] Detected mention, extracted ID: {mention_id}")
-                try:
-                    found_id = int(mention_id)
-                except Exception as e:
-                    log_lines.append(f"[DISCORD ADD] Could not parse mention ID: {e}")
-            if not found_id:
-                username = user.lstrip("@")
-                log_lines.append(f"[DISCORD ADD] Searching for Discord user '{username}' in guild '{interaction.guild.name}' ({interaction.guild.id})")
-                # Try exact username and display_name
-                for member in interaction.guild.members:
-                    log_lines.append(f"[DISCORD ADD] Checking member: {member} (name={member.name}, display_name={member.display_name}, discriminator={getattr(member, 'discriminator', None)})")
-                    if member.name == username or member.display_name == username or f"{member.name}#{getattr(member, 'discriminator', '')}" == username:
-                        found_id = member.id
-                        log_lines.append(f"[DISCORD ADD] Found user: {member} (id={found_id})")
-                        break
-                # If not found, try to fetch from API
-                if not found_id:
-                    log_lines.append(f"[DISCORD ADD] User not found in cache. Trying to fetch from API...")
-                    # Try to fetch by username#discriminator if provided
-                    if '#' in username:
-                        uname, discrim = username.split('#', 1)
-                        for member in await interaction.guild.query_members(query=uname, limit=100):
-                            if member.name == uname and str(getattr(member, 'discriminator', '')) == discrim:
-                                found_id = member.id
-                                log_lines.append(f"[DISCORD ADD] Found by API: {member} (id={found_id})")
-                                break
-            for line in log_lines:
-                print(line)
+            found_id = await find_discord_member_id(interaction.guild, user, "add")
             if not found_id:
                 await interaction.response.send_message(f"Discord user '{user}' not found in this server.", ephemeral=True)
                 return
-            already = found_id in groups[group]["discord"]
-            if not already:
-                groups[group]["discord"].append(found_id)
-                save_groups(groups)
+            change = membership.add_discord(group, found_id)
+            if change:
+                save_groups(groups, change)
                 await interaction.response.send_message(f"Added Discord user to {group}.", ephemeral=True)
             else:
                 await interaction.response.send_message(f"Discord user is already in {group}.", ephemeral=True)
         except Exception as e:
-            print(f"[DISCORD ADD] Exception: {e}")
+            discord_log.exception("Adding %r to %s failed", user, group)
             await interaction.response.send_message(f"Error adding Discord user: {e}", ephemeral=True)
     elif user_type == "telegram":
         username = user.lstrip("@")
-        found_id = None
-        for u in telegram_users:
-            if telegram_users[u] == username:
-                found_id = int(u)
-                break
+        found_id = membership.telegram_id(username)
         if not found_id:
             await interaction.response.send_message(f"Telegram user @{username} not found. They must register first.", ephemeral=True)
             return
-        already = any(u["id"] == found_id for u in groups[group]["telegram"])
-        if not already:
-            groups[group]["telegram"].append({"id": found_id, "username": username})
-            save_groups(groups)
+        change = membership.add_telegram(group, found_id, username)
+        if change:
+            save_groups(groups, change)
             await interaction.response.send_message(f"Added Telegram user @{username} to {group}.", ephemeral=True)
         else:
             await interaction.response.send_message(f"Telegram user @{username} is already in {group}.", ephemeral=True)
@@ -560,62 +776,31 @@ async def add_to_group_slash(interaction: discord.Interaction, group: Literal["p
 # --- Slash Command: Remove Discord/Telegram User from Group ---
 @tree.command(name="remove_from_group", description="Remove a user from a group (admin only)")
 @app_commands.describe(group="Group name: product_managers or developers", user_type="discord or telegram", user="Discord or Telegram username to remove (for Telegram, use @username)")
+@app_commands.autocomplete(user=group_user_autocomplete)
 async def remove_from_group_slash(interaction: discord.Interaction, group: Literal["product_managers", "developers"], user_type: Literal["discord", "telegram"], user: str):
     if not is_authorized(interaction):
         await interaction.response.send_message("You must be an admin to use this command.", ephemeral=True)
         return
     if user_type == "discord":
-        found_id = None
-        log_lines = [f"[DISCORD REMOVE] Raw user argument: '{user}'"]
-        if user.startswith('<@') and user.endswith('>'):
-            mention_id = user.strip('<@!>')
-            log_lines.append(f"[DISCORD REMOVE] Detected mention, extracted ID: {mention_id}")
-            try:
-                found_id = int(mention_id)
-            except Exception as e:
-                log_lines.append(f"[DISCORD REMOVE] Could not parse mention ID: {e}")
-        if not found_id:
-            username = user.lstrip("@")
-            log_lines.append(f"[DISCORD REMOVE] Searching for Discord user '{username}' in guild '{interaction.guild.name}' ({interaction.guild.id})")
-            for member in interaction.guild.members:
-                log_lines.append(f"[DISCORD REMOVE] Checking member: {member} (name={member.name}, display_name={member.display_name}, discriminator={getattr(member, 'discriminator', None)})")
-                if member.name == username or member.display_name == username or f"{member.name}#{getattr(member, 'discriminator', '')}" == username:
-                    found_id = member.id
-                    log_lines.append(f"[DISCORD REMOVE] Found user: {member} (id={found_id})")
-                    break
-            # If not found, try to fetch by username#discriminator
-            if not found_id and '#' in username:
-                uname, discrim = username.split('#', 1)
-                for member in await interaction.guild.query_members(query=uname, limit=100):
-                    if member.name == uname and str(getattr(member, 'discriminator', '')) == discrim:
-                        found_id = member.id
-                        log_lines.append(f"[DISCORD REMOVE] Found by API: {member} (id={found_id})")
-                        break
-        for line in log_lines:
-            print(line)
+        found_id = await find_discord_member_id(interaction.guild, user, "remove")
         if not found_id:
             await interaction.response.send_message(f"Discord user '{user}' not found in this server.", ephemeral=True)
             return
-        if found_id in groups[group]["discord"]:
-            groups[group]["discord"].remove(found_id)
-            save_groups(groups)
+        change = membership.remove_discord(group, found_id)
+        if change:
+            save_groups(groups, change)
             await interaction.response.send_message(f"Removed Discord user from {group}.", ephemeral=True)
         else:
             await interaction.response.send_message(f"Discord user is not in {group}.", ephemeral=True)
     elif user_type == "telegram":
         username = user.lstrip("@")
-        found_id = None
-        for u in telegram_users:
-            if telegram_users[u] == username:
-                found_id = int(u)
-                break
+        found_id = membership.telegram_id(username)
         if not found_id:
             await interaction.response.send_message(f"Telegram user @{username} not found.", ephemeral=True)
             return
-        orig_len = len(groups[group]["telegram"])
-        groups[group]["telegram"] = [u for u in groups[group]["telegram"] if u["id"] != found_id]
-        if len(groups[group]["telegram"]) < orig_len:
-            save_groups(groups)
+        change = membership.remove_telegram(group, found_id)
+        if change:
+            save_groups(groups, change)
             await interaction.response.send_message(f"Removed Telegram user @{username} from {group}.", ephemeral=True)
         else:
             await interaction.response.send_message(f"Telegram user @{username} is not in {group}.", ephemeral=True)
@@ -630,101 +815,387 @@ async def list_group_slash(interaction: discord.Interaction, group: Literal["pro
     if not is_authorized(interaction):
         await interaction.response.send_message("You must be an admin to use this command.", ephemeral=True)
         return
+    await interaction.response.defer(ephemeral=True)
     out = []
     # Discord usernames
     discord_usernames = []
+    users = await user_resolver.resolve_many(groups[group]["discord"])
     for uid in groups[group]["discord"]:
-        try:
-            user = await bot.fetch_user(uid)
-            if user and user.name:
-                discord_usernames.append(f"@{user.name}")
-            else:
-                discord_usernames.append("(unknown)")
-        except Exception:
+        user = users.get(uid)
+        if user and user.name:
+            discord_usernames.append(f"@{user.name}")
+        else:
             discord_usernames.append("(unknown)")
     out.append("discord: " + (", ".join(discord_usernames) if discord_usernames else "None"))
     # Telegram usernames
     telegram_usernames = [f"@{u['username']}" for u in groups[group]["telegram"] if u.get('username')]
     out.append("telegram: " + (", ".join(telegram_usernames) if telegram_usernames else "None"))
-    await interaction.response.send_message(f"{group} group users:\n" + "\n".join(out), ephemeral=True)
+    await interaction.followup.send(f"{group} group users:\n" + "\n".join(out), ephemeral=True)
+
+
+# --- Scheduled check-ins ---
+SCHEDULES_FILE = os.getenv("SCHEDULES_FILE", "schedules.json")
+schedules_store = JsonStateStore(SCHEDULES_FILE, delay=STATE_WRITE_DELAY, changelog=True, indent=2)
+
+async def deliver_scheduled_checkin(recipient, text):
+    return await broadcast_engine.lanes[recipient.platform].deliver(recipient, text)
 
+checkin_scheduler = CheckinScheduler(
+    schedules_store,
+    group_recipients,
+    lambda group_key: checkin_messages[group_key],
+    deliver_scheduled_checkin,
+)
+
+@tasks.loop(seconds=30)
+async def run_checkin_schedules():
+    try:
+        await checkin_scheduler.tick()
+    except Exception:
+        log.exception("Scheduler tick failed")
+
+@tree.command(name="schedule_set", description="Set the automatic check-in schedule for a group (admin only)")
+@app_commands.describe(
+    group="Group name: product_managers or developers",
+    cron="Cron expression: minute hour day month weekday, e.g. '0 9 * * 1' for Mondays at 09:00",
+    timezone="IANA timezone, e.g. Europe/Berlin",
+    window_minutes="Spread deliveries evenly over this many minutes",
+)
+async def schedule_set_slash(interaction: discord.Interaction, group: Literal["product_managers", "developers"], cron: str, timezone: str = "UTC", window_minutes: int = 60):
+    if not is_authorized(interaction):
+        await interaction.response.send_message("You must be an admin to use this command.", ephemeral=True)
+        return
+    try:
+        next_slot = checkin_scheduler.set_schedule(group, cron, timezone, window_minutes)
+    except Exception as e:
+        await interaction.response.send_message(f"Invalid schedule: {e}", ephemeral=True)
+        return
+    await interaction.response.send_message(f"Schedule for {group} set. Next check-in: {next_slot:%Y-%m-%d %H:%M %Z}.", ephemeral=True)
+
+@tree.command(name="schedule_view", description="Show automatic check-in schedules (admin only)")
+async def schedule_view_slash(interaction: discord.Interaction):
+    if not is_authorized(interaction):
+        await interaction.response.send_message("You must be an admin to use this command.", ephemeral=True)
+        return
+    lines = checkin_scheduler.describe()
+    await interaction.response.send_message("\n".join(lines) if lines else "No schedules set.", ephemeral=True)
+
+@tree.command(name="schedule_pause", description="Pause or resume a group's automatic check-ins (admin only)")
+@app_commands.describe(group="Group name: product_managers or developers", paused="True to pause, False to resume")
+async def schedule_pause_slash(interaction: discord.Interaction, group: Literal["product_managers", "developers"], paused: bool):
+    if not is_authorized(interaction):
+        await interaction.response.send_message("You must be an admin to use this command.", ephemeral=True)
+        return
+    if not checkin_scheduler.set_paused(group, paused):
+        await interaction.response.send_message(f"No schedule set for {group}.", ephemeral=True)
+        return
+    await interaction.response.send_message(f"Schedule for {group} {'paused' if paused else 'resumed'}.", ephemeral=True)
+
+@tree.command(name="schedule_trigger", description="Start a staggered check-in for a group now (admin only)")
+@app_commands.describe(group="Group name: product_managers or developers")
+async def schedule_trigger_slash(interaction: discord.Interaction, group: Literal["product_managers", "developers"]):
+    if not is_authorized(interaction):
+        await interaction.response.send_message("You must be an admin to use this command.", ephemeral=True)
+        return
+    if not checkin_scheduler.trigger(group):
+        await interaction.response.send_message(f"A check-in for {group} is already being sent.", ephemeral=True)
+        return
+    await interaction.response.send_message(f"Started a staggered check-in for {group}.", ephemeral=True)
+
+# --- Check-in report ---
+
+async def report_members(group_key):
+    users = await user_resolver.resolve_many(groups[group_key]["discord"])
+    members = []
+    for uid in groups[group_key]["discord"]:
+        user = users.get(uid)
+        if user:
+            members.append(Member("discord", uid, f"@{discord_sheet_name(user)}"))
+        else:
+            members.append(Member("discord", uid, f"Discord {uid}"))
+    for tg_user in groups[group_key]["telegram"]:
+        tg_id = tg_user["id"] if isinstance(tg_user, dict) else tg_user
+        username = tg_user.get("username") if isinstance(tg_user, dict) else None
+        members.append(Member("telegram", tg_id, f"Telegram @{username}" if username else f"Telegram {tg_id}"))
+    return members
+
+def checkin_round_start(group_key):
+    """When the group's latest scheduled (or triggered) check-in run started, if there was one."""
+    run = checkin_scheduler.schedules.get(group_key, {}).get("run")
+    return datetime.fromisoformat(run["started"]) if run else None
+
+# Reports are cached for REPORT_CACHE_TTL seconds; answers later than REPORT_LATE_AFTER_HOURS count as late
+checkin_reporter = CheckinReporter(
+    checkin_journal,
+    report_members,
+    checkin_round_start,
+    GROUP_TABS,
+    ttl=float(os.getenv("REPORT_CACHE_TTL", "60")),
+    late_after=timedelta(hours=float(os.getenv("REPORT_LATE_AFTER_HOURS", "24"))),
+    periods=checkin_periods,
+)
+
+@tree.command(name="checkin_report", description="Show who has and hasn't checked in this round (admin only)")
+@app_commands.describe(
+    since="First date to count, YYYY-MM-DD (default: when the group's last scheduled check-in went out)",
+    csv="Attach the full list as a CSV file",
+)
+async def checkin_report_slash(interaction: discord.Interaction, since: str = None, csv: bool = False):
+    if not is_authorized(interaction):
+        await interaction.response.send_message("You must be an admin to use this command.", ephemeral=True)
+        return
+    try:
+        since_date = datetime.strptime(since, "%Y-%m-%d").date() if since else None
+    except ValueError:
+        await interaction.response.send_message("`since` must be a date like 2024-01-31.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+    try:
+        report = await checkin_reporter.report(since_date)
+    except Exception as e:
+        log.exception("Check-in report failed")
+        await interaction.followup.send(f"Could not build the report: {e}", ephemeral=True)
+        return
+    text = "\n".join(report.summary())
+    if len(text) > 1900:
+        text = text[:1900] + "…"
+    if csv:
+        attachment = discord.File(io.BytesIO(report.to_csv().encode("utf-8")),
+                                  filename=f"checkin_report_{report.generated_at:%Y-%m-%d}.csv")
+        await interaction.followup.send(text, file=attachment, ephemeral=True)
+    else:
+        await interaction.followup.send(text, ephemeral=True)
+
+# --- Reminders for members who haven't checked in ---
+REMINDERS_FILE = os.getenv("REMINDERS_FILE", "reminders.json")
+reminders_store = JsonStateStore(REMINDERS_FILE, delay=STATE_WRITE_DELAY, indent=2)
+
+async def fresh_checkin_report():
+    return await checkin_reporter.report(fresh=True)
+
+async def send_reminders(recipients, text, progress=None):
+    return await broadcast_engine.broadcast(recipients, text, progress=progress)
+
+def reminder_message(group_key):
+    return f"Reminder: you haven't checked in yet.\n\n{checkin_messages[group_key]}"
+
+# REMINDER_INTERVAL_HOURS > 0 sends a pass automatically that long after a scheduled round starts, and again
+# after each further interval; nobody gets more than REMINDER_MAX_PER_MEMBER reminders per round
+REMINDER_INTERVAL_HOURS = float(os.getenv("REMINDER_INTERVAL_HOURS", "0"))
+checkin_reminders = Reminders(
+    reminders_store,
+    fresh_checkin_report,
+    checkin_round_start,
+    send_reminders,
+    reminder_message,
+    GROUP_TABS,
+    max_per_member=int(os.getenv("REMINDER_MAX_PER_MEMBER", "2")),
+    interval=timedelta(hours=REMINDER_INTERVAL_HOURS) if REMINDER_INTERVAL_HOURS > 0 else None,
+)
+
+@tasks.loop(minutes=5)
+async def run_reminders():
+    try:
+        await checkin_reminders.tick()
+    except Exception:
+        log.exception("Reminder pass failed")
+
+@tree.command(name="checkin_remind", description="Remind members who haven't checked in this round (admin only)")
+@app_commands.describe(group="Group name: product_managers or developers")
+async def checkin_remind_slash(interaction: discord.Interaction, group: Literal["product_managers", "developers"]):
+    if not is_authorized(interaction):
+        await interaction.response.send_message("You must be an admin to use this command.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+    status = await interaction.followup.send(f"Looking for {group} members who haven't checked in…", ephemeral=True, wait=True)
+
+    async def progress(done, total):
+        await status.edit(content=f"Sending reminders… {done}/{total}")
+
+    try:
+        outcome = await checkin_reminders.remind(group, progress)
+    except Exception as e:
+        log.exception("Reminder pass for %s failed", group)
+        await status.edit(content=f"Could not send reminders: {e}")
+        return
+    if outcome is None:
+        await status.edit(content=f"Reminders for {group} are already being sent.")
+        return
+    results, capped = outcome
+    if not results:
+        note = f" ({capped} already had {checkin_reminders.max_per_member} reminders)" if capped else ""
+        await status.edit(content=f"Nobody in {group} needs a reminder{note}.")
+        return
+    text = format_report(f"Reminders sent to {group}.", results)
+    if capped:
+        text += f"\nSkipped {capped} who already had {checkin_reminders.max_per_member} reminders this round."
+    await status.edit(content=text)
+
+# Slash command: metrics summary
+
+@tree.command(name="bot_stats", description="Show check-in, Sheets and messaging latency stats (admin only)")
+async def bot_stats_slash(interaction: discord.Interaction):
+    if not is_authorized(interaction):
+        await interaction.response.send_message("You must be an admin to use this command.", ephemeral=True)
+        return
+    lines = REGISTRY.summary()
+    counts = await checkin_journal.counts()
+    lines.append("journal: " + ", ".join(f"{status}={count}" for status, count in sorted(counts.items())))
+    text = ""
+    for i, line in enumerate(lines):
+        if len(text) + len(line) > 1850:
+            text += f"… and {len(lines) - i} more (see /metrics)\n"
+            break
+        text += line + "\n"
+    await interaction.response.send_message(f"```\n{text}```", ephemeral=True)
+
+
+# Keep the member directory current
+@bot.event
+async def on_member_join(member):
+    member_directory.add(member)
+
+@bot.event
+async def on_member_update(before, after):
+    member_directory.add(after)
+
+@bot.event
+async def on_member_remove(member):
+    member_directory.remove(member)
+
+@bot.event
+async def on_user_update(before, after):
+    # Username changes arrive as user updates; refresh the member entries in every shared guild
+    for guild in after.mutual_guilds:
+        member = guild.get_member(after.id)
+        if member:
+            member_directory.add(member)
+
+discord_ready = False
 
-# Update the on_ready event
 @bot.event
 async def on_ready():
-    print(f"Logged in as {bot.user}")
+    global discord_ready
+    # discord.py fires on_ready again after reconnects, and member events missed while offline are lost,
+    # so the directory is rebuilt every time; the slash commands only need syncing once
+    discord_log.info("%s as %s", "Reconnected" if discord_ready else "Logged in", bot.user)
+    for guild in bot.guilds:
+        count = member_directory.load_guild(guild)
+        discord_log.info("Indexed %d members of guild %s", count, guild.id)
+    if discord_ready:
+        return
+    discord_ready = True
     try:
-        # Try global sync first
-        await tree.sync()
-        print("Synced commands globally.")
-        
-        # Then sync to your specific guild if needed
-        guild = discord.Object(id=GUILD_ID)
-        synced = await tree.sync(guild=guild)
-        print(f"Synced {len(synced)} slash commands to guild {GUILD_ID}.")
+        await command_sync.sync()
     except Exception as e:
-        print(f"Failed to sync slash commands: {e}")
+        discord_log.error("Failed to sync slash commands: %s", e)
+        # Try again on the next ready
+        discord_ready = False
 
 if __name__ == "__main__":
     import asyncio
+    import signal
     from telegram.error import TimedOut, NetworkError, RetryAfter
     import os
 
+    # Records go onto a queue and a background thread writes them, so logging never blocks the event loop
+    log_listener = setup_logging(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        path=os.getenv("LOG_FILE") or None,
+        max_bytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        backup_count=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+        console=os.getenv("LOG_CONSOLE", "true").lower() in ("true", "1", "yes"),
+        fmt=os.getenv("LOG_FORMAT", "json"),
+        debug_sample_every=int(os.getenv("LOG_DEBUG_SAMPLE_EVERY", "1")),
+        queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    )
+
+    async def start_telegram():
+        """Start polling, with retries. Returns whether it started, or None if the process should exit."""
+        max_retries = int(os.environ.get("TELEGRAM_MAX_RETRIES", "5"))
+        retry_delay = int(os.environ.get("TELEGRAM_RETRY_DELAY", "5"))
+        continue_on_error = os.environ.get("TELEGRAM_CONTINUE_ON_ERROR", "").lower() in ("true", "1", "yes")
+        for attempt in range(max_retries):
+            try:
+                telegram_log.info("Initializing Telegram bot (attempt %d/%d)", attempt + 1, max_retries)
+                await telegram_app.initialize()
+                await telegram_app.start()
+                # Only start receiving updates if initialization was successful
+                if TELEGRAM_MODE == "webhook":
+                    await telegram_webhook.start(TELEGRAM_WEBHOOK_URL)
+                else:
+                    await telegram_app.updater.start_polling(drop_pending_updates=True)
+                telegram_log.info("Telegram bot started")
+                return True
+            except (TimedOut, NetworkError, RetryAfter) as e:
+                if attempt < max_retries - 1:
+                    wait_time = retry_delay * (attempt + 1)
+                    telegram_log.warning("Telegram connection error: %s. Retrying in %d seconds", e, wait_time)
+                    await asyncio.sleep(wait_time)
+                else:
+                    telegram_log.error("Failed to connect to Telegram API after %d attempts, running without Telegram support", max_retries)
+                    if not continue_on_error:
+                        telegram_log.error("Exiting due to Telegram initialization failure")
+                        return None
+            except Exception:
+                telegram_log.exception("Unexpected error initializing Telegram bot, running without Telegram support")
+                if not continue_on_error:
+                    telegram_log.error("Exiting due to Telegram initialization failure")
+                    return None
+                break
+        return False
+
     async def main():
+        log.info("Starting with BOT_ROLE=%s", BOT_ROLE)
+        await start_background_services()
         # Start Discord bot as a task
-        discord_task = asyncio.create_task(bot.start(DISCORD_BOT_TOKEN))
-        
+        discord_task = asyncio.create_task(bot.start(DISCORD_BOT_TOKEN)) if runs("discord") else None
+
         # Check if Telegram should be disabled
         disable_telegram = os.environ.get("DISABLE_TELEGRAM", "").lower() in ("true", "1", "yes")
-        if disable_telegram:
-            print("Telegram support disabled via environment variable.")
-            telegram_started = False
-        else:
-            # Start Telegram bot with retry logic
-            max_retries = int(os.environ.get("TELEGRAM_MAX_RETRIES", "5"))
-            retry_delay = int(os.environ.get("TELEGRAM_RETRY_DELAY", "5"))
-            continue_on_error = os.environ.get("TELEGRAM_CONTINUE_ON_ERROR", "").lower() in ("true", "1", "yes")
-            telegram_started = False
-            
-            for attempt in range(max_retries):
-                try:
-                    print(f"Initializing Telegram bot (attempt {attempt+1}/{max_retries})...")
-                    await telegram_app.initialize()
-                    await telegram_app.start()
-                    # Only start polling if initialization was successful
-                    await telegram_app.updater.start_polling(drop_pending_updates=True)
-                    print("Telegram bot successfully started!")
-                    telegram_started = True
-                    break
-                except (TimedOut, NetworkError, RetryAfter) as e:
-                    if attempt < max_retries - 1:
-                        wait_time = retry_delay * (attempt + 1)
-                        print(f"Telegram connection error: {e}. Retrying in {wait_time} seconds...")
-                        await asyncio.sleep(wait_time)
-                    else:
-                        print(f"Failed to connect to Telegram API after {max_retries} attempts. Running without Telegram support.")
-                        if not continue_on_error:
-                            print("Exiting due to Telegram initialization failure.")
-                            return
-                except Exception as e:
-                    print(f"Unexpected error initializing Telegram bot: {e}")
-                    print("Running without Telegram support.")
-                    if not continue_on_error:
-                        print("Exiting due to Telegram initialization failure.")
-                        return
-                    break
-        
+        telegram_started = False
+        if runs("telegram"):
+            if disable_telegram:
+                telegram_log.info("Telegram support disabled via environment variable")
+            else:
+                telegram_started = await start_telegram()
+                if telegram_started is None:
+                    return
+
         try:
-            # Run Discord bot until it exits
-            await discord_task
+            if discord_task is not None:
+                # Run Discord bot until it exits
+                await discord_task
+            else:
+                # The telegram and sheets processes run until they are told to stop
+                stop = asyncio.Event()
+                for sig in (signal.SIGTERM, signal.SIGINT):
+                    asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+                await stop.wait()
         finally:
             # Only try to shut down Telegram if it was successfully started
             if telegram_started:
                 try:
-                    await telegram_app.updater.stop()
+                    if TELEGRAM_MODE == "webhook":
+                        # The webhook stays registered, so Telegram holds updates until we're back
+                        await telegram_webhook.stop()
+                    else:
+                        await telegram_app.updater.stop()
                     await telegram_app.stop()
                     await telegram_app.shutdown()
                 except Exception as e:
-                    print(f"Error shutting down Telegram bot: {e}")
+                    telegram_log.warning("Error shutting down Telegram bot: %s", e)
+            await checkin_scheduler.close()
+            await checkin_reminders.close()
+            await stop_metrics()
+            await journal_syncer.close()
+            journal_wakeup.close()
+            await sheet_writer.close()
+            sheets_io.shutdown()
+            checkin_journal.close()
+            await flush_state()
     
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    finally:
+        stop_logging(log_listener)
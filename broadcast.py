@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from metrics import DM_SEND_SECONDS
+
+log = logging.getLogger(__name__)
+
+
+def retry_after_seconds(exc):
+    """Seconds a platform asked us to wait, or None if `exc` is not a rate-limit error.
+
+    Covers telegram.error.RetryAfter and discord.RateLimited (both expose
+    `retry_after`) as well as a plain discord.HTTPException with status 429.
+    """
+    retry_after = getattr(exc, "retry_after", None)
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    if retry_after is not None:
+        return float(retry_after)
+    if getattr(exc, "status", None) == 429:
+        return 1.0
+    return None
+
+
+class Recipient:
+    __slots__ = ("platform", "address", "label")
+
+    def __init__(self, platform, address, label):
+        self.platform = platform
+        self.address = address
+        self.label = label
+
+
+class DeliveryResult:
+    __slots__ = ("recipient", "ok", "error")
+
+    def __init__(self, recipient, ok, error=None):
+        self.recipient = recipient
+        self.ok = ok
+        self.error = error
+
+
+class PlatformLane:
+    """Sends to one platform with bounded concurrency and a steady pace.
+
+    When the platform answers with a rate limit, every sender on the lane
+    waits out the requested delay together before retrying.
+    """
+
+    def __init__(self, name, send, concurrency=5, rate_per_second=5.0, max_retries=3):
+        self.name = name
+        self.send = send
+        self.concurrency = concurrency
+        self.interval = 1.0 / rate_per_second if rate_per_second else 0.0
+        self.max_retries = max_retries
+        self._semaphore = None
+        self._pace_lock = None
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+
+    def _ensure_primitives(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._pace_lock = asyncio.Lock()
+
+    async def _wait_for_slot(self):
+        loop = asyncio.get_running_loop()
+        async with self._pace_lock:
+            now = loop.time()
+            start = max(now, self._next_slot, self._paused_until)
+            self._next_slot = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def pause(self, seconds):
+        loop = asyncio.get_running_loop()
+        self._paused_until = max(self._paused_until, loop.time() + seconds)
+
+    async def deliver(self, recipient, text):
+        self._ensure_primitives()
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self._wait_for_slot()
+                start = time.perf_counter()
+                try:
+                    await self.send(recipient.address, text)
+                    DM_SEND_SECONDS.observe(time.perf_counter() - start, platform=recipient.platform, outcome="ok")
+                    return DeliveryResult(recipient, True)
+                except Exception as e:
+                    wait = retry_after_seconds(e)
+                    DM_SEND_SECONDS.observe(time.perf_counter() - start, platform=recipient.platform,
+                                            outcome="error" if wait is None else "rate_limited")
+                    if wait is None or attempt == self.max_retries:
+                        log.warning("%s send to %s failed: %s", self.name, recipient.label, e)
+                        return DeliveryResult(recipient, False, e)
+                    log.info("%s rate limited, pausing %.1fs", self.name, wait)
+                    self.pause(wait)
+
+
+class BroadcastEngine:
+    """Fans one message out to recipients on every platform at once."""
+
+    def __init__(self, lanes):
+        self.lanes = lanes
+
+    async def broadcast(self, recipients, text, progress=None, progress_interval=1.0):
+        """Deliver `text` to every recipient and return DeliveryResults in recipient order.
+
+        `progress(done, total)` is awaited at most every `progress_interval`
+        seconds while sends are in flight.
+        """
+        tasks = [asyncio.create_task(self.lanes[r.platform].deliver(r, text)) for r in recipients]
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=progress_interval)
+            if pending and progress is not None:
+                try:
+                    await progress(len(tasks) - len(pending), len(tasks))
+                except Exception as e:
+                    log.warning("Progress update failed: %s", e)
+        return [task.result() for task in tasks]
+
+
+def format_report(title, results, limit=1900):
+    """Delivery report that fits in one Discord message."""
+    delivered = sum(1 for r in results if r.ok)
+    header = f"{title}\nDelivered {delivered}/{len(results)}."
+    lines = [f"{r.recipient.label}: {'✅' if r.ok else '❌'}" for r in results]
+    # Failures first, they are the lines an admin needs to act on
+    lines.sort(key=lambda line: not line.endswith("❌"))
+    out = header
+    for i, line in enumerate(lines):
+        if len(out) + len(line) + 40 > limit:
+            out += f"\n… and {len(lines) - i} more"
+            break
+        out += "\n" + line
+    return out
@@ -0,0 +1,56 @@
+"""Slash command registration that only calls Discord when the commands changed.
+
+Syncing the command tree is a rate-limited bulk call, and global commands
+take a while to reach every client. CommandSync hashes what would be sent
+and keeps the hash of the last successful sync per application and scope,
+so restarts and reconnects with unchanged commands don't sync at all.
+"""
+import hashlib
+import json
+import logging
+
+import discord
+
+log = logging.getLogger(__name__)
+
+
+def command_fingerprint(tree, guild=None):
+    """Stable hash of the commands `tree.sync(guild=guild)` would register."""
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+                     key=lambda command: (command.get("type", 1), command["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class CommandSync:
+    """Syncs `tree` to one scope: "global", or "guild" (global commands copied to `guild_id`, visible at once)."""
+
+    def __init__(self, tree, store, scope="global", guild_id=None):
+        if scope not in ("global", "guild"):
+            raise ValueError(f"unknown command sync scope {scope!r}, use global or guild")
+        if scope == "guild" and not guild_id:
+            raise ValueError("guild command sync needs a guild id")
+        self.tree = tree
+        self.store = store
+        self.scope = scope
+        self.guild = discord.Object(id=int(guild_id)) if scope == "guild" else None
+        self.synced = store.load({})
+
+    def key(self):
+        application = self.tree.client.application_id
+        return f"{application}:{self.scope}" if self.guild is None else f"{application}:guild:{self.guild.id}"
+
+    async def sync(self, force=False):
+        """Sync if the commands differ from the last sync. Returns True if Discord was called."""
+        if self.guild is not None:
+            self.tree.copy_global_to(guild=self.guild)
+        fingerprint = command_fingerprint(self.tree, self.guild)
+        key = self.key()
+        if not force and self.synced.get(key) == fingerprint:
+            log.info("Slash commands unchanged, skipping sync", extra={"scope": key})
+            return False
+        synced = await self.tree.sync(guild=self.guild)
+        self.synced[key] = fingerprint
+        self.store.save(self.synced)
+        await self.store.flush()
+        log.info("Synced %d slash commands", len(synced), extra={"scope": key})
+        return True
@@ -0,0 +1,239 @@
+import asyncio
+import bisect
+import logging
+import time
+from collections import OrderedDict
+
+from metrics import USER_FETCH_SECONDS, USER_LOOKUPS
+
+log = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Bounded LRU map whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=1000, ttl=3600.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires <= self.clock():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._data[key] = (value, self.clock() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class UserResolver:
+    """Turns Discord user IDs into User objects with as few REST calls as possible.
+
+    Looks in the gateway cache first (members are cached because the bot has
+    the members intent), then in a bounded TTL/LRU cache of users fetched
+    earlier, and only then calls fetch_user. Misses are fetched concurrently,
+    at most `concurrency` at a time.
+    """
+
+    def __init__(self, client, maxsize=1000, ttl=3600.0, concurrency=5):
+        self.client = client
+        self.cache = TTLCache(maxsize, ttl)
+        self.concurrency = concurrency
+        self._semaphore = None
+
+    def cached(self, user_id):
+        user = self.client.get_user(user_id)
+        if user is not None:
+            USER_LOOKUPS.inc(source="gateway")
+            return user
+        user = self.cache.get(user_id)
+        if user is not None:
+            USER_LOOKUPS.inc(source="cache")
+        return user
+
+    async def _fetch(self, user_id):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        USER_LOOKUPS.inc(source="fetch")
+        async with self._semaphore:
+            with USER_FETCH_SECONDS.time(outcome="fetched"):
+                user = await self.client.fetch_user(user_id)
+        self.cache.put(user_id, user)
+        return user
+
+    async def resolve(self, user_id):
+        """Return the User for `user_id`. Raises whatever fetch_user raises on a miss."""
+        return self.cached(user_id) or await self._fetch(user_id)
+
+    async def resolve_many(self, user_ids):
+        """Return {user_id: User or None}. Unknown or unfetchable users map to None."""
+        found = {}
+        misses = []
+        for user_id in user_ids:
+            user = self.cached(user_id)
+            if user is not None:
+                found[user_id] = user
+            else:
+                misses.append(user_id)
+        results = await asyncio.gather(*(self._fetch(user_id) for user_id in misses), return_exceptions=True)
+        for user_id, result in zip(misses, results):
+            if isinstance(result, Exception):
+                log.warning("Could not fetch user %s: %s", user_id, result)
+                found[user_id] = None
+            else:
+                found[user_id] = result
+        return found
+
+
+def normalize_name(name):
+    return name.casefold().strip() if name else ""
+
+
+def member_keys(member):
+    """Normalized names a member can be looked up by: username, legacy tag, display names."""
+    name = normalize_name(member.name)
+    keys = {"name": name}
+    discriminator = str(getattr(member, "discriminator", "") or "")
+    if discriminator and discriminator != "0":
+        keys["tag"] = f"{name}#{discriminator}"
+    display = {normalize_name(getattr(member, attr, None)) for attr in ("display_name", "global_name", "nick")}
+    display.discard("")
+    display.discard(name)
+    keys["display"] = display
+    return keys
+
+
+class GuildMemberIndex:
+    def __init__(self):
+        self.by_name = {}
+        self.by_tag = {}
+        self.by_display = {}
+        self.labels = {}
+        self.member_keys = {}
+        self.sorted_keys = []
+
+    def _add_key(self, key):
+        # sorted_keys holds each distinct key once, for prefix search
+        if key not in self.by_display and key not in self.by_name and key not in self.by_tag:
+            bisect.insort(self.sorted_keys, key)
+
+    def _drop_key(self, key):
+        if key not in self.by_display and key not in self.by_name and key not in self.by_tag:
+            i = bisect.bisect_left(self.sorted_keys, key)
+            if i < len(self.sorted_keys) and self.sorted_keys[i] == key:
+                del self.sorted_keys[i]
+
+    def add(self, member):
+        self.remove(member.id)
+        keys = member_keys(member)
+        self._add_key(keys["name"])
+        self.by_name[keys["name"]] = member.id
+        if "tag" in keys:
+            self._add_key(keys["tag"])
+            self.by_tag[keys["tag"]] = member.id
+        for key in keys["display"]:
+            self._add_key(key)
+            self.by_display.setdefault(key, set()).add(member.id)
+        self.member_keys[member.id] = keys
+        display_name = getattr(member, "display_name", None) or member.name
+        self.labels[member.id] = display_name if display_name == member.name else f"{display_name} (@{member.name})"
+
+    def remove(self, member_id):
+        keys = self.member_keys.pop(member_id, None)
+        if keys is None:
+            return
+        self.labels.pop(member_id, None)
+        if self.by_name.get(keys["name"]) == member_id:
+            del self.by_name[keys["name"]]
+            self._drop_key(keys["name"])
+        if "tag" in keys and self.by_tag.get(keys["tag"]) == member_id:
+            del self.by_tag[keys["tag"]]
+            self._drop_key(keys["tag"])
+        for key in keys["display"]:
+            ids = self.by_display.get(key)
+            if ids is not None:
+                ids.discard(member_id)
+                if not ids:
+                    del self.by_display[key]
+                    self._drop_key(key)
+
+    def lookup(self, query):
+        key = normalize_name(query)
+        if key in self.by_name:
+            return self.by_name[key]
+        if key in self.by_tag:
+            return self.by_tag[key]
+        ids = self.by_display.get(key)
+        if ids:
+            return min(ids)
+        return None
+
+    def search(self, prefix, limit=25):
+        prefix = normalize_name(prefix)
+        found = []
+        seen = set()
+        i = bisect.bisect_left(self.sorted_keys, prefix)
+        while i < len(self.sorted_keys) and len(found) < limit:
+            key = self.sorted_keys[i]
+            if not key.startswith(prefix):
+                break
+            ids = [self.by_name.get(key), self.by_tag.get(key)] + sorted(self.by_display.get(key, ()))
+            for member_id in ids:
+                if member_id is not None and member_id not in seen:
+                    seen.add(member_id)
+                    found.append(member_id)
+            i += 1
+        return found[:limit]
+
+
+class MemberDirectory:
+    """Per-guild index of members by normalized username, display name and legacy tag.
+
+    Loaded from the gateway member cache when the bot connects and kept
+    current from the member join/update/remove events. Lookups ignore case,
+    and search() returns members whose names start with a prefix, for slash
+    command autocomplete.
+    """
+
+    def __init__(self):
+        self._guilds = {}
+
+    def _guild(self, guild_id):
+        return self._guilds.setdefault(guild_id, GuildMemberIndex())
+
+    def load_guild(self, guild):
+        index = GuildMemberIndex()
+        for member in guild.members:
+            index.add(member)
+        self._guilds[guild.id] = index
+        return len(index.member_keys)
+
+    def add(self, member):
+        self._guild(member.guild.id).add(member)
+
+    def remove(self, member):
+        self._guild(member.guild.id).remove(member.id)
+
+    def lookup(self, guild_id, query):
+        return self._guild(guild_id).lookup(query)
+
+    def search(self, guild_id, prefix, limit=25):
+        """Return [(member_id, label)] for members whose names start with `prefix`."""
+        index = self._guild(guild_id)
+        return [(member_id, index.labels[member_id]) for member_id in index.search(prefix, limit)]
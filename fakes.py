@@ -0,0 +1,666 @@
+"""In-process stand-ins for Google Sheets, Discord and Telegram.
+
+bench.py and the tests use these to drive the bot's real handlers without
+any network access. Every fake can add latency to its calls and enforce a
+rate limit, failing the same way the real library does when it is over
+quota. Calls are counted per method so a run can report API usage.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import discord
+import gspread
+import telegram.error
+from gspread.utils import a1_range_to_grid_range, a1_to_rowcol
+
+from archive import TabArchiver
+from broadcast import BroadcastEngine, PlatformLane
+from discord_users import UserResolver
+from journal import CheckinJournal, JournalSyncer
+from membership import MembershipRegistry
+from report import CheckinReporter
+from sheets import CheckinLayoutError, SheetIndex, SheetsIO, SheetWriter
+
+
+class RateLimit:
+    """At most `calls` calls in any `per` second window. calls=None means unlimited."""
+
+    def __init__(self, calls=None, per=1.0, clock=time.monotonic):
+        self.calls = calls
+        self.per = per
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._window_start = 0.0
+        self._count = 0
+
+    def hit(self):
+        """Count a call. Returns the seconds to wait if it is over the limit, else None."""
+        if self.calls is None:
+            return None
+        with self._lock:
+            now = self.clock()
+            if now - self._window_start >= self.per:
+                self._window_start = now
+                self._count = 0
+            if self._count >= self.calls:
+                return self._window_start + self.per - now
+            self._count += 1
+            return None
+
+
+class CallCounter:
+    """Thread-safe Counter of API calls by method name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    def add(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def total(self):
+        with self._lock:
+            return sum(self.counts.values())
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+class FakeClock:
+    """A clock that only moves when a test sets `now`."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+# --- Google Sheets ---
+
+class QuotaResponse:
+    """Just enough of a requests.Response for gspread's APIError."""
+
+    def __init__(self, code=429, message="Quota exceeded for quota metric 'Read requests'"):
+        self.status_code = code
+        self.text = message
+        self._error = {"code": code, "message": message,
+                       "status": "RESOURCE_EXHAUSTED" if code == 429 else "INVALID_ARGUMENT"}
+
+    def json(self):
+        return {"error": self._error}
+
+
+class FakeWorksheet:
+    """In-memory grid with the gspread Worksheet methods the bot calls.
+
+    Calls block for `latency` seconds like a real HTTP round trip and raise
+    a 429 APIError once the shared `rate_limit` is used up. Every value
+    written by batch_update/update_cell is also logged to `writes` with the
+    time it landed.
+    """
+
+    def __init__(self, title, cells=None, latency=0.0, rate_limit=None, calls=None):
+        self.title = title
+        self.cells = dict(cells or {})
+        self.latency = latency
+        self.rate_limit = rate_limit or RateLimit()
+        self.calls = calls or CallCounter()
+        self.writes = []
+        # Sheets' default grid for a new tab
+        self.grid = (1000, 26)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def populated(cls, title, users, periods, **kwargs):
+        """A tab with a Name header, `users` rows and an answer in every `periods` column."""
+        cells = {(1, 1): "Name"}
+        for col, period in enumerate(periods, start=2):
+            cells[(1, col)] = period
+        for row, user in enumerate(users, start=2):
+            cells[(row, 1)] = user
+            for col, period in enumerate(periods, start=2):
+                cells[(row, col)] = f"{user} update for {period}"
+        return cls(title, cells, **kwargs)
+
+    def _call(self, name):
+        self.calls.add(name)
+        if self.latency:
+            time.sleep(self.latency)
+        if self.rate_limit.hit() is not None:
+            raise gspread.exceptions.APIError(QuotaResponse())
+
+    def _size(self):
+        rows = max((r for r, _ in self.cells), default=0)
+        cols = max((c for _, c in self.cells), default=0)
+        return rows, cols
+
+    def _set(self, row, col, value):
+        with self._lock:
+            if value:
+                self.cells[(row, col)] = value
+            else:
+                self.cells.pop((row, col), None)
+            self.writes.append((time.monotonic(), row, col, value))
+
+    def value(self, row, col):
+        return self.cells.get((row, col), "")
+
+    def get_all_values(self):
+        self._call("get_all_values")
+        rows, cols = self._size()
+        return [[self.value(r, c) for c in range(1, cols + 1)] for r in range(1, rows + 1)]
+
+    def col_values(self, col):
+        self._call("col_values")
+        rows = max((r for r, c in self.cells if c == col), default=0)
+        return [self.value(r, col) for r in range(1, rows + 1)]
+
+    def row_values(self, row):
+        self._call("row_values")
+        cols = max((c for r, c in self.cells if r == row), default=0)
+        return [self.value(row, c) for c in range(1, cols + 1)]
+
+    def find(self, query):
+        self._call("find")
+        for (row, col), value in sorted(self.cells.items()):
+            if value == query:
+                return SimpleNamespace(row=row, col=col, value=value)
+        return None
+
+    def cell(self, row, col):
+        self._call("cell")
+        return SimpleNamespace(row=row, col=col, value=self.value(row, col) or None)
+
+    def _grid(self, a1):
+        grid = a1_range_to_grid_range(a1)
+        rows, cols = self._size()
+        return (range(grid.get("startRowIndex", 0), grid.get("endRowIndex", rows)),
+                range(grid.get("startColumnIndex", 0), grid.get("endColumnIndex", cols)))
+
+    def batch_get(self, ranges):
+        self._call("batch_get")
+        return [self.read_range(a1) for a1 in ranges]
+
+    def read_range(self, a1, major_dimension="ROWS"):
+        """Values in an A1 range (B:D, 1:1, A1:C3), with trailing blanks left out like the Sheets API does."""
+        rows, cols = self._grid(a1)
+        if major_dimension == "COLUMNS":
+            lines = [[self.value(r + 1, c + 1) for r in rows] for c in cols]
+        else:
+            lines = [[self.value(r + 1, c + 1) for c in cols] for r in rows]
+        for line in lines:
+            while line and not line[-1]:
+                line.pop()
+        while lines and not lines[-1]:
+            lines.pop()
+        return lines
+
+    def batch_update(self, data, raw=True):
+        self._call("batch_update")
+        for item in data:
+            row, col = a1_to_rowcol(item["range"])
+            self._set(row, col, item["values"][0][0])
+
+    def update_cell(self, row, col, value):
+        self._call("update_cell")
+        self._set(row, col, value)
+
+    @property
+    def row_count(self):
+        return max(self._size()[0], self.grid[0])
+
+    @property
+    def col_count(self):
+        return max(self._size()[1], self.grid[1])
+
+    def resize(self, rows=None, cols=None):
+        self._call("resize")
+        self.grid = (rows or self.grid[0], cols or self.grid[1])
+
+    def delete_columns(self, start_index, end_index=None):
+        self._call("delete_columns")
+        end_index = end_index or start_index
+        width = end_index - start_index + 1
+        with self._lock:
+            self.cells = {(row, col if col < start_index else col - width): value
+                          for (row, col), value in self.cells.items() if not start_index <= col <= end_index}
+
+
+class FakeSpreadsheet:
+    """A set of FakeWorksheets sharing one quota and one call counter, like a real project."""
+
+    def __init__(self, latency=0.0, quota_per_minute=None, key="offline-sheet"):
+        self.id = key
+        self.latency = latency
+        self.rate_limit = RateLimit(quota_per_minute, per=60.0)
+        self.calls = CallCounter()
+        self.tabs = {}
+
+    def add_tab(self, title, users=(), periods=()):
+        sheet = FakeWorksheet.populated(title, users, periods, latency=self.latency,
+                                        rate_limit=self.rate_limit, calls=self.calls)
+        self.tabs[title] = sheet
+        return sheet
+
+    def worksheet(self, title):
+        self.calls.add("worksheet")
+        if title not in self.tabs:
+            raise gspread.WorksheetNotFound(title)
+        return self.tabs[title]
+
+    def _call(self, name):
+        self.calls.add(name)
+        if self.latency:
+            time.sleep(self.latency)
+        if self.rate_limit.hit() is not None:
+            raise gspread.exceptions.APIError(QuotaResponse())
+
+    def add_worksheet(self, title, rows, cols, index=None):
+        self._call("add_worksheet")
+        if title in self.tabs:
+            raise gspread.exceptions.APIError(QuotaResponse(400, f'A sheet with the name "{title}" already exists.'))
+        sheet = self.add_tab(title)
+        sheet.cells.clear()
+        sheet.grid = (rows, cols)
+        return sheet
+
+    def values_batch_get(self, ranges, params=None):
+        self._call("values_batch_get")
+        major_dimension = (params or {}).get("majorDimension", "ROWS")
+        value_ranges = []
+        for name in ranges:
+            title, _, a1 = name.rpartition("!")
+            if title.startswith("'"):
+                title = title[1:-1].replace("''", "'")
+            value_range = {"range": name, "majorDimension": major_dimension}
+            values = self.tabs[title].read_range(a1, major_dimension)
+            if values:
+                value_range["values"] = values
+            value_ranges.append(value_range)
+        return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+
+
+class FakeClient:
+    """The gspread Client calls SheetSession makes, opening one FakeSpreadsheet.
+
+    `auth` stands in for the converted credentials gspread signs requests with.
+    """
+
+    def __init__(self, spreadsheet, auth=None):
+        self.spreadsheet = spreadsheet
+        self.http_client = SimpleNamespace(auth=auth)
+
+    def open(self, name):
+        self.spreadsheet.calls.add("open")
+        return self.spreadsheet
+
+    def open_by_key(self, key):
+        self.spreadsheet.calls.add("open_by_key")
+        return self.spreadsheet
+
+
+class FakeSheetSession:
+    """Drop-in for sheets.SheetSession backed by a FakeSpreadsheet."""
+
+    def __init__(self, spreadsheet):
+        self._spreadsheet = spreadsheet
+        self._worksheets = {}
+        self._lock = threading.Lock()
+
+    def client(self):
+        return self
+
+    def spreadsheet(self):
+        return self._spreadsheet
+
+    def worksheet(self, tab_name):
+        with self._lock:
+            sheet = self._worksheets.get(tab_name)
+            if sheet is None:
+                sheet = self._spreadsheet.worksheet(tab_name)
+                self._worksheets[tab_name] = sheet
+            return sheet
+
+    def invalidate(self, tab_name=None):
+        with self._lock:
+            if tab_name is None:
+                self._worksheets.clear()
+            else:
+                self._worksheets.pop(tab_name, None)
+
+    def reopen(self, tab_name):
+        self.invalidate(tab_name)
+        return self.worksheet(tab_name)
+
+    def token_expires_soon(self, now=None):
+        return False
+
+    def refresh_token(self, force=False):
+        return False
+
+
+# --- Discord ---
+
+class FakeDiscordAPI:
+    """Shared latency, rate limit and call counts for every fake Discord object."""
+
+    def __init__(self, latency=0.0, rate_per_second=None):
+        self.latency = latency
+        self.rate_limit = RateLimit(rate_per_second, per=1.0)
+        self.calls = CallCounter()
+
+    async def call(self, name):
+        self.calls.add(name)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        retry_after = self.rate_limit.hit()
+        if retry_after is not None:
+            raise discord.RateLimited(retry_after)
+
+
+class FakeDiscordMessage:
+    _next_id = 1
+
+    def __init__(self, api, author=None, channel=None, content=""):
+        self.api = api
+        self.id = FakeDiscordMessage._next_id
+        FakeDiscordMessage._next_id += 1
+        self.author = author
+        self.channel = channel
+        self.content = content
+        self.guild = None
+        # commands.Context reads it; never used because the DM carries no command prefix
+        self._state = None
+        self.reactions = []
+        self.edits = []
+
+    async def add_reaction(self, emoji):
+        await self.api.call("add_reaction")
+        self.reactions.append(emoji)
+
+    async def edit(self, content=None, **kwargs):
+        await self.api.call("edit_message")
+        self.content = content
+        self.edits.append(content)
+        return self
+
+
+class FakeDMChannel(discord.DMChannel):
+    """Passes the bot's isinstance(channel, discord.DMChannel) check without a gateway state."""
+
+    def __init__(self, api, user):
+        self.api = api
+        self.id = user.id
+        self.user = user
+        self.sent = []
+
+    def __repr__(self):
+        return f"<FakeDMChannel user={self.user.id}>"
+
+    async def send(self, content=None, **kwargs):
+        await self.api.call("send_message")
+        self.sent.append(content)
+        return FakeDiscordMessage(self.api, channel=self, content=content)
+
+
+class FakeDiscordUser:
+    def __init__(self, api, user_id, name, discriminator="0", display_name=None):
+        self.api = api
+        self.id = user_id
+        self.name = name
+        self.discriminator = discriminator
+        self.display_name = display_name or name
+        self.global_name = display_name
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+        self.dm_channel = FakeDMChannel(api, self)
+
+    async def send(self, content=None, **kwargs):
+        return await self.dm_channel.send(content, **kwargs)
+
+    def dm(self, content):
+        """A DM from this user to the bot, as on_message receives it."""
+        return FakeDiscordMessage(self.api, author=self, channel=self.dm_channel, content=content)
+
+
+class FakeDiscordMember(FakeDiscordUser):
+    def __init__(self, api, guild, user_id, name, discriminator="0", display_name=None, nick=None):
+        super().__init__(api, user_id, name, discriminator=discriminator, display_name=display_name)
+        self.guild = guild
+        self.nick = nick
+
+
+class FakeDiscordGuild:
+    def __init__(self, guild_id, members=()):
+        self.id = guild_id
+        self.members = list(members)
+
+
+class FakeDiscordClient:
+    """The get_user/fetch_user part of discord.Client.
+
+    With `cached=False` the gateway cache is empty, so every lookup costs a
+    fetch_user call like it does right after a restart. `cached` can also be
+    the ids of the users the gateway has seen.
+    """
+
+    def __init__(self, api, users=(), cached=False):
+        self.api = api
+        self.users = {user.id: user for user in users}
+        self.cached = cached
+
+    def get_user(self, user_id):
+        if self.cached is True or (self.cached and user_id in self.cached):
+            return self.users.get(user_id)
+        return None
+
+    async def fetch_user(self, user_id):
+        await self.api.call("fetch_user")
+        if user_id not in self.users:
+            raise LookupError(f"unknown user {user_id}")
+        return self.users[user_id]
+
+
+class FakeInteractionResponse:
+    def __init__(self, api):
+        self.api = api
+        self.deferred = False
+        self.messages = []
+
+    async def defer(self, ephemeral=False, **kwargs):
+        await self.api.call("defer")
+        self.deferred = True
+
+    async def send_message(self, content=None, ephemeral=False, **kwargs):
+        await self.api.call("interaction_response")
+        self.messages.append(content)
+
+
+class FakeWebhook:
+    def __init__(self, api):
+        self.api = api
+        self.messages = []
+
+    async def send(self, content=None, ephemeral=False, wait=False, **kwargs):
+        await self.api.call("followup")
+        message = FakeDiscordMessage(self.api, content=content)
+        self.messages.append(message)
+        return message if wait else None
+
+
+class FakeInteraction:
+    def __init__(self, api, user, guild=None):
+        self.api = api
+        self.user = user
+        self.guild = guild
+        self.response = FakeInteractionResponse(api)
+        self.followup = FakeWebhook(api)
+
+
+# --- Telegram ---
+
+class FakeTelegramBot:
+    """The telegram.Bot methods the bot calls, with latency and flood control."""
+
+    def __init__(self, latency=0.0, rate_per_second=None):
+        self.latency = latency
+        self.rate_limit = RateLimit(rate_per_second, per=1.0)
+        self.calls = CallCounter()
+        self.sent = []
+        self.reactions = []
+
+    async def _call(self, name):
+        self.calls.add(name)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        retry_after = self.rate_limit.hit()
+        if retry_after is not None:
+            raise telegram.error.RetryAfter(max(1, round(retry_after)))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call("send_message")
+        self.sent.append((chat_id, text))
+
+    async def set_message_reaction(self, chat_id, message_id, reaction=None, is_big=None, **kwargs):
+        await self._call("set_message_reaction")
+        self.reactions.append((chat_id, message_id))
+        return True
+
+
+class FakeTelegramMessage:
+    _next_id = 1
+
+    def __init__(self, bot, chat_id, text):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = FakeTelegramMessage._next_id
+        FakeTelegramMessage._next_id += 1
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        await self.bot._call("send_message")
+        self.replies.append(text)
+
+
+def telegram_update(bot, user_id, username, text):
+    """An Update/Context pair for a private text message, as telegram_message_handler receives them."""
+    message = FakeTelegramMessage(bot, user_id, text)
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=user_id, username=username),
+                             message=message, effective_message=message)
+    return update, SimpleNamespace(bot=bot)
+
+
+# --- Wiring ---
+
+class OfflineBot:
+    """Points a loaded bot module at fakes for the length of a `with` block.
+
+    Swaps the module's Sheets session, index, writer and archiver, check-in
+    journal and syncer, report builder, Discord user resolver, Telegram bot,
+    broadcast engine and group membership, and puts them all back on exit.
+    Nothing touches the real state files: the journal lives in `workdir`
+    and group edits only change the in-memory `groups` passed in. Call
+    start() inside the event loop to run the journal syncer and stop()
+    before the loop ends.
+    """
+
+    PATCHED = ("groups", "membership", "sheet_session", "sheets_io", "sheet_index", "sheet_writer",
+               "sheet_archiver", "checkin_journal", "journal_syncer", "user_resolver", "telegram_bot",
+               "broadcast_engine", "checkin_reporter")
+
+    def __init__(self, module, workdir, spreadsheet, discord_client, telegram_bot, groups,
+                 telegram_users=None, flush_interval=None, sync_interval=None, coalesce=None):
+        self.module = module
+        self.workdir = workdir
+        self.spreadsheet = spreadsheet
+        self.discord_client = discord_client
+        self.telegram_bot = telegram_bot
+        self.groups = groups
+        self.telegram_users = telegram_users or {}
+        self.flush_interval = flush_interval
+        self.sync_interval = sync_interval
+        self.coalesce = coalesce
+        self.bot_user = FakeDiscordUser(discord_client.api, 1, "checkin-bot")
+        self.bot_user.bot = True
+        self._saved = {}
+        self._saved_user = None
+
+    def __enter__(self):
+        m = self.module
+        self._saved = {name: getattr(m, name) for name in self.PATCHED}
+        session = FakeSheetSession(self.spreadsheet)
+        quota = m.sheets_io.quota.clone() if m.sheets_io.quota is not None else None
+        io = SheetsIO(session, max_workers=m.sheets_io.max_workers, timeout=m.sheets_io.timeout, quota=quota,
+                      quota_retries=m.sheets_io.quota_retries)
+        index = SheetIndex(io)
+        writer = SheetWriter(io, index, flush_interval=self.flush_interval or m.sheet_writer.flush_interval,
+                             max_batch=m.sheet_writer.max_batch)
+        journal = CheckinJournal(os.path.join(self.workdir, "checkin_journal.db"))
+        syncer = m.journal_syncer
+        lanes = {platform: PlatformLane(lane.name, lane.send, lane.concurrency,
+                                        1.0 / lane.interval if lane.interval else 0, lane.max_retries)
+                 for platform, lane in m.broadcast_engine.lanes.items()}
+        resolver = m.user_resolver
+        reporter = m.checkin_reporter
+        patched = {
+            "groups": self.groups,
+            "membership": MembershipRegistry(self.groups, self.telegram_users),
+            "sheet_session": session,
+            "sheets_io": io,
+            "sheet_index": index,
+            "sheet_writer": writer,
+            "sheet_archiver": TabArchiver(io, index, writer, m.sheet_archiver.keep),
+            "checkin_journal": journal,
+            "journal_syncer": JournalSyncer(journal, m.deliver_checkin, batch_size=syncer.batch_size,
+                                            poll_interval=self.sync_interval or syncer.poll_interval,
+                                            max_backoff=syncer.max_backoff,
+                                            permanent_errors=(CheckinLayoutError,),
+                                            quiet=syncer.quiet if self.coalesce is None else self.coalesce,
+                                            max_hold=syncer.max_hold),
+            "user_resolver": UserResolver(self.discord_client, resolver.cache.maxsize, resolver.cache.ttl,
+                                          resolver.concurrency),
+            "telegram_bot": self.telegram_bot,
+            "broadcast_engine": BroadcastEngine(lanes),
+            "checkin_reporter": CheckinReporter(journal, m.report_members, m.checkin_round_start, m.GROUP_TABS,
+                                                reporter.ttl, reporter.late_after, reporter.periods),
+        }
+        for name, value in patched.items():
+            setattr(m, name, value)
+        # bot.user is None until login; give the client an identity so commands.Bot can tell DMs apart
+        self._saved_user = m.bot._connection.user
+        m.bot._connection.user = self.bot_user
+        return self
+
+    def __exit__(self, *exc):
+        m = self.module
+        m.sheets_io.shutdown()
+        m.checkin_journal.close()
+        m.bot._connection.user = self._saved_user
+        for name, value in self._saved.items():
+            setattr(m, name, value)
+        return False
+
+    def start(self):
+        self.module.journal_syncer.start()
+
+    async def drain(self, timeout=60.0):
+        """Wait until every journaled check-in has been delivered (or failed for good)."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (await self.module.checkin_journal.counts()).get("pending", 0):
+            if loop.time() > deadline:
+                raise TimeoutError("journal did not drain")
+            self.module.journal_syncer.wake()
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        await self.module.journal_syncer.close()
+        await self.module.sheet_writer.close()
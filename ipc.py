@@ -0,0 +1,62 @@
+"""Wake-ups between the bot's processes.
+
+When the bot runs as separate Discord, Telegram and Sheets processes they
+share the SQLite check-in journal, which is the queue itself. A datagram on
+a Unix socket tells the Sheets worker that an entry is waiting, so it does
+not sit out its poll interval. A lost datagram only costs latency: the
+worker still polls.
+"""
+import asyncio
+import logging
+import os
+import socket
+
+log = logging.getLogger(__name__)
+
+
+class _WakeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, callback):
+        self.callback = callback
+
+    def datagram_received(self, data, addr):
+        self.callback()
+
+
+class WakeSocket:
+    """One process listen()s on `path`, any number of others notify() it."""
+
+    def __init__(self, path):
+        self.path = path
+        self._sock = None
+        self._transport = None
+
+    async def listen(self, callback):
+        if os.path.exists(self.path):
+            # Left behind by a previous run
+            os.unlink(self.path)
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _WakeProtocol(callback), local_addr=self.path, family=socket.AF_UNIX)
+        log.info("Listening for wake-ups on %s", self.path)
+
+    def notify(self):
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sock.setblocking(False)
+        try:
+            self._sock.sendto(b"\0", self.path)
+        except OSError:
+            # Nobody listening, or its buffer is full; the next poll picks the work up
+            pass
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
@@ -0,0 +1,307 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import JOURNAL_EVENTS
+from storage import CheckinStore
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkins (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    platform TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    tab TEXT NOT NULL,
+    names TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    period TEXT NOT NULL,
+    text TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    delivered_at REAL
+);
+CREATE INDEX IF NOT EXISTS checkins_pending ON checkins(id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS checkins_received ON checkins(received_at);
+CREATE INDEX IF NOT EXISTS checkins_cell ON checkins(tab, period, platform, user_id);
+CREATE INDEX IF NOT EXISTS checkins_user ON checkins(platform, user_id, tab);
+"""
+
+
+class JournalEntry:
+    __slots__ = ("id", "platform", "user_id", "tab", "names", "display_name", "period", "text",
+                 "received_at", "status", "attempts")
+
+    def __init__(self, row):
+        self.id = row["id"]
+        self.platform = row["platform"]
+        self.user_id = row["user_id"]
+        self.tab = row["tab"]
+        self.names = json.loads(row["names"])
+        self.display_name = row["display_name"]
+        self.period = row["period"]
+        self.text = row["text"]
+        self.received_at = row["received_at"]
+        self.status = row["status"]
+        self.attempts = row["attempts"]
+
+
+class CheckinJournal(CheckinStore):
+    """The SQLite CheckinStore: a durable local log of every check-in received.
+
+    Backed by SQLite in WAL mode with synchronous=FULL, so an entry is on disk
+    once append() returns. All database work happens on one dedicated thread
+    to keep fsyncs off the event loop.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    # --- Blocking implementations, only called on the journal thread ---
+
+    def _append(self, platform, user_id, tab, names, display_name, period, text, received_at):
+        conn = self._connect()
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO checkins (platform, user_id, tab, names, display_name, period, text, received_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (platform, str(user_id), tab, json.dumps(list(names)), display_name, period, text, received_at),
+            )
+        return cur.lastrowid
+
+    def _pending(self, limit):
+        rows = self._connect().execute(
+            "SELECT * FROM checkins WHERE status = 'pending' ORDER BY id LIMIT ?", (limit,)
+        ).fetchall()
+        return [JournalEntry(row) for row in rows]
+
+    def _settled(self, limit, quiet, max_hold, now):
+        # A sender is due `quiet` seconds after their latest entry, or `max_hold` after their earliest.
+        # Entries stamped after `now` mean the clock went back; waiting on them could take hours.
+        due = "MAX(received_at) + :quiet"
+        if max_hold is not None:
+            due = f"MIN({due}, MIN(received_at) + :max_hold)"
+        senders = (f"WITH senders AS (SELECT platform, user_id, tab, {due} AS due, MAX(received_at) AS latest"
+                   " FROM checkins WHERE status = 'pending' GROUP BY platform, user_id, tab) ")
+        params = {"quiet": quiet, "max_hold": max_hold, "now": now, "limit": limit}
+        conn = self._connect()
+        rows = conn.execute(
+            senders + "SELECT c.* FROM checkins c JOIN senders s USING (platform, user_id, tab)"
+            " WHERE c.status = 'pending' AND (s.due <= :now OR s.latest > :now) ORDER BY c.id LIMIT :limit", params
+        ).fetchall()
+        next_due, = conn.execute(senders + "SELECT MIN(due) FROM senders WHERE due > :now AND latest <= :now",
+                                 params).fetchone()
+        return [JournalEntry(row) for row in rows], next_due
+
+    def _mark_delivered(self, ids):
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "UPDATE checkins SET status = 'delivered', delivered_at = ? WHERE id = ?",
+                [(time.time(), entry_id) for entry_id in ids],
+            )
+
+    def _mark_attempt(self, entry_id, error, give_up):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE checkins SET attempts = attempts + 1, last_error = ?, status = ? WHERE id = ?",
+                (str(error), "failed" if give_up else "pending", entry_id),
+            )
+
+    def _first_received(self, since):
+        rows = self._connect().execute(
+            "SELECT platform, user_id, tab, MIN(received_at) FROM checkins WHERE received_at >= ?"
+            " GROUP BY platform, user_id, tab", (since,)
+        ).fetchall()
+        return {(platform, user_id, tab): received_at for platform, user_id, tab, received_at in rows}
+
+    def _cell_messages(self, tab, period, platform, user_id):
+        rows = self._connect().execute(
+            "SELECT text FROM checkins WHERE tab = ? AND period = ? AND platform = ? AND user_id = ?"
+            " AND status != 'failed' ORDER BY id", (tab, period, platform, str(user_id))
+        ).fetchall()
+        return [text for text, in rows]
+
+    def _user_names(self, tab, platform, user_id):
+        rows = self._connect().execute(
+            "SELECT names FROM checkins WHERE platform = ? AND user_id = ? AND tab = ? GROUP BY names ORDER BY MIN(id)",
+            (platform, str(user_id), tab)
+        ).fetchall()
+        return list(dict.fromkeys(name for names, in rows for name in json.loads(names)))
+
+    def _counts(self):
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM checkins GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    # --- Async API ---
+
+    async def append(self, platform, user_id, tab, names, display_name, period, text, received_at=None):
+        """Durably record a check-in and return its journal id."""
+        entry_id = await self._run(self._append, platform, user_id, tab, names, display_name, period, text,
+                                   received_at or time.time())
+        JOURNAL_EVENTS.inc(event="appended")
+        return entry_id
+
+    async def pending(self, limit=200):
+        return await self._run(self._pending, limit)
+
+    async def settled(self, limit, quiet, max_hold=None, now=None):
+        """Pending entries of senders who have sent nothing for `quiet` seconds, or have waited `max_hold`.
+
+        Returns (entries, when the next held sender is due or None). Held
+        senders don't count towards `limit`, so they can't crowd out the rest.
+        """
+        return await self._run(self._settled, limit, quiet, max_hold, time.time() if now is None else now)
+
+    async def mark_delivered(self, ids):
+        if ids:
+            await self._run(self._mark_delivered, list(ids))
+
+    async def mark_attempt(self, entry_id, error, give_up=False):
+        await self._run(self._mark_attempt, entry_id, error, give_up)
+
+    async def cell_messages(self, tab, period, platform, user_id):
+        return await self._run(self._cell_messages, tab, period, platform, user_id)
+
+    async def user_names(self, tab, platform, user_id):
+        return await self._run(self._user_names, tab, platform, user_id)
+
+    async def counts(self):
+        return await self._run(self._counts)
+
+    async def first_received(self, since):
+        return await self._run(self._first_received, since)
+
+    def close(self):
+        def close_conn():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        self._executor.submit(close_conn).result()
+        self._executor.shutdown(wait=True)
+
+
+class JournalSyncer:
+    """Background task that delivers pending journal entries.
+
+    `journal` is any CheckinStore. `deliver(entry)` writes one entry to its
+    destination. Entries are handed over in journal order, so a user's
+    messages keep their order. Anything still pending from a previous run is replayed as soon as the task starts.
+    Errors listed in `permanent_errors` mark the entry failed. Any other
+    error leaves it pending, and it is retried with growing backoff.
+
+    With `quiet` set, a sender's entries wait until they have sent nothing
+    for `quiet` seconds. A burst of messages is then delivered together and
+    lands in their cell as one write. `max_hold` caps the wait, counted from
+    the sender's earliest waiting entry, so someone who never pauses still
+    gets through.
+    """
+
+    def __init__(self, journal, deliver, batch_size=200, poll_interval=5.0, max_backoff=60.0,
+                 permanent_errors=(), quiet=0.0, max_hold=None, clock=time.time):
+        self.journal = journal
+        self.deliver = deliver
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.permanent_errors = tuple(permanent_errors)
+        self.quiet = quiet
+        self.max_hold = max_hold
+        self.clock = clock
+        self._held_until = None
+        self._wake = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="journal-sync")
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _wait(self, timeout):
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    async def sync_once(self):
+        """Deliver one batch of pending entries. Returns (delivered, failed) counts."""
+        if self.quiet:
+            entries, self._held_until = await self.journal.settled(self.batch_size, self.quiet, self.max_hold,
+                                                                   self.clock())
+        else:
+            entries = await self.journal.pending(self.batch_size)
+        if not entries:
+            return 0, 0
+        results = await asyncio.gather(*(self.deliver(entry) for entry in entries), return_exceptions=True)
+        delivered = []
+        failed = 0
+        for entry, result in zip(entries, results):
+            if isinstance(result, BaseException):
+                failed += 1
+                give_up = isinstance(result, self.permanent_errors)
+                log.warning("Delivery of check-in %s failed%s: %s", entry.id, " permanently" if give_up else "", result,
+                            extra={"entry_id": entry.id, "attempts": entry.attempts + 1})
+                JOURNAL_EVENTS.inc(event="failed" if give_up else "retried")
+                await self.journal.mark_attempt(entry.id, result, give_up=give_up)
+            else:
+                delivered.append(entry.id)
+        await self.journal.mark_delivered(delivered)
+        JOURNAL_EVENTS.inc(len(delivered), event="delivered")
+        return len(delivered), failed
+
+    async def _run(self):
+        backoff = 0.0
+        while True:
+            try:
+                delivered, failed = await self.sync_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Sync pass failed")
+                delivered, failed = 0, 1
+            if failed:
+                backoff = min(self.max_backoff, backoff * 2 if backoff else 1.0)
+                await asyncio.sleep(backoff)
+            elif delivered:
+                backoff = 0.0
+            else:
+                backoff = 0.0
+                timeout = self.poll_interval
+                if self._held_until is not None:
+                    timeout = min(timeout, max(0.0, self._held_until - self.clock()))
+                await self._wait(timeout)
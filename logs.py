@@ -0,0 +1,184 @@
+"""Structured logging that never blocks the caller on I/O.
+
+setup_logging() gives the root logger a single handler that puts records on
+an in-memory queue. A background QueueListener thread formats them as JSON
+lines and writes them to a size-rotated file and/or the console. Loggers
+used on hot paths only pay for merging the message arguments and a queue
+put. When the queue is full (the disk has stalled), records are dropped and
+counted rather than waiting.
+
+Extra fields passed with `extra={...}` become top-level JSON keys, so
+    log.info("Journaled check-in", extra={"entry_id": 7, "tab": "Developers"})
+is written as
+    {"ts": "...", "level": "INFO", "logger": "bot.discord", "msg": "Journaled check-in", "entry_id": 7, ...}
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """One readable line per record, with extra fields appended as key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = [f"{key}={value}" for key, value in vars(record).items()
+                  if key not in _RECORD_ATTRS and not key.startswith("_")]
+        return f"{line} {' '.join(fields)}" if fields else line
+
+
+class DebugSampler(logging.Filter):
+    """Lets through the first and then every `every`-th DEBUG record per call site.
+
+    INFO and above always pass. Passed DEBUG records get a `sampled` field
+    saying how many records each one stands for.
+    """
+
+    def __init__(self, every=1):
+        super().__init__()
+        self.every = max(1, every)
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            n = self._seen.get(key, 0)
+            self._seen[key] = n + 1
+        if n % self.every:
+            return False
+        record.sampled = self.every
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Merge the arguments now, while they still hold their current values, but leave
+        # the JSON formatting to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DropReporter(logging.Handler):
+    """Listener-side handler that reports how many records the queue handler had to drop."""
+
+    def __init__(self, queue_handler, target):
+        super().__init__()
+        self.queue_handler = queue_handler
+        self.target = target
+        self._reported = 0
+
+    def emit(self, record):
+        dropped = self.queue_handler.dropped
+        if dropped != self._reported:
+            notice = logging.LogRecord("logs", logging.WARNING, __file__, 0,
+                                       "Log queue was full, dropped %d records", (dropped - self._reported,), None)
+            self._reported = dropped
+            self.target.handle(notice)
+
+
+class _Fanout(logging.Handler):
+    def __init__(self, handlers):
+        super().__init__()
+        self.handlers = handlers
+
+    def handle(self, record):
+        for handler in self.handlers:
+            handler.handle(record)
+        return True
+
+    def emit(self, record):
+        self.handle(record)
+
+    def close(self):
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+
+def setup_logging(level="INFO", path=None, max_bytes=10_000_000, backup_count=5, console=True,
+                  fmt="json", debug_sample_every=1, queue_size=10000):
+    """Route all logging through a queue to a background writer. Returns the started QueueListener."""
+    formatter = JsonFormatter() if fmt == "json" else TextFormatter()
+    outputs = []
+    if path:
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                            encoding="utf-8")
+        file_handler.setFormatter(formatter)
+        outputs.append(file_handler)
+    if console or not outputs:
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(formatter)
+        outputs.append(stream_handler)
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+    queue_handler.addFilter(DebugSampler(debug_sample_every))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    # Third-party libraries are very chatty at DEBUG, keep them at INFO even when we debug
+    for name in ("discord", "telegram", "httpx", "httpcore", "aiohttp", "urllib3", "google", "asyncio"):
+        logging.getLogger(name).setLevel(max(root.level, logging.INFO))
+
+    fanout = _Fanout(outputs)
+    listener = logging.handlers.QueueListener(queue_handler.queue, DropReporter(queue_handler, fanout), fanout,
+                                              respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def stop_logging(listener):
+    """Write out everything still queued and close the output files."""
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
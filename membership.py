@@ -0,0 +1,161 @@
+import bisect
+
+GROUP_KEYS = ("product_managers", "developers")
+
+
+def telegram_entry_id(entry):
+    return entry["id"] if isinstance(entry, dict) else entry
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def validate_groups(groups):
+    """Raise ValueError unless `groups` has the shape of groups.json. Returns it."""
+    if not isinstance(groups, dict):
+        raise ValueError("groups must be a JSON object")
+    for group_key, group in groups.items():
+        if not isinstance(group, dict) or not all(isinstance(group.get(p), list) for p in ("discord", "telegram")):
+            raise ValueError(f"group {group_key!r} needs discord and telegram lists")
+        for user_id in group["discord"]:
+            if not _is_id(user_id):
+                raise ValueError(f"group {group_key!r} has a Discord user {user_id!r} that isn't a numeric id")
+        for entry in group["telegram"]:
+            if isinstance(entry, dict):
+                ok = _is_id(entry.get("id")) and isinstance(entry.get("username"), (str, type(None)))
+            else:
+                ok = _is_id(entry)
+            if not ok:
+                raise ValueError(f"group {group_key!r} has a malformed Telegram entry {entry!r}")
+    return groups
+
+
+def validate_telegram_users(telegram_users):
+    """Raise ValueError unless `telegram_users` maps Telegram ids to usernames. Returns it."""
+    if not isinstance(telegram_users, dict):
+        raise ValueError("telegram users must be a JSON object")
+    for tg_id, username in telegram_users.items():
+        if not tg_id.lstrip("-").isdigit() or not isinstance(username, str):
+            raise ValueError(f"malformed Telegram user {tg_id!r}: {username!r}")
+    return telegram_users
+
+
+class MembershipRegistry:
+    """Hashed lookups over groups.json and telegram_users.json.
+
+    Wraps the same `groups` and `telegram_users` dicts that get saved to disk
+    and keeps indexes for platform ID -> groups and Telegram username -> ID.
+    Registered usernames are also kept sorted, so autocomplete bisects to a
+    prefix instead of scanning everyone. All changes must go through the
+    add/remove/register methods so the indexes stay in step with the lists. Each change method returns a
+    state_store change record describing the edit, or None if nothing changed.
+    """
+
+    def __init__(self, groups, telegram_users):
+        self.groups = groups
+        self.telegram_users = telegram_users
+        self.rebuild()
+
+    def rebuild(self):
+        self._discord = {}
+        self._telegram = {}
+        self._telegram_ids = {}
+        for group_key in self.group_keys():
+            for user_id in self.groups[group_key]["discord"]:
+                self._discord.setdefault(user_id, set()).add(group_key)
+            for entry in self.groups[group_key]["telegram"]:
+                self._telegram.setdefault(telegram_entry_id(entry), set()).add(group_key)
+        for tg_id, username in self.telegram_users.items():
+            self._telegram_ids[username.lower()] = int(tg_id)
+        # (lowercase name, name, id), sorted
+        self._usernames = sorted((username.lower(), username, int(tg_id))
+                                 for tg_id, username in self.telegram_users.items())
+
+    def group_keys(self):
+        # Known groups first, in the order check-ins have always been matched
+        return [k for k in GROUP_KEYS if k in self.groups] + [k for k in self.groups if k not in GROUP_KEYS]
+
+    def _first(self, found):
+        for group_key in self.group_keys():
+            if group_key in found:
+                return group_key
+        return None
+
+    # --- Lookups ---
+
+    def discord_groups(self, user_id):
+        return self._discord.get(user_id, set())
+
+    def telegram_groups(self, tg_id):
+        return self._telegram.get(tg_id, set())
+
+    def discord_group(self, user_id):
+        return self._first(self.discord_groups(user_id))
+
+    def telegram_group(self, tg_id):
+        return self._first(self.telegram_groups(tg_id))
+
+    def in_group(self, group_key, platform, user_id):
+        index = self._discord if platform == "discord" else self._telegram
+        return group_key in index.get(user_id, ())
+
+    def telegram_id(self, username):
+        return self._telegram_ids.get(username.lstrip("@").lower())
+
+    def search_telegram(self, prefix, limit=25):
+        """Registered Telegram usernames starting with `prefix`, for autocomplete."""
+        prefix = prefix.lower()
+        names = []
+        for i in range(bisect.bisect_left(self._usernames, (prefix,)), len(self._usernames)):
+            lowered, name, _ = self._usernames[i]
+            if not lowered.startswith(prefix) or len(names) >= limit:
+                break
+            names.append(name)
+        return names
+
+    # --- Changes ---
+
+    def register_telegram(self, tg_id, username):
+        old = self.telegram_users.get(str(tg_id))
+        if old is not None:
+            if self._telegram_ids.get(old.lower()) == tg_id:
+                del self._telegram_ids[old.lower()]
+            i = bisect.bisect_left(self._usernames, (old.lower(), old, tg_id))
+            if i < len(self._usernames) and self._usernames[i] == (old.lower(), old, tg_id):
+                del self._usernames[i]
+        self.telegram_users[str(tg_id)] = username
+        self._telegram_ids[username.lower()] = tg_id
+        bisect.insort(self._usernames, (username.lower(), username, tg_id))
+        return {"op": "set", "path": [str(tg_id)], "value": username}
+
+    def add_discord(self, group_key, user_id):
+        if self.in_group(group_key, "discord", user_id):
+            return None
+        self.groups[group_key]["discord"].append(user_id)
+        self._discord.setdefault(user_id, set()).add(group_key)
+        return {"op": "append", "path": [group_key, "discord"], "value": user_id}
+
+    def remove_discord(self, group_key, user_id):
+        if not self.in_group(group_key, "discord", user_id):
+            return None
+        self.groups[group_key]["discord"].remove(user_id)
+        self._discord[user_id].discard(group_key)
+        return {"op": "remove", "path": [group_key, "discord"], "value": user_id}
+
+    def add_telegram(self, group_key, tg_id, username):
+        if self.in_group(group_key, "telegram", tg_id):
+            return None
+        entry = {"id": tg_id, "username": username}
+        self.groups[group_key]["telegram"].append(entry)
+        self._telegram.setdefault(tg_id, set()).add(group_key)
+        return {"op": "append", "path": [group_key, "telegram"], "value": dict(entry)}
+
+    def remove_telegram(self, group_key, tg_id):
+        if not self.in_group(group_key, "telegram", tg_id):
+            return None
+        self.groups[group_key]["telegram"] = [
+            u for u in self.groups[group_key]["telegram"] if telegram_entry_id(u) != tg_id
+        ]
+        self._telegram[tg_id].discard(group_key)
+        return {"op": "remove", "path": [group_key, "telegram"], "match": {"id": tg_id}}
@@ -0,0 +1,307 @@
+"""In-process counters, gauges and latency histograms in Prometheus format.
+
+Hot paths record into the module-level metrics defined at the bottom of
+this file. Recording is a dict update under a lock, cheap enough to do from
+the event loop and from the Sheets worker threads alike. The bot serves
+REGISTRY.render() on a local HTTP endpoint (start_metrics_server) and
+summarizes it in /bot_stats (REGISTRY.summary()).
+"""
+import asyncio
+import math
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def items(self):
+        with self._lock:
+            return sorted(self._values.items())
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in self.items()]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down. set_function() makes it read a callback at render time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn):
+        """`fn()` returns a number, or {label values tuple: number} for a labelled gauge."""
+        self._function = fn
+
+    def items(self):
+        if self._function is not None:
+            try:
+                current = self._function()
+            except Exception:
+                current = {}
+            if not isinstance(current, dict):
+                current = {(): current}
+            with self._lock:
+                self._values = {tuple(str(v) for v in key): value for key, value in current.items()}
+        with self._lock:
+            return sorted(self._values.items())
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in self.items()]
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [bucket counts..., count, sum, max]
+                series = self._values[key] = [0] * len(self.buckets) + [0, 0.0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            n = len(self.buckets)
+            series[n] += 1
+            series[n + 1] += value
+            series[n + 2] = max(series[n + 2], value)
+
+    def time(self, **labels):
+        """Context manager that observes the time spent in its block."""
+        return _Timer(self, labels)
+
+    def items(self):
+        with self._lock:
+            return sorted((key, list(series)) for key, series in self._values.items())
+
+    def quantile(self, series, q):
+        """Estimate the q-quantile of one series by interpolating inside its bucket."""
+        n = len(self.buckets)
+        count = series[n]
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        lower = 0.0
+        for i, bound in enumerate(self.buckets):
+            in_bucket = series[i]
+            if seen + in_bucket >= rank and in_bucket:
+                upper = min(bound, series[n + 2])
+                return lower + (upper - lower) * (rank - seen) / in_bucket
+            seen += in_bucket
+            lower = bound
+        return series[n + 2]
+
+    def render(self):
+        lines = []
+        n = len(self.buckets)
+        for key, series in self.items():
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += series[i]
+                le = (("le", _format_value(bound) if bound == math.inf else repr(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_count{labels} {series[n]}")
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[n + 1])}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self.started_at = time.time()
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name):
+        return self._metrics[name]
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            body = metric.render()
+            if body:
+                lines += metric.header() + body
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Human-readable lines for every series that has data."""
+        uptime = int(time.time() - self.started_at)
+        lines = [f"uptime {uptime // 3600}h{uptime // 60 % 60:02d}m"]
+        for metric in self._metrics.values():
+            for key, value in metric.items():
+                labels = ",".join(key)
+                name = f"{metric.name}[{labels}]" if labels else metric.name
+                if isinstance(metric, Histogram):
+                    n = len(metric.buckets)
+                    if value[n]:
+                        lines.append(f"{name}: n={value[n]} p50={metric.quantile(value, 0.5) * 1000:.0f}ms "
+                                     f"p99={metric.quantile(value, 0.99) * 1000:.0f}ms max={value[n + 2] * 1000:.0f}ms")
+                elif value:
+                    lines.append(f"{name}: {value:g}")
+        return lines
+
+
+async def monitor_event_loop_lag(interval=0.5):
+    """Runs forever, recording how late the event loop wakes from a sleep of `interval` seconds."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        EVENT_LOOP_LAG.observe(lag)
+        EVENT_LOOP_LAG_LAST.set(lag)
+
+
+async def start_metrics_server(host, port, registry=None):
+    """Serve GET /metrics on host:port. Returns the aiohttp runner; call its cleanup() on shutdown."""
+    from aiohttp import web
+
+    registry = registry or REGISTRY
+
+    async def handle(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+REGISTRY = MetricsRegistry()
+
+# --- Check-ins ---
+CHECKINS = REGISTRY.counter("checkins_total", "Check-ins received", ("platform", "tab"))
+CHECKIN_ACK_SECONDS = REGISTRY.histogram(
+    "checkin_ack_seconds", "Time from receiving a check-in to acknowledging it", ("platform",))
+CHECKIN_SYNC_SECONDS = REGISTRY.histogram(
+    "checkin_sync_seconds", "Time from receiving a check-in to writing it to the sheet", ("tab",),
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0))
+REACTION_SECONDS = REGISTRY.histogram("reaction_seconds", "Acknowledgement reaction calls", ("platform", "outcome"))
+CHECKIN_REPORTS = REGISTRY.counter("checkin_reports_total", "Check-in reports by where they came from", ("source",))
+
+# --- Google Sheets ---
+SHEETS_REQUEST_SECONDS = REGISTRY.histogram(
+    "sheets_request_seconds", "Google Sheets API calls, including opening tabs", ("op", "tab", "outcome"))
+SHEETS_QUEUE_SECONDS = REGISTRY.histogram(
+    "sheets_queue_seconds", "Time a Sheets call waited for a free worker thread")
+SHEETS_QUOTA_WAIT_SECONDS = REGISTRY.histogram(
+    "sheets_quota_wait_seconds", "Time a Sheets call waited for read or write quota", ("kind", "priority"))
+SHEETS_QUOTA_ERRORS = REGISTRY.counter("sheets_quota_errors_total", "Quota (429) errors from Google Sheets", ("kind",))
+SHEETS_WRITE_BATCH = REGISTRY.histogram(
+    "sheets_write_batch_size", "Check-ins per batch_update", ("tab",), buckets=(1, 2, 5, 10, 25, 50, 100, 250))
+SHEETS_ARCHIVED_COLUMNS = REGISTRY.counter(
+    "sheets_archived_columns_total", "Period columns moved from a live tab to an archive tab", ("tab",))
+SHEETS_WRITER_QUEUE = REGISTRY.gauge("sheets_writer_queue_depth", "Check-ins waiting for a tab writer", ("tab",))
+JOURNAL_EVENTS = REGISTRY.counter("journal_entries_total", "Journal entries by what happened to them", ("event",))
+
+# --- Discord and Telegram ---
+USER_LOOKUPS = REGISTRY.counter("discord_user_lookups_total", "Discord user lookups by where they were found",
+                                ("source",))
+USER_FETCH_SECONDS = REGISTRY.histogram("discord_user_fetch_seconds", "Discord fetch_user calls", ("outcome",))
+DM_SEND_SECONDS = REGISTRY.histogram("dm_send_seconds", "Direct message sends", ("platform", "outcome"))
+
+# --- Local state and the event loop ---
+STATE_SAVE_SECONDS = REGISTRY.histogram("state_save_seconds", "JSON state file writes", ("file",))
+STATE_RELOADS = REGISTRY.counter("state_reloads_total", "JSON state files reloaded after an outside edit",
+                                 ("file", "outcome"))
+EVENT_LOOP_LAG = REGISTRY.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+EVENT_LOOP_LAG_LAST = REGISTRY.gauge("event_loop_lag_last_seconds", "Most recent event loop lag sample")
+EVENT_LOOP_TASKS = REGISTRY.gauge("event_loop_tasks", "Tasks alive on the event loop")
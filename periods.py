@@ -0,0 +1,45 @@
+"""Check-in periods: which column of a tab a check-in belongs in.
+
+Every period is labelled with the date it starts on (YYYY-MM-DD), so
+weekly and daily columns read the same in the sheet and old daily columns
+stay valid after switching to weekly.
+"""
+from datetime import date, datetime, timedelta
+
+PERIOD_FORMAT = "%Y-%m-%d"
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+
+def parse_label(label):
+    """The date a period column header stands for, or None if it isn't a period column."""
+    try:
+        return datetime.strptime(label, PERIOD_FORMAT).date()
+    except (TypeError, ValueError):
+        return None
+
+
+def quarter(day):
+    return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+
+
+class CheckinPeriods:
+    """`kind` is "weekly" (weeks starting on `week_start`) or "daily"."""
+
+    def __init__(self, kind="weekly", week_start="monday"):
+        if kind not in ("weekly", "daily"):
+            raise ValueError(f"unknown check-in period {kind!r}, use weekly or daily")
+        if week_start.lower() not in WEEKDAYS:
+            raise ValueError(f"unknown week start {week_start!r}")
+        self.kind = kind
+        self.week_start = WEEKDAYS.index(week_start.lower())
+
+    def start(self, day):
+        """First day of the period `day` falls in."""
+        if isinstance(day, datetime):
+            day = day.date()
+        if self.kind == "daily":
+            return day
+        return day - timedelta(days=(day.weekday() - self.week_start) % 7)
+
+    def label(self, when=None):
+        return self.start(when or date.today()).strftime(PERIOD_FORMAT)
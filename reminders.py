@@ -0,0 +1,114 @@
+"""Reminder nudges for group members who haven't answered the current round.
+
+Who is missing comes from a fresh check-in report, which costs one or two
+Sheets reads however big the group is. Only those members are messaged,
+through the broadcast engine's paced per-platform lanes. The state store
+keeps how many reminders each member has had in the current round, so
+nobody gets more than `max_per_member` however often a pass runs. The
+round is keyed by the report's start: the scheduled round, or the current
+check-in period when nothing was scheduled, so an allowance lasts until
+the next round or period begins.
+"""
+import logging
+from datetime import datetime, timezone
+
+from broadcast import Recipient
+from scheduler import recipient_key
+
+log = logging.getLogger(__name__)
+
+
+def round_key(start):
+    return start.astimezone(timezone.utc).isoformat(timespec="seconds")
+
+
+class Reminders:
+    """Sends reminder passes, by hand (remind) or every `interval` after a round starts (tick).
+
+    `build_report()` returns an up-to-date CheckinReport, `round_start(group_key)`
+    when the group's current round began (or None), `send(recipients, text,
+    progress)` delivers to a list of broadcast Recipients and returns their
+    DeliveryResults, and `message_for(group_key)` is the reminder text.
+    """
+
+    def __init__(self, store, build_report, round_start, send, message_for, group_keys, max_per_member=2,
+                 interval=None):
+        self.store = store
+        self.build_report = build_report
+        self.round_start = round_start
+        self.send = send
+        self.message_for = message_for
+        self.group_keys = list(group_keys)
+        self.max_per_member = max_per_member
+        self.interval = interval
+        self.state = store.load({})
+        self._running = set()
+
+    def _round(self, group_key, start):
+        key = round_key(start)
+        state = self.state.get(group_key)
+        if state is None or state.get("round") != key:
+            # A new round: everyone's allowance starts over
+            state = self.state[group_key] = {"round": key, "sent": {}, "passes": []}
+        return state
+
+    def passes(self, group_key, start):
+        state = self.state.get(group_key)
+        return len(state["passes"]) if state and state.get("round") == round_key(start) else 0
+
+    async def remind(self, group_key, progress=None):
+        """Nudge the group's missing members.
+
+        Returns (DeliveryResults, members skipped because they hit the limit),
+        or None if a pass for the group is already running.
+        """
+        if group_key in self._running:
+            return None
+        self._running.add(group_key)
+        try:
+            group = (await self.build_report()).group(group_key)
+            state = self._round(group_key, group.start)
+            recipients = []
+            capped = 0
+            for row in group.rows:
+                if row.status != "missing":
+                    continue
+                member = row.member
+                recipient = Recipient(member.platform, member.user_id, member.name)
+                if state["sent"].get(recipient_key(recipient), 0) >= self.max_per_member:
+                    capped += 1
+                    continue
+                recipients.append(recipient)
+            # Count reminders before sending, so a crash mid-pass can't push anyone over the limit
+            for recipient in recipients:
+                key = recipient_key(recipient)
+                state["sent"][key] = state["sent"].get(key, 0) + 1
+            state["passes"].append(datetime.now(timezone.utc).isoformat(timespec="seconds"))
+            self.store.save(self.state)
+            await self.store.flush()
+            results = await self.send(recipients, self.message_for(group_key), progress) if recipients else []
+            for result in results:
+                if not result.ok:
+                    state["sent"][recipient_key(result.recipient)] -= 1
+            self.store.save(self.state)
+            log.info("Reminded %d of %d missing %s members", sum(1 for r in results if r.ok), len(recipients) + capped,
+                     group_key, extra={"group": group_key, "capped": capped})
+            return results, capped
+        finally:
+            self._running.discard(group_key)
+
+    async def tick(self, now=None):
+        """Run any automatic passes that are due."""
+        if not self.interval:
+            return
+        now = now or datetime.now(timezone.utc)
+        for group_key in self.group_keys:
+            start = self.round_start(group_key)
+            if start is None:
+                continue
+            done = self.passes(group_key, start)
+            if done < self.max_per_member and now >= start + self.interval * (done + 1):
+                await self.remind(group_key)
+
+    async def close(self):
+        await self.store.flush()
@@ -0,0 +1,178 @@
+"""Check-in compliance report: who has answered the current round and who hasn't.
+
+A report is built from the check-in journal alone and costs no Sheets
+requests, however large the roster is. The journal records when each
+answer was received, so answers that have not reached the sheet yet still
+count, and late answers can be told apart. Reports are cached for `ttl`
+seconds. Admins asking at the same time share a single build.
+"""
+import asyncio
+import csv
+import io
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from metrics import CHECKIN_REPORTS
+from periods import CheckinPeriods
+
+log = logging.getLogger(__name__)
+
+STATUSES = ("on_time", "late", "missing")
+
+
+class Member:
+    __slots__ = ("platform", "user_id", "name")
+
+    def __init__(self, platform, user_id, name):
+        self.platform = platform
+        self.user_id = user_id
+        self.name = name
+
+
+class ReportRow:
+    __slots__ = ("member", "status", "first_response")
+
+    def __init__(self, member, status, first_response=None):
+        self.member = member
+        self.status = status
+        self.first_response = first_response
+
+
+class GroupReport:
+    def __init__(self, group_key, tab, start, deadline):
+        self.group_key = group_key
+        self.tab = tab
+        self.start = start
+        self.since = start.date()
+        self.deadline = deadline
+        self.rows = []
+
+    def counts(self):
+        counts = dict.fromkeys(STATUSES, 0)
+        for row in self.rows:
+            counts[row.status] += 1
+        return counts
+
+
+class CheckinReport:
+    def __init__(self, groups, generated_at):
+        self.groups = groups
+        self.generated_at = generated_at
+
+    def group(self, group_key):
+        return next(group for group in self.groups if group.group_key == group_key)
+
+    def summary(self, max_names=25):
+        lines = []
+        for group in self.groups:
+            counts = group.counts()
+            responded = counts["on_time"] + counts["late"]
+            lines.append(f"**{group.tab}** since {group.since:%Y-%m-%d}: {responded}/{len(group.rows)} responded "
+                         f"({counts['late']} late), {counts['missing']} missing")
+            missing = [row.member.name for row in group.rows if row.status == "missing"]
+            if missing:
+                more = f" and {len(missing) - max_names} more" if len(missing) > max_names else ""
+                lines.append("Missing: " + ", ".join(missing[:max_names]) + more)
+        lines.append(f"As of {self.generated_at:%Y-%m-%d %H:%M %Z}")
+        return lines
+
+    def to_csv(self):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["group", "tab", "platform", "user_id", "name", "status", "first_response"])
+        for group in self.groups:
+            for row in group.rows:
+                first = (datetime.fromtimestamp(row.first_response, timezone.utc).isoformat(timespec="seconds")
+                         if row.first_response else "")
+                writer.writerow([group.group_key, group.tab, row.member.platform, row.member.user_id,
+                                 row.member.name, row.status, first])
+        return out.getvalue()
+
+
+class CheckinReporter:
+    """Builds and caches CheckinReports from a CheckinStore.
+
+    `members_for(group_key)` is a coroutine returning that group's Members.
+    `round_start(group_key)` returns when the group's current check-in round
+    began (an aware datetime), or None to count from the start of the
+    current period. A member who first answered more than `late_after`
+    after the round began is late. Answers from earlier in the period the
+    round started in count too. `now()` gives the current local time.
+    """
+
+    def __init__(self, journal, members_for, round_start, tabs, ttl=60.0,
+                 late_after=timedelta(hours=24), periods=None, clock=time.monotonic,
+                 now=lambda: datetime.now().astimezone()):
+        self.journal = journal
+        self.members_for = members_for
+        self.round_start = round_start
+        self.tabs = tabs
+        self.ttl = ttl
+        self.late_after = late_after
+        self.periods = periods or CheckinPeriods()
+        self.clock = clock
+        self.now = now
+        self._cache = {}
+
+    async def report(self, since=None, fresh=False):
+        """The report for rounds starting on date `since` (default: each group's current round).
+
+        fresh=True skips the cache, for callers that act on the result.
+        """
+        now = self.clock()
+        for key in [key for key, (expires, _) in self._cache.items() if expires <= now]:
+            del self._cache[key]
+        cached = self._cache.get(since)
+        if cached is not None and not fresh:
+            CHECKIN_REPORTS.inc(source="cache")
+            return await asyncio.shield(cached[1])
+        CHECKIN_REPORTS.inc(source="journal")
+        task = asyncio.ensure_future(self._build(since))
+        self._cache[since] = (now + self.ttl, task)
+        task.add_done_callback(lambda t: self._drop_failed(since, t))
+        # Shielded so an admin giving up doesn't cancel the build others are waiting on
+        return await asyncio.shield(task)
+
+    def _drop_failed(self, key, task):
+        if task.cancelled() or task.exception() is not None:
+            cached = self._cache.get(key)
+            if cached is not None and cached[1] is task:
+                del self._cache[key]
+
+    def invalidate(self):
+        self._cache.clear()
+
+    def _start(self, group_key, since, now):
+        if since is not None:
+            return datetime.combine(since, datetime.min.time()).astimezone()
+        start = self.round_start(group_key)
+        if start is None:
+            # No round sent: the current period, so the start stays put until the next period begins
+            start = datetime.combine(self.periods.start(now.date()), datetime.min.time())
+        return start.astimezone()
+
+    async def _build(self, since):
+        # Periods are counted in the bot's local time
+        now = self.now()
+        groups = []
+        for group_key, tab in self.tabs.items():
+            start = self._start(group_key, since, now)
+            # Answers from earlier in the period the round started in count as on time
+            period_start = datetime.combine(self.periods.start(start.date()), datetime.min.time()).astimezone()
+            first_seen = await self.journal.first_received(period_start.timestamp())
+            members = await self.members_for(group_key)
+            groups.append(self._group_report(group_key, tab, start, members, first_seen))
+        return CheckinReport(groups, now)
+
+    def _group_report(self, group_key, tab, start, members, first_seen):
+        deadline = start + self.late_after
+        report = GroupReport(group_key, tab, start, deadline)
+        for member in members:
+            received = first_seen.get((member.platform, str(member.user_id), tab))
+            if received is None:
+                status = "missing"
+            else:
+                status = "late" if received > deadline.timestamp() else "on_time"
+            report.rows.append(ReportRow(member, status, received))
+        return report
@@ -0,0 +1,275 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+log = logging.getLogger(__name__)
+
+
+class CronSchedule:
+    """Five-field cron expression: minute hour day-of-month month day-of-week.
+
+    Supports `*`, numbers, lists (1,3), ranges (1-5) and steps (*/15, 1-10/2).
+    Day of week runs 0-6 from Sunday (7 is also Sunday). As in cron, when both
+    day fields are restricted a day matches if either one does.
+    """
+
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError("cron expression needs 5 fields: minute hour day month weekday")
+        self.expr = " ".join(fields)
+        parsed = []
+        for field, (low, high) in zip(fields, self.RANGES):
+            parsed.append(self._parse_field(field, low, high + (1 if high == 6 else 0)))
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {d % 7 for d in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for part in field.split(","):
+            base, _, step = part.partition("/")
+            step = int(step) if step else 1
+            if base == "*":
+                start, end = low, high
+            elif "-" in base:
+                start, end = (int(x) for x in base.split("-", 1))
+            else:
+                start = end = int(base)
+                if step > 1:
+                    end = high
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"cron field '{field}' is out of range {low}-{high}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt):
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day:
+            return weekday_ok
+        if self.any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def matches(self, dt):
+        return (dt.minute in self.minutes and dt.hour in self.hours
+                and dt.month in self.months and self._day_matches(dt))
+
+    def next_after(self, dt):
+        """First matching minute strictly after `dt`, in dt's timezone."""
+        tz = dt.tzinfo
+        local = dt.replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        limit = local + timedelta(days=366 * 5)
+        while local < limit:
+            if local.month not in self.months or not self._day_matches(local):
+                local = (local + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if local.hour not in self.hours:
+                local = (local + timedelta(hours=1)).replace(minute=0)
+                continue
+            if local.minute in self.minutes:
+                return local.replace(tzinfo=tz)
+            local += timedelta(minutes=1)
+        raise ValueError(f"cron expression '{self.expr}' never fires")
+
+
+def recipient_key(recipient):
+    return f"{recipient.platform}:{recipient.address}"
+
+
+class CheckinScheduler:
+    """Sends check-ins on a per-group cron schedule, spread across a window.
+
+    Schedules live in a JsonStateStore so they survive restarts. Every run is
+    written to disk before its first message goes out, and each recipient is
+    marked off just before they are sent to (a change record, when the store
+    keeps a change log). After a restart an unfinished
+    run resumes with the recipients it has not reached yet, so nobody gets
+    pinged twice. Slots missed while the bot was down are caught up only
+    while their window is still open.
+    """
+
+    def __init__(self, store, recipients_for, message_for, deliver):
+        self.store = store
+        self.recipients_for = recipients_for
+        self.message_for = message_for
+        self.deliver = deliver
+        self.schedules = store.load({})
+        self._tasks = {}
+
+    def _save(self, change=None):
+        self.store.save(self.schedules, change)
+
+    @staticmethod
+    def _now():
+        return datetime.now(timezone.utc)
+
+    # --- Admin operations ---
+
+    def set_schedule(self, group_key, cron, tz_name="UTC", window_minutes=60, now=None):
+        if window_minutes < 0:
+            raise ValueError("window_minutes must not be negative")
+        now = now or self._now()
+        # Raises for a cron that never fires, before anything is stored
+        next_slot = CronSchedule(cron).next_after(now.astimezone(ZoneInfo(tz_name)))
+        schedule = self.schedules.setdefault(group_key, {})
+        schedule.update({
+            "cron": cron,
+            "timezone": tz_name,
+            "window_minutes": window_minutes,
+            "paused": schedule.get("paused", False),
+            # Start counting from now so setting a schedule never fires a past slot
+            "last_slot": now.isoformat(),
+        })
+        self._save()
+        return next_slot
+
+    def set_paused(self, group_key, paused):
+        schedule = self.schedules.get(group_key)
+        if schedule is None:
+            return False
+        schedule["paused"] = paused
+        self._save()
+        if paused:
+            task = self._tasks.pop(group_key, None)
+            if task is not None:
+                task.cancel()
+        return True
+
+    def trigger(self, group_key, now=None):
+        """Start a staggered run right away, unless one is already in progress."""
+        if self._active_run(group_key):
+            return False
+        schedule = self.schedules.setdefault(group_key, {"window_minutes": 60, "paused": False})
+        self._start_run(group_key, schedule, now or self._now())
+        return True
+
+    def next_slot(self, group_key, now=None):
+        schedule = self.schedules.get(group_key)
+        if not schedule or "cron" not in schedule:
+            return None
+        tz = ZoneInfo(schedule["timezone"])
+        after = max(datetime.fromisoformat(schedule["last_slot"]), now or self._now())
+        return CronSchedule(schedule["cron"]).next_after(after.astimezone(tz))
+
+    def describe(self, now=None):
+        lines = []
+        for group_key, schedule in sorted(self.schedules.items()):
+            if "cron" in schedule:
+                state = "paused" if schedule.get("paused") else f"next {self.next_slot(group_key, now):%Y-%m-%d %H:%M %Z}"
+                line = (f"{group_key}: `{schedule['cron']}` {schedule['timezone']}, "
+                        f"spread over {schedule['window_minutes']} min, {state}")
+            else:
+                line = f"{group_key}: no schedule"
+            run = schedule.get("run")
+            if run and not run.get("done"):
+                line += f" (sending: {len(run['sent'])} done)"
+            lines.append(line)
+        return lines
+
+    # --- Runs ---
+
+    def _active_run(self, group_key):
+        run = self.schedules.get(group_key, {}).get("run")
+        return run is not None and not run.get("done")
+
+    def due_slot(self, group_key, now):
+        """Latest slot that has come up since the last run and whose window is still open."""
+        schedule = self.schedules[group_key]
+        cron = CronSchedule(schedule["cron"])
+        tz = ZoneInfo(schedule["timezone"])
+        slot = datetime.fromisoformat(schedule["last_slot"]).astimezone(tz)
+        latest = None
+        for _ in range(10000):
+            slot = cron.next_after(slot)
+            if slot > now:
+                break
+            latest = slot
+        if latest is None:
+            return None
+        if now - latest > timedelta(minutes=schedule.get("window_minutes", 60)):
+            # Missed while offline and the window has closed; skip it
+            schedule["last_slot"] = latest.isoformat()
+            self._save()
+            log.warning("Skipped missed %s slot %s", group_key, latest.isoformat())
+            return None
+        return latest
+
+    def _start_run(self, group_key, schedule, slot):
+        schedule["last_slot"] = slot.isoformat()
+        schedule["run"] = {"slot": slot.isoformat(), "started": self._now().isoformat(), "sent": [], "done": False}
+        self._save()
+        self._spawn(group_key)
+
+    def _spawn(self, group_key):
+        task = self._tasks.get(group_key)
+        if task is None or task.done():
+            self._tasks[group_key] = asyncio.create_task(self._dispatch(group_key), name=f"scheduled-checkin:{group_key}")
+
+    async def tick(self, now=None):
+        now = now or self._now()
+        for group_key, schedule in list(self.schedules.items()):
+            if schedule.get("paused"):
+                continue
+            if self._active_run(group_key):
+                # Left over from before a restart (or still running)
+                self._spawn(group_key)
+                continue
+            if "cron" not in schedule:
+                continue
+            slot = self.due_slot(group_key, now)
+            if slot is not None:
+                log.info("Starting %s check-in for slot %s", group_key, slot.isoformat())
+                self._start_run(group_key, schedule, slot)
+
+    async def _dispatch(self, group_key):
+        schedule = self.schedules[group_key]
+        run = schedule["run"]
+        # The run record must be on disk before anyone is messaged
+        await self.store.flush()
+        sent = set(run["sent"])
+        remaining = [r for r in self.recipients_for(group_key) if recipient_key(r) not in sent]
+        window_end = datetime.fromisoformat(run["started"]) + timedelta(minutes=schedule.get("window_minutes", 60))
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        spread = max(0.0, (window_end - self._now()).total_seconds())
+        spacing = spread / len(remaining) if remaining else 0.0
+        text = self.message_for(group_key)
+        delivered = 0
+        for i, recipient in enumerate(remaining):
+            delay = start + i * spacing - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # Mark before sending: after a crash a recipient may miss one ping but never gets two
+            run["sent"].append(recipient_key(recipient))
+            # With a change-logged store this appends one line instead of rewriting every schedule
+            self._save({"op": "append", "path": [group_key, "run", "sent"], "value": recipient_key(recipient)})
+            await self.store.flush()
+            result = await self.deliver(recipient, text)
+            if getattr(result, "ok", result):
+                delivered += 1
+            else:
+                run.setdefault("failed", []).append(recipient_key(recipient))
+        run["done"] = True
+        run["finished"] = self._now().isoformat()
+        self._save()
+        await self.store.flush()
+        log.info("%s check-in delivered to %d/%d remaining recipients", group_key, delivered, len(remaining),
+                 extra={"group": group_key, "delivered": delivered, "recipients": len(remaining)})
+
+    async def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+        for task in self._tasks.values():
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks.clear()
+        await self.store.flush()
@@ -0,0 +1,736 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import gspread
+from gspread.utils import absolute_range_name, rowcol_to_a1
+from oauth2client.service_account import ServiceAccountCredentials
+
+from metrics import (SHEETS_QUEUE_SECONDS, SHEETS_QUOTA_ERRORS, SHEETS_QUOTA_WAIT_SECONDS, SHEETS_REQUEST_SECONDS,
+                     SHEETS_WRITE_BATCH)
+
+log = logging.getLogger(__name__)
+
+SHEET_NAME = "Weekly Checkins"
+SHEET_SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+# Refresh the access token this long before it actually expires
+TOKEN_REFRESH_MARGIN = timedelta(minutes=10)
+
+# Lower numbers go first when Sheets quota is scarce
+PRIORITY_USER = 0
+PRIORITY_BACKGROUND = 1
+
+WRITE_METHODS = {"batch_update", "update_cell", "add_worksheet", "delete_columns", "resize"}
+
+
+def load_service_account_credentials():
+    creds_dict = {
+        "type": os.getenv("GOOGLE_TYPE"),
+        "project_id": os.getenv("GOOGLE_PROJECT_ID"),
+        "private_key_id": os.getenv("GOOGLE_PRIVATE_KEY_ID"),
+        "private_key": os.getenv("GOOGLE_PRIVATE_KEY").replace('\\n', '\n'),
+        "client_email": os.getenv("GOOGLE_CLIENT_EMAIL"),
+        "client_id": os.getenv("GOOGLE_CLIENT_ID"),
+        "auth_uri": os.getenv("GOOGLE_AUTH_URI"),
+        "token_uri": os.getenv("GOOGLE_TOKEN_URI"),
+        "auth_provider_x509_cert_url": os.getenv("GOOGLE_AUTH_PROVIDER_X509_CERT_URL"),
+        "client_x509_cert_url": os.getenv("GOOGLE_CLIENT_X509_CERT_URL"),
+        "universe_domain": os.getenv("GOOGLE_UNIVERSE_DOMAIN")
+    }
+    return ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, SHEET_SCOPE)
+
+
+class SheetSession:
+    """Long-lived Google Sheets session.
+
+    Authorizes once, opens the spreadsheet once (by key when GOOGLE_SHEET_ID is
+    set, otherwise by name) and caches one Worksheet object per tab. Call
+    invalidate() when a tab is renamed or deleted so the next access reopens it.
+    """
+
+    def __init__(self, spreadsheet_key=None, spreadsheet_name=SHEET_NAME,
+                 credentials_factory=load_service_account_credentials,
+                 authorize=gspread.authorize):
+        self.spreadsheet_key = spreadsheet_key
+        self.spreadsheet_name = spreadsheet_name
+        self._credentials_factory = credentials_factory
+        self._authorize = authorize
+        self._lock = threading.RLock()
+        self._credentials = None
+        self._client = None
+        self._spreadsheet = None
+        self._worksheets = {}
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._credentials = self._credentials_factory()
+                self._client = self._authorize(self._credentials)
+            return self._client
+
+    def spreadsheet(self):
+        with self._lock:
+            if self._spreadsheet is None:
+                client = self.client()
+                if self.spreadsheet_key:
+                    self._spreadsheet = client.open_by_key(self.spreadsheet_key)
+                else:
+                    # Opening by name costs a Drive search, so remember the key for later reopens
+                    self._spreadsheet = client.open(self.spreadsheet_name)
+                    self.spreadsheet_key = self._spreadsheet.id
+                log.info("Opened spreadsheet %s", self.spreadsheet_key)
+            return self._spreadsheet
+
+    def worksheet(self, tab_name):
+        with self._lock:
+            sheet = self._worksheets.get(tab_name)
+            if sheet is None:
+                outcome = "error"
+                start = time.perf_counter()
+                try:
+                    sheet = self.spreadsheet().worksheet(tab_name)
+                    outcome = "ok"
+                finally:
+                    SHEETS_REQUEST_SECONDS.observe(time.perf_counter() - start, op="open", tab=tab_name,
+                                                   outcome=outcome)
+                self._worksheets[tab_name] = sheet
+            return sheet
+
+    def invalidate(self, tab_name=None):
+        """Drop a cached worksheet (or everything, when tab_name is None)."""
+        with self._lock:
+            if tab_name is None:
+                self._worksheets.clear()
+                self._spreadsheet = None
+            else:
+                self._worksheets.pop(tab_name, None)
+        log.info("Invalidated %s", tab_name or "spreadsheet")
+
+    def reopen(self, tab_name):
+        self.invalidate(tab_name)
+        try:
+            return self.worksheet(tab_name)
+        except gspread.WorksheetNotFound:
+            # The tab list itself may be stale, refetch the spreadsheet metadata
+            self.invalidate()
+            return self.worksheet(tab_name)
+
+    def _auth(self):
+        # gspread converts what it is given into google-auth credentials of its own; those sign the requests
+        return self._client.http_client.auth if self._client is not None else None
+
+    def token_expires_soon(self, now=None):
+        auth = self._auth()
+        if auth is None or auth.expiry is None:
+            # No token fetched yet; the first request fetches one
+            return False
+        now = now or datetime.utcnow()
+        return auth.expiry - now <= TOKEN_REFRESH_MARGIN
+
+    def refresh_token(self, force=False):
+        """Refresh the access token ahead of expiry. Returns True when a refresh happened."""
+        with self._lock:
+            if self._client is None:
+                self.client()
+                return True
+            if not force and not self.token_expires_soon():
+                return False
+            from google.auth.transport.requests import Request
+            self._auth().refresh(Request())
+            log.info("Refreshed access token")
+            return True
+
+
+def column_range(tab_name, first, last=None):
+    """A1 range for whole columns first..last of a tab, e.g. 'Developers'!C:E."""
+    letters = [rowcol_to_a1(1, col)[:-1] for col in (first, last or first)]
+    return absolute_range_name(tab_name, ":".join(letters))
+
+
+def is_quota_error(exc):
+    if not isinstance(exc, gspread.exceptions.APIError):
+        return False
+    return exc.code == 429 or exc.error.get("status") == "RESOURCE_EXHAUSTED"
+
+
+class TokenBucket:
+    """Refills at `per_minute` tokens a minute and holds at most `burst`. per_minute=0 means unlimited."""
+
+    def __init__(self, per_minute, burst, clock=time.monotonic):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.clock = clock
+        self._updated = clock()
+
+    def wait_time(self):
+        """Seconds until a token is available (0 if one is available now)."""
+        if self.rate <= 0:
+            return 0.0
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class SheetsQuota:
+    """Shared read and write budgets in front of every Sheets call.
+
+    Callers wait for a token from the read or write bucket. Waiters are
+    served by priority and then in arrival order, so check-in writes
+    (PRIORITY_USER) go ahead of index verification and reports
+    (PRIORITY_BACKGROUND). When Google answers with a quota error, backoff()
+    pauses the whole bucket for an exponentially growing, jittered delay, so
+    every caller waits it out together rather than retrying on its own.
+    Only used from the event loop.
+    """
+
+    def __init__(self, reads_per_minute=60, writes_per_minute=60, burst=10, max_backoff=64.0, clock=time.monotonic):
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.buckets = {"read": TokenBucket(reads_per_minute, burst, clock),
+                        "write": TokenBucket(writes_per_minute, burst, clock)}
+        self._waiters = {"read": [], "write": []}
+        self._pumps = {}
+        self._paused_until = {"read": 0.0, "write": 0.0}
+        self._failures = {"read": 0, "write": 0}
+        self._seq = itertools.count()
+
+    def clone(self):
+        """A fresh quota with the same settings."""
+        return self.share(1)
+
+    def share(self, fraction):
+        """A fresh quota with `fraction` of these budgets, for one of several processes using the same project."""
+        read, write = self.buckets["read"], self.buckets["write"]
+        return SheetsQuota(read.per_minute * fraction, write.per_minute * fraction,
+                           max(1, round(read.capacity * fraction)), self.max_backoff, self.clock)
+
+    def waiting(self):
+        return {kind: len(waiters) for kind, waiters in self._waiters.items()}
+
+    async def acquire(self, kind, priority=PRIORITY_USER):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters[kind], (priority, next(self._seq), future))
+        pump = self._pumps.get(kind)
+        if pump is None or pump.done() or pump.get_loop() is not loop:
+            self._pumps[kind] = asyncio.create_task(self._pump(kind), name=f"sheets-quota:{kind}")
+        start = loop.time()
+        await future
+        SHEETS_QUOTA_WAIT_SECONDS.observe(loop.time() - start, kind=kind,
+                                          priority="user" if priority == PRIORITY_USER else "background")
+
+    async def _pump(self, kind):
+        loop = asyncio.get_running_loop()
+        bucket = self.buckets[kind]
+        waiters = self._waiters[kind]
+        while waiters:
+            delay = max(bucket.wait_time(), self._paused_until[kind] - self.clock())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(waiters)
+            if future.done() or future.get_loop() is not loop:
+                # Cancelled, or left over from an event loop that has gone away
+                continue
+            bucket.take()
+            future.set_result(None)
+
+    def backoff(self, kind, exc=None):
+        """Pause every `kind` caller after a quota error. Returns the pause in seconds."""
+        self._failures[kind] += 1
+        delay = min(self.max_backoff, 2.0 ** (self._failures[kind] - 1))
+        # Full jitter on the top half, so callers that were paused together don't all retry at once
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        retry_after = getattr(getattr(exc, "response", None), "headers", {}).get("Retry-After")
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        self._paused_until[kind] = max(self._paused_until[kind], self.clock() + delay)
+        SHEETS_QUOTA_ERRORS.inc(kind=kind)
+        log.warning("Sheets %s quota exceeded, pausing %s calls for %.1fs", kind, kind, delay)
+        return delay
+
+    def succeeded(self, kind):
+        self._failures[kind] = 0
+
+
+class SheetsIO:
+    """Awaitable front for blocking gspread calls.
+
+    Every call runs in a bounded thread pool so a slow Sheets request never
+    stalls the event loop (gateway heartbeats, Telegram polling, slash
+    commands). max_workers caps how many requests are in flight at once and
+    each call is abandoned after `timeout` seconds. With a SheetsQuota, every
+    worksheet call first waits for quota, and quota errors are retried up
+    to `quota_retries` times after the quota's shared backoff.
+    """
+
+    def __init__(self, session, max_workers=4, timeout=30.0, quota=None, quota_retries=5):
+        self.session = session
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.quota = quota
+        self.quota_retries = quota_retries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sheets-io")
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+
+        def timed():
+            SHEETS_QUEUE_SECONDS.observe(time.perf_counter() - submitted)
+            return fn(*args, **kwargs)
+
+        future = loop.run_in_executor(self._executor, timed)
+        return await asyncio.wait_for(future, timeout or self.timeout)
+
+    async def worksheet(self, tab_name):
+        return await self.run(self.session.worksheet, tab_name)
+
+    async def _call(self, tab_name, method, *args, priority=PRIORITY_USER, **kwargs):
+        """Call `method` on the tab's Worksheet, or on the Spreadsheet when tab_name is None."""
+        def call():
+            target = self.session.spreadsheet() if tab_name is None else self.session.worksheet(tab_name)
+            outcome = "error"
+            start = time.perf_counter()
+            try:
+                result = getattr(target, method)(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                SHEETS_REQUEST_SECONDS.observe(time.perf_counter() - start, op=method, tab=tab_name or "*",
+                                               outcome=outcome)
+
+        if self.quota is None:
+            return await self.run(call)
+        # Opening a tab inside call() is not counted; it happens once per tab and process
+        kind = "write" if method in WRITE_METHODS else "read"
+        for attempt in range(self.quota_retries + 1):
+            await self.quota.acquire(kind, priority)
+            try:
+                result = await self.run(call)
+            except gspread.exceptions.APIError as e:
+                if not is_quota_error(e) or attempt == self.quota_retries:
+                    raise
+                self.quota.backoff(kind, e)
+                continue
+            self.quota.succeeded(kind)
+            return result
+
+    async def get_all_values(self, tab_name, priority=PRIORITY_USER):
+        return await self._call(tab_name, "get_all_values", priority=priority)
+
+    async def find(self, tab_name, query, priority=PRIORITY_USER):
+        return await self._call(tab_name, "find", query, priority=priority)
+
+    async def col_values(self, tab_name, col, priority=PRIORITY_USER):
+        return await self._call(tab_name, "col_values", col, priority=priority)
+
+    async def row_values(self, tab_name, row, priority=PRIORITY_USER):
+        return await self._call(tab_name, "row_values", row, priority=priority)
+
+    async def batch_get(self, tab_name, ranges, priority=PRIORITY_USER):
+        return await self._call(tab_name, "batch_get", ranges, priority=priority)
+
+    async def values_batch_get(self, ranges, major_dimension="ROWS", priority=PRIORITY_USER):
+        """Read ranges from any tabs ("'Tab'!A:A") in a single request. Returns the valueRanges list."""
+        response = await self._call(None, "values_batch_get", ranges, params={"majorDimension": major_dimension},
+                                    priority=priority)
+        return response.get("valueRanges", [])
+
+    async def batch_update(self, tab_name, data, priority=PRIORITY_USER):
+        # raw=False matches update_cell: values are parsed as if typed into the sheet
+        return await self._call(tab_name, "batch_update", data, raw=False, priority=priority)
+
+    async def add_worksheet(self, tab_name, rows, cols, priority=PRIORITY_USER):
+        return await self._call(None, "add_worksheet", tab_name, rows, cols, priority=priority)
+
+    async def delete_columns(self, tab_name, first, last, priority=PRIORITY_USER):
+        """Delete columns first..last (1-based, inclusive); columns to the right shift left."""
+        return await self._call(tab_name, "delete_columns", first, last, priority=priority)
+
+    async def ensure_size(self, tab_name, rows, cols, priority=PRIORITY_USER):
+        """Grow the tab's grid to at least rows x cols. Never shrinks it."""
+        sheet = await self.worksheet(tab_name)
+        if sheet.row_count < rows or sheet.col_count < cols:
+            await self._call(tab_name, "resize", max(rows, sheet.row_count), max(cols, sheet.col_count),
+                             priority=priority)
+
+    async def cell(self, tab_name, row, col, priority=PRIORITY_USER):
+        return await self._call(tab_name, "cell", row, col, priority=priority)
+
+    async def update_cell(self, tab_name, row, col, value, priority=PRIORITY_USER):
+        return await self._call(tab_name, "update_cell", row, col, value, priority=priority)
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _trim_discriminator(name):
+    # "name#0" is how Discord's new usernames were written before the discriminator went away
+    return name[:-2] if name.endswith("#0") else name
+
+
+class TabIndex:
+    """In-memory layout of one check-in tab.
+
+    Maps user names in column A to their row and header labels in row 1 to
+    their column, and keeps the values of any cells that have been read or
+    written so appending to a cell does not need a read first.
+    """
+
+    def __init__(self, tab_name, names, header):
+        self.tab_name = tab_name
+        self.rows = {}
+        self.columns = {}
+        self.cells = {}
+        self.loaded_columns = set()
+        self.loaded_cells = set()
+        self.built_at = time.monotonic()
+        # Row 1 is the header, users start at row 2
+        self.row_count = max(len(names), 1)
+        self.col_count = len(header)
+        for i, name in enumerate(names[1:], start=2):
+            self._index_name(name, i)
+        for i, label in enumerate(header, start=1):
+            if label:
+                self.columns.setdefault(label, i)
+
+    def _index_name(self, name, row):
+        if not name:
+            return
+        self.rows.setdefault(name, row)
+        self.rows.setdefault(_trim_discriminator(name), row)
+
+    def find_row(self, *names):
+        rows = [self.rows[name] for name in names if name in self.rows]
+        return min(rows) if rows else None
+
+    def find_column(self, label):
+        return self.columns.get(label)
+
+    def add_row(self, name):
+        self.row_count += 1
+        self._index_name(name, self.row_count)
+        return self.row_count
+
+    def add_column(self, label):
+        self.col_count += 1
+        self.columns[label] = self.col_count
+        # A brand new column is empty, no need to read it
+        self.loaded_columns.add(self.col_count)
+        return self.col_count
+
+    def load_column(self, col, values):
+        for row, value in enumerate(values, start=1):
+            if value:
+                self.cells[(row, col)] = value
+        self.loaded_columns.add(col)
+
+    def load_cell(self, row, col, value):
+        if value:
+            self.cells[(row, col)] = value
+        self.loaded_cells.add((row, col))
+
+    def is_loaded(self, row, col):
+        return col in self.loaded_columns or (row, col) in self.loaded_cells
+
+    def get_cell(self, row, col):
+        return self.cells.get((row, col), "")
+
+    def set_cell(self, row, col, value):
+        self.cells[(row, col)] = value
+        self.loaded_cells.add((row, col))
+
+    def same_layout(self, other):
+        return (self.rows == other.rows and self.columns == other.columns
+                and self.row_count == other.row_count and self.col_count == other.col_count)
+
+
+class SheetIndex:
+    """Per-tab TabIndex cache, built from column A and row 1 on first use."""
+
+    def __init__(self, io):
+        self.io = io
+        self._indexes = {}
+        self._locks = {}
+
+    def _lock(self, tab_name):
+        if tab_name not in self._locks:
+            self._locks[tab_name] = asyncio.Lock()
+        return self._locks[tab_name]
+
+    async def _build(self, tab_name, priority=PRIORITY_USER):
+        # Column A and row 1 in one request, never the rest of the grid
+        names, header = await self.io.batch_get(tab_name, ["A:A", "1:1"], priority=priority)
+        return TabIndex(tab_name, [line[0] if line else "" for line in names], header[0] if header else [])
+
+    async def get(self, tab_name):
+        index = self._indexes.get(tab_name)
+        if index is not None:
+            return index
+        async with self._lock(tab_name):
+            index = self._indexes.get(tab_name)
+            if index is None:
+                index = await self._build(tab_name)
+                self._indexes[tab_name] = index
+                log.info("Indexed %s: %d rows, %d columns", tab_name, index.row_count, index.col_count)
+            return index
+
+    async def column(self, tab_name, col):
+        """Return the index with `col` loaded into its cell cache."""
+        index = await self.get(tab_name)
+        if col not in index.loaded_columns:
+            values = await self.io.col_values(tab_name, col)
+            index.load_column(col, values)
+        return index
+
+    def invalidate(self, tab_name=None):
+        if tab_name is None:
+            self._indexes.clear()
+        else:
+            self._indexes.pop(tab_name, None)
+
+    def tabs(self):
+        return list(self._indexes)
+
+    def cached(self, tab_name):
+        """The index if it has already been built, without reading the sheet."""
+        return self._indexes.get(tab_name)
+
+    async def verify(self, tab_name):
+        """Rebuild the index from the sheet. Returns True if the cached layout had drifted."""
+        fresh = await self._build(tab_name, PRIORITY_BACKGROUND)
+        cached = self._indexes.get(tab_name)
+        self._indexes[tab_name] = fresh
+        drifted = cached is not None and not cached.same_layout(fresh)
+        if drifted:
+            log.warning("Index for %s was out of date, rebuilt", tab_name)
+        return drifted
+
+
+class CheckinLayoutError(Exception):
+    pass
+
+
+class PendingCheckin:
+    __slots__ = ("names", "display_name", "period", "text", "replace", "future")
+
+    def __init__(self, names, display_name, period, text, future, replace=False):
+        self.names = names
+        self.display_name = display_name
+        self.period = period
+        self.text = text
+        self.replace = replace
+        self.future = future
+
+
+class TabWriter:
+    """Single owner of all check-in writes to one tab.
+
+    Check-ins are queued and flushed together once `max_batch` are waiting or
+    `flush_interval` seconds after the first one arrived. A flush allocates new
+    user rows and period columns in arrival order, appends every message to
+    its cell in order (or, with replace, sets the cell to it), and sends the
+    whole lot as one batch_update.
+    """
+
+    def __init__(self, tab_name, io, index, flush_interval=1.0, max_batch=50):
+        self.tab_name = tab_name
+        self.io = io
+        self.index = index
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        self._task = None
+        self._lock = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"sheet-writer:{self.tab_name}")
+
+    def exclusive(self):
+        """Lock held while a batch is written. Hold it to change the tab's layout without racing a flush."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def submit(self, names, display_name, period, text, replace=False):
+        """Queue a check-in and wait until it is written. Returns (row, col).
+
+        With `replace`, `text` is the cell's whole new value rather than a line to append.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait(PendingCheckin(list(names), display_name, period, text, future, replace))
+        return await future
+
+    async def close(self):
+        if self._task is None:
+            return
+        self.queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self.queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        try:
+            async with self.exclusive():
+                results = await self._write(batch)
+        except Exception as e:
+            log.warning("Flush of %d check-ins to %s failed: %s", len(batch), self.tab_name, e)
+            self.index.invalidate(self.tab_name)
+            results = [e] * len(batch)
+        for pending, result in zip(batch, results):
+            if pending.future.done():
+                continue
+            if isinstance(result, Exception):
+                pending.future.set_exception(result)
+            else:
+                pending.future.set_result(result)
+
+    def _allocate(self, index, batch):
+        new_rows = {}
+        new_cols = {}
+        placements = []
+        for pending in batch:
+            row = index.find_row(*pending.names)
+            if row is None:
+                row = index.add_row(pending.display_name)
+                new_rows[row] = pending.display_name
+            col = index.find_column(pending.period)
+            if col is None:
+                col = index.add_column(pending.period)
+                new_cols[col] = pending.period
+            placements.append((row, col))
+        return placements, new_rows, new_cols
+
+    async def _read(self, index, new_rows, new_cols, cells):
+        """Load `cells` into the index and check that the row and column slots we are about to claim are empty.
+
+        Someone may have edited the sheet since it was indexed. Everything is
+        read in one request covering only those slots and cells. Returns
+        False if a slot has been taken.
+        """
+        slots = []
+        if new_rows:
+            slots.append(f"{rowcol_to_a1(min(new_rows), 1)}:{rowcol_to_a1(max(new_rows), 1)}")
+        if new_cols:
+            slots.append(f"{rowcol_to_a1(1, min(new_cols))}:{rowcol_to_a1(1, max(new_cols))}")
+        cells = sorted(cells)
+        if not slots and not cells:
+            return True
+        value_ranges = await self.io.batch_get(self.tab_name, slots + [rowcol_to_a1(row, col) for row, col in cells])
+        if any(value for value_range in value_ranges[:len(slots)] for line in value_range for value in line):
+            return False
+        for (row, col), value_range in zip(cells, value_ranges[len(slots):]):
+            index.load_cell(row, col, value_range[0][0] if value_range and value_range[0] else "")
+        return True
+
+    async def _write(self, batch):
+        for attempt in range(2):
+            index = await self.index.get(self.tab_name)
+            placements, new_rows, new_cols = self._allocate(index, batch)
+            # Existing cells we append to and haven't seen yet; new rows and columns start out empty
+            unread = {(row, col) for pending, (row, col) in zip(batch, placements)
+                      if not pending.replace and row not in new_rows and row != 1 and col != 1
+                      and not index.is_loaded(row, col)}
+            if await self._read(index, new_rows, new_cols, unread):
+                break
+            log.warning("Layout of %s changed under us, rebuilding index", self.tab_name)
+            self.index.invalidate(self.tab_name)
+        else:
+            raise RuntimeError(f"sheet layout of {self.tab_name} kept changing while recording check-ins")
+        updates = {}
+        results = []
+        for pending, (row, col) in zip(batch, placements):
+            if col == 1 or row == 1:
+                results.append(CheckinLayoutError("refusing to write message to username column or header row"))
+                continue
+            existing = updates.get((row, col), index.get_cell(row, col))
+            if pending.replace:
+                value = pending.text
+            else:
+                value = existing + "\n" + pending.text if existing else pending.text
+            if value != existing:
+                updates[(row, col)] = value
+            results.append((row, col))
+        data = [{"range": rowcol_to_a1(row, 1), "values": [[name]]} for row, name in sorted(new_rows.items())]
+        data += [{"range": rowcol_to_a1(1, col), "values": [[label]]} for col, label in sorted(new_cols.items())]
+        data += [{"range": rowcol_to_a1(row, col), "values": [[value]]} for (row, col), value in updates.items()]
+        if not data:
+            # Every replaced cell already held its new value
+            return results
+        await self.io.batch_update(self.tab_name, data)
+        SHEETS_WRITE_BATCH.observe(len(batch), tab=self.tab_name)
+        for (row, col), value in updates.items():
+            index.set_cell(row, col, value)
+        if new_rows or new_cols:
+            log.info("Added %d rows and %d columns to %s", len(new_rows), len(new_cols), self.tab_name)
+        return results
+
+
+class SheetWriter:
+    """One TabWriter per tab, created on first use."""
+
+    def __init__(self, io, index, flush_interval=1.0, max_batch=50):
+        self.io = io
+        self.index = index
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._writers = {}
+
+    def tab(self, tab_name):
+        writer = self._writers.get(tab_name)
+        if writer is None:
+            writer = TabWriter(tab_name, self.io, self.index, self.flush_interval, self.max_batch)
+            self._writers[tab_name] = writer
+        return writer
+
+    async def submit(self, tab_name, names, display_name, period, text, replace=False):
+        return await self.tab(tab_name).submit(names, display_name, period, text, replace)
+
+    def queue_depths(self):
+        return {tab_name: writer.queue.qsize() for tab_name, writer in self._writers.items()}
+
+    async def close(self):
+        for writer in self._writers.values():
+            await writer.close()
@@ -18,9 +18,9 @@ done
 # Function to handle exit
 cleanup() {
   echo "Shutting down bot..."
-  if [ ! -z "$BOT_PID" ]; then
-    kill $BOT_PID 2>/dev/null || true
-  fi
+  for pid in $BOT_PID "${ROLE_PIDS[@]}"; do
+    kill $pid 2>/dev/null || true
+  done
   exit 0
 }
 
@@ -32,6 +32,40 @@ export TELEGRAM_MAX_RETRIES=3
 export TELEGRAM_RETRY_DELAY=5
 export TELEGRAM_CONTINUE_ON_ERROR=true
 
+# Split mode: BOT_PROCESSES="discord telegram sheets" runs one bot.py per role, each restarted on its own.
+# Each process gets its own log files and metrics port (METRICS_PORT, METRICS_PORT+1, ...).
+declare -A ROLE_PIDS ROLE_PORTS
+if [ -n "$BOT_PROCESSES" ]; then
+  start_role() {
+    local role=$1
+    BOT_ROLE=$role METRICS_PORT=${ROLE_PORTS[$role]} LOG_FILE=${LOG_FILE:+${LOG_FILE%.jsonl}-${role}.jsonl} \
+      python bot.py > ${LOGS_DIR}/bot-${role}.log 2>&1 &
+    ROLE_PIDS[$role]=$!
+    echo "Started ${role} with PID: ${ROLE_PIDS[$role]}"
+  }
+
+  port=${METRICS_PORT:-9108}
+  for role in $BOT_PROCESSES; do
+    if [ "$port" = "0" ]; then
+      ROLE_PORTS[$role]=0
+    else
+      ROLE_PORTS[$role]=$port
+      port=$((port + 1))
+    fi
+    start_role $role
+  done
+
+  while true; do
+    sleep 10
+    for role in $BOT_PROCESSES; do
+      if ! ps -p ${ROLE_PIDS[$role]} > /dev/null; then
+        echo "${role} process died, restarting..."
+        start_role $role
+      fi
+    done
+  done
+fi
+
 # Start the bot
 echo "Starting bot.py..."
 python bot.py > ${LOGS_DIR}/bot.log 2>&1 &
@@ -41,7 +75,7 @@ BOT_PID=$!
 sleep 5
 if ! ps -p $BOT_PID > /dev/null; then
   echo "Failed to start bot.py, checking logs..."
-  tail -n 20 ${LOGS_DIR}/bot.log
+  tail -n 20 ${LOGS_DIR}/bot.log ${LOGS_DIR}/bot.jsonl 2>/dev/null
   echo "Attempting to start without Telegram..."
   export DISABLE_TELEGRAM=true
   python bot.py > ${LOGS_DIR}/bot.log 2>&1 &
@@ -50,7 +84,7 @@ if ! ps -p $BOT_PID > /dev/null; then
   sleep 3
   if ! ps -p $BOT_PID > /dev/null; then
     echo "Failed to start bot even with Telegram disabled. Exiting."
-    tail -n 20 ${LOGS_DIR}/bot.log
+    tail -n 20 ${LOGS_DIR}/bot.log ${LOGS_DIR}/bot.jsonl 2>/dev/null
     exit 1
   fi
 fi
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from metrics import STATE_RELOADS, STATE_SAVE_SECONDS
+
+log = logging.getLogger(__name__)
+
+
+def atomic_write_text(path, text):
+    """Write `text` to `path` so readers only ever see the old or the new file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def apply_change(data, change):
+    """Apply one change-log record to a loaded JSON document.
+
+    Records look like {"op": "set" | "append" | "remove", "path": [...], ...}:
+    "set" stores "value" at path, "append" adds "value" to the list at path,
+    "remove" drops list items equal to "value" or whose fields equal "match".
+    """
+    *parents, last = change["path"]
+    target = data
+    for key in parents:
+        target = target.setdefault(key, {})
+    op = change["op"]
+    if op == "set":
+        target[last] = change["value"]
+    elif op == "append":
+        target.setdefault(last, []).append(change["value"])
+    elif op == "remove":
+        items = target.get(last, [])
+        if "match" in change:
+            match = change["match"]
+            target[last] = [i for i in items
+                            if not (isinstance(i, dict) and all(i.get(k) == v for k, v in match.items()))]
+        else:
+            target[last] = [i for i in items if i != change["value"]]
+    else:
+        raise ValueError(f"unknown change op {op!r}")
+
+
+class JsonStateStore:
+    """Debounced, atomic persistence for one JSON file.
+
+    save() marks the document dirty and schedules a write `delay` seconds
+    later, so a burst of edits becomes one write. The write itself (temp
+    file, fsync, rename) runs in a worker thread. With `changelog=True`,
+    saves that come with a change record only append that record to
+    `<path>.log`. The full file is rewritten once `compact_after` records
+    have piled up, or once no change has been saved for `compact_idle`
+    seconds, so the file someone edits by hand is current. A log older than
+    the file was written against contents that have since been replaced.
+    It is never replayed, and the next change starts a new log. Outside a
+    running event loop, save() writes immediately. changed_on_disk() tells
+    whether someone else has written the file since this store last loaded
+    or wrote it.
+    """
+
+    def __init__(self, path, delay=0.5, changelog=False, compact_after=500, compact_idle=30.0, **dump_kwargs):
+        self.path = path
+        self.log_path = path + ".log"
+        self.delay = delay
+        self.changelog = changelog
+        self.compact_after = compact_after
+        self.compact_idle = compact_idle
+        self.dump_kwargs = dump_kwargs
+        self._data = None
+        self._pending_changes = []
+        self._full_write = False
+        self._log_records = self._count_log_records()
+        self._timer = None
+        self._compact_timer = None
+        self._write_task = None
+        self._lock = threading.Lock()
+        self._seen = None
+
+    def _log_is_stale(self):
+        """True if the file was replaced after the log's last record, by hand or by a rewrite cut short."""
+        try:
+            return os.stat(self.log_path).st_mtime_ns < os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+
+    def _count_log_records(self):
+        if not os.path.exists(self.log_path) or self._log_is_stale():
+            return 0
+        with open(self.log_path, "r") as f:
+            return sum(1 for line in f if line.strip())
+
+    def load(self, default):
+        """Read the file (plus any change log) or return `default` if it does not exist."""
+        # Taken before reading, so a write that lands mid-read still counts as a change
+        self._seen = self.stamp()
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        else:
+            data = default
+        if self._log_is_stale():
+            # Replaying it would undo the edit
+            log.warning("Ignoring %s, it is older than %s", self.log_path, self.path)
+        elif os.path.exists(self.log_path):
+            with open(self.log_path, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        apply_change(data, json.loads(line))
+                    except ValueError:
+                        # A crash mid-append leaves at most one torn record at the end
+                        log.warning("Skipping unreadable change record in %s", self.log_path)
+        return data
+
+    def stamp(self):
+        """(mtime, size) of the file and its change log, to tell whether another process has written them."""
+        stamps = []
+        for path in (self.path, self.log_path):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                stamps.append(None)
+            else:
+                stamps.append((st.st_mtime_ns, st.st_size))
+        return tuple(stamps)
+
+    def changed_on_disk(self):
+        return self.stamp() != self._seen
+
+    @property
+    def dirty(self):
+        """True while a save is waiting to be written or being written."""
+        return (self._timer is not None or self._full_write or bool(self._pending_changes)
+                or (self._write_task is not None and not self._write_task.done()))
+
+    def save(self, data, change=None):
+        self._data = data
+        if self.changelog and change is not None:
+            self._pending_changes.append(change)
+        else:
+            self._full_write = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_sync()
+            return
+        if self._timer is None:
+            self._timer = loop.call_later(self.delay, self._start_write)
+        if self.changelog and change is not None and self.compact_idle is not None:
+            if self._compact_timer is not None:
+                self._compact_timer.cancel()
+            self._compact_timer = loop.call_later(self.compact_idle, self._compact)
+
+    def _compact(self):
+        self._compact_timer = None
+        if self.changed_on_disk():
+            # Edited since our last write; the watcher reloads it rather than us overwriting it
+            return
+        if self._log_records or self._pending_changes:
+            self._full_write = True
+            if self._timer is None:
+                self._start_write()
+
+    def _start_write(self):
+        self._timer = None
+        if self._write_task is not None and not self._write_task.done():
+            # A write is still running; it picks up the new state when it finishes
+            self._write_task.add_done_callback(lambda _: self._reschedule())
+            return
+        self._write_task = asyncio.ensure_future(self._write_async())
+
+    def _reschedule(self):
+        if (self._full_write or self._pending_changes) and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_soon(self._start_write)
+
+    def _snapshot(self):
+        """Take what needs writing, on the calling thread. Returns (full_text, changes)."""
+        changes, self._pending_changes = self._pending_changes, []
+        full = self._full_write or (self._log_records + len(changes) >= self.compact_after)
+        self._full_write = False
+        if full:
+            return json.dumps(self._data, **self.dump_kwargs), []
+        return None, changes
+
+    def _write(self, full_text, changes):
+        with self._lock, STATE_SAVE_SECONDS.time(file=os.path.basename(self.path)):
+            if full_text is not None:
+                atomic_write_text(self.path, full_text)
+                if os.path.exists(self.log_path):
+                    os.unlink(self.log_path)
+                self._log_records = 0
+            elif changes:
+                if self._log_is_stale():
+                    self._log_records = 0
+                with open(self.log_path, "w" if self._log_records == 0 else "a") as f:
+                    for change in changes:
+                        f.write(json.dumps(change) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._log_records += len(changes)
+            self._seen = self.stamp()
+
+    async def _write_async(self):
+        full_text, changes = self._snapshot()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, full_text, changes)
+        except Exception as e:
+            log.error("Failed to write %s: %s", self.path, e)
+            # Keep the state dirty so the next save (or flush) tries again
+            self._full_write = True
+
+    def flush_sync(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._data is None or not (self._full_write or self._pending_changes):
+            return
+        self._write(*self._snapshot())
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._write_task is not None:
+            await asyncio.shield(self._write_task)
+        if self._data is not None and (self._full_write or self._pending_changes):
+            await self._write_async()
+
+
+class StateWatcher:
+    """Reloads state files that were edited outside this process, by hand or by another of the bot's processes.
+
+    Each watched store comes with `load()`, which reads and validates the
+    file and raises if it is malformed, and `apply(data)`, which swaps the
+    new contents into the live structures in one step. A file with unsaved
+    changes in this process is left alone, since that save will overwrite
+    it anyway. A rejected edit is logged and not retried until the file
+    changes again.
+    """
+
+    def __init__(self):
+        self._watched = []
+
+    def watch(self, store, load, apply):
+        self._watched.append((store, load, apply))
+
+    async def check(self):
+        """Reload every watched file that changed. Returns the paths that were reloaded."""
+        reloaded = []
+        for store, load, apply in self._watched:
+            if store.dirty or not store.changed_on_disk() or store.stamp()[0] is None:
+                # A deleted file keeps the state we have
+                continue
+            name = os.path.basename(store.path)
+            try:
+                data = await asyncio.to_thread(load)
+            except Exception as e:
+                log.error("Ignoring edit to %s: %s", store.path, e)
+                STATE_RELOADS.inc(file=name, outcome="rejected")
+                continue
+            if store.dirty:
+                # Saved while we were reading; that save wins
+                continue
+            apply(data)
+            reloaded.append(store.path)
+            log.info("Reloaded %s", store.path)
+            STATE_RELOADS.inc(file=name, outcome="reloaded")
+        return reloaded
@@ -0,0 +1,49 @@
+"""Where check-ins are kept.
+
+A CheckinStore is the system of record for check-ins. Every message is
+appended to it before the sender is acknowledged. The sheet mirror, the
+compliance report and reminders all read from it. Google Sheets is only a
+view that is projected from the store. CheckinJournal in journal.py is the
+SQLite implementation, indexed by user, tab and period.
+"""
+
+
+class CheckinStore:
+    """Interface of a check-in store. Every method is a coroutine except close()."""
+
+    async def append(self, platform, user_id, tab, names, display_name, period, text, received_at=None):
+        """Durably record a check-in and return its id."""
+        raise NotImplementedError
+
+    async def pending(self, limit=200):
+        """Up to `limit` entries not projected into the sheet yet, oldest first."""
+        raise NotImplementedError
+
+    async def settled(self, limit, quiet, max_hold=None, now=None):
+        """Pending entries of senders who have gone quiet. Returns (entries, when the next held sender is due)."""
+        raise NotImplementedError
+
+    async def mark_delivered(self, ids):
+        raise NotImplementedError
+
+    async def mark_attempt(self, entry_id, error, give_up=False):
+        raise NotImplementedError
+
+    async def cell_messages(self, tab, period, platform, user_id):
+        """Everything the user sent for `period` in `tab`, oldest first."""
+        raise NotImplementedError
+
+    async def user_names(self, tab, platform, user_id):
+        """Every column A spelling the user's check-ins to `tab` were recorded under, oldest first."""
+        raise NotImplementedError
+
+    async def first_received(self, since):
+        """{(platform, user_id, tab): time of that user's first check-in at or after `since`}."""
+        raise NotImplementedError
+
+    async def counts(self):
+        """{status: number of entries}."""
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
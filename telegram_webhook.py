@@ -0,0 +1,103 @@
+"""Telegram updates over a webhook instead of long polling.
+
+Telegram POSTs each update to a local HTTP listener (usually behind a TLS
+proxy). The listener checks the secret token Telegram echoes back, then
+runs the update through the Application's handlers before it answers. A
+check-in is therefore journaled before Telegram sees a 200, and Telegram
+resends anything that wasn't acknowledged. Updates that arrive while the
+bot is down are queued by Telegram and delivered once it is back.
+
+At most `concurrency` updates are handled at once. Updates from the same
+user are handled one after another in arrival order, so a user's messages
+keep their order.
+"""
+import asyncio
+import hmac
+import logging
+from collections import OrderedDict
+
+from telegram import Update
+
+log = logging.getLogger(__name__)
+
+
+class TelegramWebhook:
+    def __init__(self, app, secret, host="127.0.0.1", port=8443, path="/telegram", concurrency=8,
+                 remember=1000):
+        self.app = app
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.path = path
+        self.concurrency = concurrency
+        self.remember = remember
+        self._slots = None
+        self._users = {}
+        self._seen = OrderedDict()
+        self._runner = None
+
+    async def start(self, url=None):
+        """Start listening and, if `url` is given, point Telegram at it. Safe to call again after a failure."""
+        if self._runner is None:
+            from aiohttp import web
+
+            self._slots = asyncio.Semaphore(self.concurrency)
+            server = web.Application()
+            server.router.add_post(self.path, self.handle)
+            runner = web.AppRunner(server, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, self.host, self.port).start()
+            self._runner = runner
+            log.info("Listening for Telegram updates on %s:%d%s", self.host, self.port, self.path)
+        if url:
+            # Keep whatever Telegram queued while we were down
+            await self.app.bot.set_webhook(url, secret_token=self.secret, max_connections=self.concurrency,
+                                           drop_pending_updates=False)
+            log.info("Telegram webhook set to %s", url)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _first_delivery(self, update_id):
+        # Telegram resends an update it thinks timed out; don't journal the same check-in twice
+        if update_id in self._seen:
+            return False
+        self._seen[update_id] = None
+        if len(self._seen) > self.remember:
+            self._seen.popitem(last=False)
+        return True
+
+    async def handle(self, request):
+        from aiohttp import web
+
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            log.warning("Rejected Telegram update with a bad secret token", extra={"remote": request.remote})
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), self.app.bot)
+        except Exception as e:
+            log.warning("Rejected malformed Telegram update: %s", e)
+            return web.Response(status=400)
+        if not self._first_delivery(update.update_id):
+            return web.Response()
+        user_id = update.effective_user.id if update.effective_user else None
+        # [lock, updates holding or waiting for it]
+        user = self._users.setdefault(user_id, [asyncio.Lock(), 0])
+        user[1] += 1
+        try:
+            async with user[0]:
+                async with self._slots:
+                    await self.app.process_update(update)
+        except Exception:
+            # Let Telegram retry it
+            self._seen.pop(update.update_id, None)
+            log.exception("Failed to handle Telegram update %s", update.update_id)
+            return web.Response(status=500)
+        finally:
+            user[1] -= 1
+            if not user[1]:
+                del self._users[user_id]
+        return web.Response()
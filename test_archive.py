@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+
+from archive import TabArchiver, column_runs
+from fakes import FakeSheetSession, FakeSpreadsheet
+from sheets import SheetIndex, SheetsIO, SheetWriter
+
+WEEKS = ["2024-03-18", "2024-03-25", "2024-04-01", "2024-04-08", "2024-04-15", "2024-04-22"]
+
+
+class TestTabArchiver(unittest.TestCase):
+    def setUp(self):
+        self.spreadsheet = FakeSpreadsheet()
+        self.live = self.spreadsheet.add_tab("Developers", ["alice", "bob"], WEEKS)
+        self.live.cells[(1, 8)] = "Notes"
+        self.io = SheetsIO(FakeSheetSession(self.spreadsheet), max_workers=2)
+        self.index = SheetIndex(self.io)
+        self.writer = SheetWriter(self.io, self.index, flush_interval=0.01)
+        self.archiver = TabArchiver(self.io, self.index, self.writer, keep=2)
+
+    def tearDown(self):
+        self.io.shutdown()
+
+    def run_async(self, coro):
+        async def scenario():
+            try:
+                return await coro
+            finally:
+                await self.writer.close()
+        return asyncio.run(scenario())
+
+    def test_moves_old_columns_into_quarter_tabs(self):
+        # bob has a row in the old archive already, under a different row number
+        q1 = self.spreadsheet.add_tab("Developers 2024-Q1", ["carol", "bob"], [])
+        moved = self.run_async(self.archiver.archive("Developers"))
+        self.assertEqual(moved, 4)
+        self.assertEqual(self.live.row_values(1), ["Name", "2024-04-15", "2024-04-22", "Notes"])
+        self.assertEqual(self.live.value(3, 3), "bob update for 2024-04-22")
+        self.assertEqual(q1.row_values(1), ["Name", "2024-03-18", "2024-03-25"])
+        self.assertEqual(q1.col_values(1), ["Name", "carol", "bob", "alice"])
+        self.assertEqual(q1.value(3, 2), "bob update for 2024-03-18")
+        self.assertEqual(q1.value(4, 3), "alice update for 2024-03-25")
+        q2 = self.spreadsheet.tabs["Developers 2024-Q2"]
+        self.assertEqual(q2.row_values(1), ["Name", "2024-04-01", "2024-04-08"])
+        self.assertEqual(q2.value(2, 3), "alice update for 2024-04-08")
+        # Nothing left to move
+        self.assertEqual(self.run_async(self.archiver.archive("Developers")), 0)
+
+    def test_interrupted_run_is_repeatable(self):
+        async def interrupted():
+            # Copied to the archive, then stopped before the live columns were deleted
+            await self.archiver._copy("Developers 2024-Q1", self.live.col_values(1), [self.live.col_values(2)])
+            return await self.archiver.archive("Developers")
+
+        self.assertEqual(self.run_async(interrupted()), 4)
+        q1 = self.spreadsheet.tabs["Developers 2024-Q1"]
+        self.assertEqual(q1.row_values(1), ["Name", "2024-03-18", "2024-03-25"])
+        self.assertEqual(q1.col_values(1), ["Name", "alice", "bob"])
+
+    def test_copy_without_values_writes_nothing(self):
+        q1 = self.spreadsheet.add_tab("Developers 2024-Q1", ["alice", "bob"], ["2024-03-18"])
+        before = self.spreadsheet.calls.snapshot()
+        self.run_async(self.archiver._copy("Developers 2024-Q1", self.live.col_values(1), [["2024-03-18", "", ""]]))
+        after = self.spreadsheet.calls.snapshot()
+        self.assertEqual(after.get("batch_update", 0), before.get("batch_update", 0))
+        self.assertEqual(q1.value(2, 2), "alice update for 2024-03-18")
+
+    def test_checkins_wait_for_archiving(self):
+        async def scenario():
+            await self.index.get("Developers")
+            archiving = asyncio.create_task(self.archiver.archive("Developers"))
+            await asyncio.sleep(0)
+            placement = await self.writer.submit("Developers", ["bob"], "bob", "2024-04-22", "more")
+            await archiving
+            return placement
+
+        self.assertEqual(self.run_async(scenario()), (3, 3))
+        self.assertEqual(self.live.value(3, 3), "bob update for 2024-04-22\nmore")
+
+    def test_column_runs(self):
+        self.assertEqual(column_runs([2, 3, 5, 7, 8, 9]), [(7, 9), (5, 5), (2, 3)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import time
+import unittest
+from datetime import timedelta
+
+import broadcast
+
+
+class FloodError(Exception):
+    def __init__(self, retry_after):
+        super().__init__("flood")
+        self.retry_after = retry_after
+
+
+class FakeSender:
+    def __init__(self, delay=0.0, flood_once=False, fail=()):
+        self.delay = delay
+        self.flood_once = flood_once
+        self.fail = set(fail)
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, address, text):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.flood_once:
+                self.flood_once = False
+                raise FloodError(timedelta(seconds=0.1))
+            if address in self.fail:
+                raise RuntimeError("blocked")
+            self.sent.append((address, text))
+        finally:
+            self.in_flight -= 1
+
+
+class TestBroadcastEngine(unittest.TestCase):
+    def test_both_platforms_concurrently(self):
+        discord_send = FakeSender(delay=0.05)
+        telegram_send = FakeSender(delay=0.05)
+        engine = broadcast.BroadcastEngine({
+            "discord": broadcast.PlatformLane("Discord", discord_send, concurrency=10, rate_per_second=0),
+            "telegram": broadcast.PlatformLane("Telegram", telegram_send, concurrency=10, rate_per_second=0),
+        })
+        recipients = [broadcast.Recipient("discord", i, f"Discord {i}") for i in range(20)]
+        recipients += [broadcast.Recipient("telegram", i, f"Telegram {i}") for i in range(20)]
+        start = time.monotonic()
+        results = asyncio.run(engine.broadcast(recipients, "hello"))
+        elapsed = time.monotonic() - start
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual([r.recipient for r in results], recipients)
+        self.assertEqual(discord_send.max_in_flight, 10)
+        # 40 sends of 50ms, two batches of 10 per platform in parallel
+        self.assertLess(elapsed, 0.5)
+
+    def test_retry_after_pauses_and_retries(self):
+        sender = FakeSender(flood_once=True)
+        lane = broadcast.PlatformLane("Telegram", sender, concurrency=2, rate_per_second=0)
+        engine = broadcast.BroadcastEngine({"telegram": lane})
+        recipients = [broadcast.Recipient("telegram", i, str(i)) for i in range(3)]
+        results = asyncio.run(engine.broadcast(recipients, "hello"))
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(len(sender.sent), 3)
+
+    def test_failures_are_reported_not_retried(self):
+        sender = FakeSender(fail={1})
+        engine = broadcast.BroadcastEngine({"discord": broadcast.PlatformLane("Discord", sender, rate_per_second=0)})
+        recipients = [broadcast.Recipient("discord", i, f"Discord {i}") for i in range(3)]
+        results = asyncio.run(engine.broadcast(recipients, "hello"))
+        self.assertEqual([r.ok for r in results], [True, False, True])
+        report = broadcast.format_report("Developer check-in sent.", results)
+        self.assertIn("Delivered 2/3.", report)
+        self.assertEqual(report.splitlines()[2], "Discord 1: ❌")
+
+    def test_progress_callback(self):
+        updates = []
+
+        async def progress(done, total):
+            updates.append((done, total))
+
+        engine = broadcast.BroadcastEngine({"discord": broadcast.PlatformLane("Discord", FakeSender(delay=0.03),
+                                                                               concurrency=1, rate_per_second=0)})
+        recipients = [broadcast.Recipient("discord", i, str(i)) for i in range(5)]
+        asyncio.run(engine.broadcast(recipients, "hello", progress=progress, progress_interval=0.05))
+        self.assertTrue(updates)
+        self.assertTrue(all(total == 5 for _, total in updates))
+
+    def test_report_is_truncated(self):
+        recipients = [broadcast.Recipient("discord", i, f"Discord {i:020d}") for i in range(300)]
+        results = [broadcast.DeliveryResult(r, True) for r in recipients]
+        report = broadcast.format_report("Developer check-in sent.", results)
+        self.assertLessEqual(len(report), 2000)
+        self.assertIn("more", report.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import discord
+from discord import app_commands
+
+from command_sync import CommandSync, command_fingerprint
+from state_store import JsonStateStore
+
+
+class TestCommandSync(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "command_sync.json")
+        self.client = discord.Client(intents=discord.Intents.none())
+        self.client._connection.application_id = 42
+        self.tree = app_commands.CommandTree(self.client)
+        self.add_command("hello")
+        self.synced = []
+
+        async def sync(guild=None):
+            self.synced.append(guild.id if guild else None)
+            return self.tree.get_commands(guild=guild)
+        self.tree.sync = sync
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def add_command(self, name, description="hi"):
+        async def callback(interaction: discord.Interaction, who: str):
+            pass
+        self.tree.add_command(app_commands.Command(name=name, description=description, callback=callback),
+                              override=True)
+
+    def run_sync(self, scope="global", guild_id=None):
+        async def scenario():
+            return await CommandSync(self.tree, JsonStateStore(self.path, delay=0.01), scope, guild_id).sync()
+        return asyncio.run(scenario())
+
+    def test_syncs_only_when_commands_change(self):
+        self.assertTrue(self.run_sync())
+        # A restart with the same commands
+        self.assertFalse(self.run_sync())
+        self.add_command("hello", description="changed")
+        self.assertTrue(self.run_sync())
+        self.assertFalse(self.run_sync())
+        self.assertEqual(self.synced, [None, None])
+
+    def test_guild_scope(self):
+        self.assertTrue(self.run_sync("guild", "123"))
+        self.assertFalse(self.run_sync("guild", "123"))
+        # Each scope keeps its own fingerprint
+        self.assertTrue(self.run_sync())
+        self.assertEqual(self.synced, [123, None])
+        with self.assertRaises(ValueError):
+            CommandSync(self.tree, JsonStateStore(self.path), "guild")
+
+    def test_fingerprint_ignores_registration_order(self):
+        self.add_command("bye")
+        first = command_fingerprint(self.tree)
+        self.tree.remove_command("hello")
+        self.add_command("hello")
+        self.assertEqual(command_fingerprint(self.tree), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import asyncio
+import unittest
+
+from discord_users import MemberDirectory, TTLCache, UserResolver
+from fakes import FakeDiscordAPI, FakeDiscordClient, FakeDiscordGuild, FakeDiscordMember, FakeDiscordUser
+
+
+def make_client(user_ids, missing=(), cached=(), latency=0.0):
+    api = FakeDiscordAPI(latency=latency)
+    users = [FakeDiscordUser(api, user_id, f"user{user_id}") for user_id in user_ids if user_id not in missing]
+    return FakeDiscordClient(api, users, cached=set(cached))
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_lru_and_expiry(self):
+        now = [0.0]
+        cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        # "b" was least recently used
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        now[0] = 11
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 1)
+
+
+class TestUserResolver(unittest.TestCase):
+    def test_member_cache_then_ttl_cache_then_api(self):
+        client = make_client([1, 2], cached=[1])
+        resolver = UserResolver(client)
+
+        async def scenario():
+            await resolver.resolve(1)
+            await resolver.resolve(2)
+            await resolver.resolve(2)
+
+        asyncio.run(scenario())
+        self.assertEqual(client.api.calls.snapshot(), {"fetch_user": 1})
+
+    def test_resolve_many_fetches_misses_concurrently(self):
+        client = make_client([1, 2, 3, 4], missing=[4], cached=[1], latency=0.05)
+        resolver = UserResolver(client, concurrency=10)
+        users = asyncio.run(resolver.resolve_many([1, 2, 3, 4]))
+        self.assertEqual(client.api.calls.snapshot(), {"fetch_user": 3})
+        self.assertEqual(users[1].name, "user1")
+        self.assertEqual(users[3].name, "user3")
+        self.assertIsNone(users[4])
+
+
+class TestMemberDirectory(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeDiscordAPI()
+        self.guild = FakeDiscordGuild(1)
+        self.guild.members = [
+            FakeDiscordMember(self.api, self.guild, 10, "alice", display_name="Alice A"),
+            FakeDiscordMember(self.api, self.guild, 11, "bob", discriminator="1234"),
+            FakeDiscordMember(self.api, self.guild, 12, "alfred"),
+        ]
+        self.directory = MemberDirectory()
+        self.assertEqual(self.directory.load_guild(self.guild), 3)
+
+    def test_lookup_ignores_case(self):
+        self.assertEqual(self.directory.lookup(1, "ALICE"), 10)
+        self.assertEqual(self.directory.lookup(1, "alice a"), 10)
+        self.assertEqual(self.directory.lookup(1, "Bob#1234"), 11)
+        self.assertIsNone(self.directory.lookup(1, "carol"))
+        self.assertIsNone(self.directory.lookup(2, "alice"))
+
+    def test_prefix_search(self):
+        found = self.directory.search(1, "al")
+        self.assertEqual([member_id for member_id, _ in found], [12, 10])
+        self.assertEqual(dict(found)[10], "Alice A (@alice)")
+
+    def test_events_keep_index_current(self):
+        renamed = FakeDiscordMember(self.api, self.guild, 10, "alicia")
+        self.directory.add(renamed)
+        self.assertIsNone(self.directory.lookup(1, "alice"))
+        self.assertEqual(self.directory.lookup(1, "alicia"), 10)
+        self.directory.remove(renamed)
+        self.assertIsNone(self.directory.lookup(1, "alicia"))
+        self.assertEqual([member_id for member_id, _ in self.directory.search(1, "al")], [12])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from ipc import WakeSocket
+from journal import CheckinJournal, JournalSyncer
+
+
+class TestWakeSocket(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "journal.db")
+        self.socket_path = self.path + ".wake"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_front_end_wakes_the_sheets_worker(self):
+        async def scenario():
+            # The worker and the front-end each open the shared journal, as separate processes do
+            worker_journal = CheckinJournal(self.path)
+            front_journal = CheckinJournal(self.path)
+            delivered = asyncio.Event()
+
+            async def deliver(entry):
+                delivered.set()
+
+            syncer = JournalSyncer(worker_journal, deliver, poll_interval=30)
+            syncer.start()
+            listener = WakeSocket(self.socket_path)
+            await listener.listen(syncer.wake)
+            await asyncio.sleep(0.05)
+            notifier = WakeSocket(self.socket_path)
+            await front_journal.append("telegram", 7, "Developers", ["telegram:bob"], "telegram:bob", "2024-01-01",
+                                       "hi")
+            notifier.notify()
+            await asyncio.wait_for(delivered.wait(), 2)
+            await syncer.close()
+            notifier.close()
+            listener.close()
+            worker_journal.close()
+            front_journal.close()
+
+        asyncio.run(scenario())
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_notify_without_listener(self):
+        notifier = WakeSocket(self.socket_path)
+        notifier.notify()
+        notifier.close()
+
+    def test_replaces_stale_socket(self):
+        open(self.socket_path, "w").close()
+
+        async def scenario():
+            woken = asyncio.Event()
+            listener = WakeSocket(self.socket_path)
+            await listener.listen(woken.set)
+            WakeSocket(self.socket_path).notify()
+            await asyncio.wait_for(woken.wait(), 2)
+            listener.close()
+
+        asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
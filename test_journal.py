@@ -0,0 +1,176 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from journal import CheckinJournal, JournalSyncer
+
+
+class LayoutError(Exception):
+    pass
+
+
+class TestCheckinJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "journal.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_pending_survives_restart(self):
+        async def first_run():
+            journal = CheckinJournal(self.path)
+            await journal.append("discord", 1, "Developers", ["alice"], "alice", "2024-01-01", "one")
+            await journal.append("telegram", 2, "Developers", ["telegram:bob"], "telegram:bob", "2024-01-01", "two")
+            journal.close()
+
+        async def second_run():
+            journal = CheckinJournal(self.path)
+            delivered = []
+
+            async def deliver(entry):
+                delivered.append((entry.names, entry.text))
+
+            syncer = JournalSyncer(journal, deliver)
+            await syncer.sync_once()
+            counts = await journal.counts()
+            journal.close()
+            return delivered, counts
+
+        asyncio.run(first_run())
+        delivered, counts = asyncio.run(second_run())
+        self.assertEqual(delivered, [(["alice"], "one"), (["telegram:bob"], "two")])
+        self.assertEqual(counts, {"delivered": 2})
+
+    def test_transient_and_permanent_failures(self):
+        async def scenario():
+            journal = CheckinJournal(self.path)
+            await journal.append("discord", 1, "Developers", ["alice"], "alice", "2024-01-01", "flaky")
+            await journal.append("discord", 1, "Developers", ["alice"], "alice", "2024-01-01", "broken")
+            calls = []
+
+            async def deliver(entry):
+                calls.append(entry.text)
+                if entry.text == "broken":
+                    raise LayoutError("bad cell")
+                if calls.count("flaky") == 1:
+                    raise RuntimeError("sheets down")
+
+            syncer = JournalSyncer(journal, deliver, permanent_errors=(LayoutError,))
+            first = await syncer.sync_once()
+            second = await syncer.sync_once()
+            counts = await journal.counts()
+            journal.close()
+            return first, second, counts
+
+        first, second, counts = asyncio.run(scenario())
+        self.assertEqual(first, (0, 2))
+        self.assertEqual(second, (1, 0))
+        self.assertEqual(counts, {"delivered": 1, "failed": 1})
+
+    def test_cell_messages(self):
+        async def scenario():
+            journal = CheckinJournal(self.path)
+            await journal.append("discord", 1, "Developers", ["alice"], "alice", "2024-01-08", "one")
+            await journal.append("discord", 1, "Developers", ["alice"], "alice", "2024-01-01", "last week")
+            await journal.append("telegram", 1, "Developers", ["telegram:al"], "telegram:al", "2024-01-08", "other")
+            await journal.append("discord", 1, "Developers", ["alice"], "alice", "2024-01-08", "two")
+            refused = await journal.append("discord", 1, "Developers", ["alice"], "alice", "2024-01-08", "bad")
+            await journal.mark_attempt(refused, LayoutError("nope"), give_up=True)
+            messages = await journal.cell_messages("Developers", "2024-01-08", "discord", 1)
+            journal.close()
+            return messages
+
+        self.assertEqual(asyncio.run(scenario()), ["one", "two"])
+
+    def test_user_names(self):
+        async def scenario():
+            journal = CheckinJournal(self.path)
+            await journal.append("discord", 1, "Developers", ["alice"], "alice", "2024-01-01", "one")
+            await journal.append("discord", 1, "Developers", ["alicia", "alice"], "alicia", "2024-01-08", "two")
+            await journal.append("discord", 1, "Product Managers", ["al"], "al", "2024-01-08", "elsewhere")
+            names = await journal.user_names("Developers", "discord", 1)
+            journal.close()
+            return names
+
+        self.assertEqual(asyncio.run(scenario()), ["alice", "alicia"])
+
+    def test_quiet_window_holds_only_active_senders(self):
+        async def scenario():
+            journal = CheckinJournal(self.path)
+            delivered = []
+
+            async def deliver(entry):
+                delivered.append(entry.text)
+
+            now = [1000.0]
+            syncer = JournalSyncer(journal, deliver, quiet=10, clock=lambda: now[0])
+            await journal.append("discord", 1, "Developers", ["alice"], "alice", "2024-01-01", "a1", received_at=985)
+            await journal.append("discord", 2, "Developers", ["bob"], "bob", "2024-01-01", "b1", received_at=985)
+            # alice is still typing, so her earlier message waits for the rest
+            await journal.append("discord", 1, "Developers", ["alice"], "alice", "2024-01-01", "a2", received_at=995)
+            first = await syncer.sync_once()
+            held_until = syncer._held_until
+            now[0] = 1006
+            second = await syncer.sync_once()
+            journal.close()
+            return first, held_until, second, delivered
+
+        first, held_until, second, delivered = asyncio.run(scenario())
+        self.assertEqual((first, held_until, second), ((1, 0), 1005, (2, 0)))
+        self.assertEqual(delivered, ["b1", "a1", "a2"])
+
+    def test_max_hold_and_batch_limit(self):
+        async def scenario():
+            journal = CheckinJournal(self.path)
+            delivered = []
+
+            async def deliver(entry):
+                delivered.append(entry.text)
+
+            now = [1000.0]
+            syncer = JournalSyncer(journal, deliver, batch_size=2, quiet=10, max_hold=30, clock=lambda: now[0])
+            # alice never pauses for 10 seconds, and her entries fill more than a batch
+            for i, received_at in enumerate((975, 985, 995)):
+                await journal.append("discord", 1, "Developers", ["alice"], "alice", "2024-01-01", f"a{i}",
+                                     received_at=received_at)
+            await journal.append("discord", 2, "Developers", ["bob"], "bob", "2024-01-01", "b0", received_at=985)
+            # carol's entry is stamped in the future: the clock went back
+            await journal.append("discord", 3, "Developers", ["carol"], "carol", "2024-01-01", "c0", received_at=5000)
+            first = await syncer.sync_once()
+            held_until = syncer._held_until
+            now[0] = 1005
+            second = await syncer.sync_once()
+            third = await syncer.sync_once()
+            journal.close()
+            return first, held_until, second, third, delivered
+
+        first, held_until, second, third, delivered = asyncio.run(scenario())
+        # Held entries don't use up the batch; alice is due 30s after her first entry, not 10s after her last
+        self.assertEqual((first, held_until), ((2, 0), 1005))
+        self.assertEqual((second, third), ((2, 0), (1, 0)))
+        self.assertEqual(delivered, ["b0", "c0", "a0", "a1", "a2"])
+
+    def test_background_task_delivers_on_wake(self):
+        async def scenario():
+            journal = CheckinJournal(self.path)
+            delivered = asyncio.Event()
+
+            async def deliver(entry):
+                delivered.set()
+
+            syncer = JournalSyncer(journal, deliver, poll_interval=30)
+            syncer.start()
+            await asyncio.sleep(0.05)
+            await journal.append("discord", 1, "Developers", ["alice"], "alice", "2024-01-01", "hi")
+            syncer.wake()
+            await asyncio.wait_for(delivered.wait(), 2)
+            await syncer.close()
+            journal.close()
+
+        asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+import queue
+import tempfile
+import unittest
+
+from logs import DebugSampler, NonBlockingQueueHandler, setup_logging, stop_logging
+
+
+class TestLogging(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "bot.jsonl")
+        self.root_handlers = logging.getLogger().handlers[:]
+        self.root_level = logging.getLogger().level
+
+    def tearDown(self):
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        for handler in self.root_handlers:
+            root.addHandler(handler)
+        root.setLevel(self.root_level)
+        self.tmp.cleanup()
+
+    def read(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_json_lines_with_extra_fields(self):
+        listener = setup_logging("INFO", path=self.path, console=False)
+        log = logging.getLogger("bot.discord")
+        log.info("Journaled check-in %s", 7, extra={"entry_id": 7, "tab": "Developers"})
+        log.debug("not written")
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            log.exception("Failed")
+        stop_logging(listener)
+        first, second = self.read()
+        self.assertEqual(first["level"], "INFO")
+        self.assertEqual(first["logger"], "bot.discord")
+        self.assertEqual(first["msg"], "Journaled check-in 7")
+        self.assertEqual((first["entry_id"], first["tab"]), (7, "Developers"))
+        self.assertEqual(second["level"], "ERROR")
+        self.assertIn("ValueError: boom", second["exc"])
+
+    def test_debug_sampling(self):
+        listener = setup_logging("DEBUG", path=self.path, console=False, debug_sample_every=5)
+        log = logging.getLogger("bot.sample")
+        for i in range(12):
+            log.debug("tick %s", i)
+        log.info("always")
+        stop_logging(listener)
+        lines = self.read()
+        self.assertEqual([line["msg"] for line in lines], ["tick 0", "tick 5", "tick 10", "always"])
+        self.assertEqual(lines[0]["sampled"], 5)
+
+    def test_rotation(self):
+        listener = setup_logging("INFO", path=self.path, console=False, max_bytes=2000, backup_count=2)
+        log = logging.getLogger("bot.rotate")
+        for i in range(100):
+            log.info("line %d with some padding to fill the file", i)
+        stop_logging(listener)
+        names = sorted(os.listdir(self.tmp.name))
+        self.assertEqual(names, ["bot.jsonl", "bot.jsonl.1", "bot.jsonl.2"])
+        self.assertLessEqual(os.path.getsize(self.path), 2000)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = NonBlockingQueueHandler(queue.Queue(2))
+        handler.addFilter(DebugSampler())
+        log = logging.getLogger("bot.drop")
+        log.propagate = False
+        log.addHandler(handler)
+        try:
+            for i in range(5):
+                log.warning("record %d", i)
+        finally:
+            log.removeHandler(handler)
+            log.propagate = True
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+        self.assertEqual(handler.queue.get_nowait().msg, "record 0")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+from membership import MembershipRegistry, validate_groups, validate_telegram_users
+
+
+def sample_groups():
+    return {
+        "product_managers": {"discord": [1], "telegram": [{"id": 100, "username": "pm_tg"}]},
+        "developers": {"discord": [1, 2], "telegram": [{"id": 200, "username": "dev_tg"}]},
+    }
+
+
+class TestMembershipRegistry(unittest.TestCase):
+    def setUp(self):
+        self.groups = sample_groups()
+        self.telegram_users = {"100": "pm_tg", "200": "Dev_TG"}
+        self.registry = MembershipRegistry(self.groups, self.telegram_users)
+
+    def test_lookups(self):
+        # Product managers win when someone is in both groups, as before
+        self.assertEqual(self.registry.discord_group(1), "product_managers")
+        self.assertEqual(self.registry.discord_group(2), "developers")
+        self.assertIsNone(self.registry.discord_group(3))
+        self.assertEqual(self.registry.telegram_group(200), "developers")
+        self.assertEqual(self.registry.telegram_id("@dev_tg"), 200)
+        self.assertIsNone(self.registry.telegram_id("nobody"))
+
+    def test_add_and_remove_keep_lists_in_step(self):
+        self.assertTrue(self.registry.add_discord("developers", 3))
+        self.assertFalse(self.registry.add_discord("developers", 3))
+        self.assertIn(3, self.groups["developers"]["discord"])
+        self.assertEqual(self.registry.discord_group(3), "developers")
+        self.assertTrue(self.registry.remove_discord("developers", 3))
+        self.assertNotIn(3, self.groups["developers"]["discord"])
+        self.assertIsNone(self.registry.discord_group(3))
+        self.assertFalse(self.registry.remove_discord("developers", 3))
+
+        self.assertTrue(self.registry.add_telegram("product_managers", 200, "dev_tg"))
+        self.assertEqual(self.registry.telegram_groups(200), {"product_managers", "developers"})
+        self.assertTrue(self.registry.remove_telegram("developers", 200))
+        self.assertEqual(self.groups["developers"]["telegram"], [])
+        self.assertEqual(self.registry.telegram_group(200), "product_managers")
+
+    def test_search_telegram(self):
+        self.registry.register_telegram(300, "devon")
+        self.registry.register_telegram(400, "Dave")
+        self.assertEqual(self.registry.search_telegram("D"), ["Dave", "Dev_TG", "devon"])
+        self.assertEqual(self.registry.search_telegram("dev", limit=1), ["Dev_TG"])
+        # A rename leaves the old name out of the index
+        self.registry.register_telegram(300, "zed")
+        self.assertEqual(self.registry.search_telegram("dev"), ["Dev_TG"])
+        self.assertEqual(self.registry.search_telegram("z"), ["zed"])
+        self.assertEqual(self.registry.search_telegram("q"), [])
+
+    def test_register_renames(self):
+        self.registry.register_telegram(100, "new_name")
+        self.assertEqual(self.telegram_users["100"], "new_name")
+        self.assertEqual(self.registry.telegram_id("new_name"), 100)
+        self.assertIsNone(self.registry.telegram_id("pm_tg"))
+
+
+class TestValidation(unittest.TestCase):
+    def test_groups(self):
+        groups = {"developers": {"discord": [1], "telegram": [2, {"id": 3, "username": "dev"}]}}
+        self.assertIs(validate_groups(groups), groups)
+        for bad in ([], {"developers": {"discord": []}}, {"developers": {"discord": ["1"], "telegram": []}},
+                    {"developers": {"discord": [True], "telegram": []}},
+                    {"developers": {"discord": [], "telegram": [{"username": "dev"}]}}):
+            with self.assertRaises(ValueError):
+                validate_groups(bad)
+
+    def test_telegram_users(self):
+        self.assertEqual(validate_telegram_users({"100": "pm_tg"}), {"100": "pm_tg"})
+        for bad in ([], {"pm_tg": "100"}, {"100": 5}):
+            with self.assertRaises(ValueError):
+                validate_telegram_users(bad)
+
+
+if __name__ == "__main__":
+    unittest.main()
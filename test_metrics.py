@@ -0,0 +1,73 @@
+import asyncio
+import unittest
+
+import aiohttp
+
+from metrics import MetricsRegistry, start_metrics_server
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_render_prometheus_text(self):
+        counter = self.registry.counter("checkins_total", "Check-ins", ("platform",))
+        counter.inc(platform="discord")
+        counter.inc(2, platform="telegram")
+        histogram = self.registry.histogram("op_seconds", "Op latency", ("op",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, op="read")
+        histogram.observe(0.5, op="read")
+        histogram.observe(5, op="read")
+        text = self.registry.render()
+        self.assertIn("# TYPE checkins_total counter", text)
+        self.assertIn('checkins_total{platform="telegram"} 2', text)
+        self.assertIn('op_seconds_bucket{op="read",le="0.1"} 1', text)
+        self.assertIn('op_seconds_bucket{op="read",le="1.0"} 2', text)
+        self.assertIn('op_seconds_bucket{op="read",le="+Inf"} 3', text)
+        self.assertIn('op_seconds_count{op="read"} 3', text)
+        self.assertIn('op_seconds_sum{op="read"} 5.55', text)
+
+    def test_labels_must_match(self):
+        counter = self.registry.counter("c", "c", ("platform",))
+        with self.assertRaises(ValueError):
+            counter.inc(tab="Developers")
+
+    def test_quantile_and_summary(self):
+        histogram = self.registry.histogram("lat", "lat", buckets=(0.1, 0.2, 0.4))
+        for _ in range(50):
+            histogram.observe(0.05)
+        for _ in range(50):
+            histogram.observe(0.3)
+        (_, series), = histogram.items()
+        self.assertAlmostEqual(histogram.quantile(series, 0.5), 0.1)
+        # Interpolated inside the 0.2-0.4 bucket, capped at the largest value seen
+        self.assertAlmostEqual(histogram.quantile(series, 0.99), 0.298)
+        gauge = self.registry.gauge("queue", "queue", ("tab",))
+        gauge.set_function(lambda: {("Developers",): 3})
+        summary = self.registry.summary()
+        self.assertIn("lat: n=100 p50=100ms p99=298ms max=300ms", summary)
+        self.assertIn("queue[Developers]: 3", summary)
+
+
+class TestMetricsServer(unittest.TestCase):
+    def test_serves_metrics(self):
+        registry = MetricsRegistry()
+        registry.counter("hits_total", "Hits").inc()
+
+        async def scenario():
+            runner = await start_metrics_server("127.0.0.1", 0, registry)
+            try:
+                port = runner.addresses[0][1]
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                        return response.status, await response.text()
+            finally:
+                await runner.cleanup()
+
+        status, text = asyncio.run(scenario())
+        self.assertEqual(status, 200)
+        self.assertIn("hits_total 1", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from datetime import date, datetime
+
+from periods import CheckinPeriods, parse_label, quarter
+
+
+class TestCheckinPeriods(unittest.TestCase):
+    def test_weekly_buckets(self):
+        periods = CheckinPeriods("weekly", "monday")
+        # 2024-01-10 is a Wednesday
+        self.assertEqual(periods.label(date(2024, 1, 10)), "2024-01-08")
+        self.assertEqual(periods.label(date(2024, 1, 8)), "2024-01-08")
+        self.assertEqual(periods.label(datetime(2024, 1, 14, 23, 59)), "2024-01-08")
+        self.assertEqual(CheckinPeriods("weekly", "Sunday").label(date(2024, 1, 10)), "2024-01-07")
+
+    def test_daily_buckets(self):
+        self.assertEqual(CheckinPeriods("daily").label(date(2024, 1, 10)), "2024-01-10")
+
+    def test_labels_and_quarters(self):
+        self.assertEqual(parse_label("2024-05-06"), date(2024, 5, 6))
+        self.assertIsNone(parse_label("Name"))
+        self.assertIsNone(parse_label(""))
+        self.assertEqual(quarter(date(2024, 5, 6)), "2024-Q2")
+        self.assertEqual(quarter(date(2024, 12, 31)), "2024-Q4")
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            CheckinPeriods("monthly")
+        with self.assertRaises(ValueError):
+            CheckinPeriods("weekly", "someday")
+
+
+if __name__ == "__main__":
+    unittest.main()
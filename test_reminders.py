@@ -0,0 +1,115 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from broadcast import DeliveryResult
+from journal import CheckinJournal
+from periods import CheckinPeriods
+from reminders import Reminders
+from report import CheckinReport, CheckinReporter, GroupReport, Member, ReportRow
+from state_store import JsonStateStore
+
+
+class TestReminders(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "reminders.json")
+        self.start = datetime(2024, 1, 8, 9, 0, tzinfo=timezone.utc)
+        self.statuses = {"alice": "on_time", "bob": "missing", "carol": "missing", "dave": "late"}
+        self.sent = []
+        self.failing = set()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def build_report(self):
+        group = GroupReport("developers", "Developers", self.start, self.start + timedelta(hours=24))
+        for i, (name, status) in enumerate(self.statuses.items()):
+            platform = "telegram" if name == "carol" else "discord"
+            group.rows.append(ReportRow(Member(platform, i, name), status))
+        return CheckinReport([group], self.start)
+
+    async def send(self, recipients, text, progress=None):
+        self.sent.append(sorted(r.label for r in recipients))
+        return [DeliveryResult(r, r.label not in self.failing) for r in recipients]
+
+    def make_reminders(self, interval=None):
+        return Reminders(JsonStateStore(self.path, delay=0.01), self.build_report, lambda group_key: self.start,
+                         self.send, lambda group_key: "Reminder: please check in", ["developers"],
+                         max_per_member=2, interval=interval)
+
+    def test_only_missing_members_up_to_the_limit(self):
+        async def scenario():
+            reminders = self.make_reminders()
+            self.failing = {"carol"}
+            first = await reminders.remind("developers")
+            self.failing = set()
+            await reminders.remind("developers")
+            third = await reminders.remind("developers")
+            await reminders.close()
+            # A restart keeps the counts; carol's failed send didn't use up a reminder
+            return first, third, await self.make_reminders().remind("developers")
+
+        first, third, after_restart = asyncio.run(scenario())
+        self.assertEqual(self.sent, [["bob", "carol"], ["bob", "carol"], ["carol"]])
+        self.assertEqual([r.ok for r in first[0]], [True, False])
+        self.assertEqual(third[1], 1)
+        self.assertEqual(after_restart, ([], 2))
+
+    def test_new_round_resets_the_limit(self):
+        async def scenario():
+            reminders = self.make_reminders()
+            for _ in range(3):
+                await reminders.remind("developers")
+            self.start += timedelta(days=7)
+            return await reminders.remind("developers")
+
+        results, capped = asyncio.run(scenario())
+        self.assertEqual((len(results), capped), (2, 0))
+        self.assertEqual(len(self.sent), 3)
+
+    def test_allowance_lasts_the_period_without_a_schedule(self):
+        members = [Member("discord", 1, "alice"), Member("discord", 2, "bob")]
+        journal = CheckinJournal(os.path.join(self.tmp.name, "journal.db"))
+        today = [datetime(2024, 1, 9, 12, 0)]
+
+        async def members_for(group_key):
+            return members if group_key == "developers" else []
+
+        reporter = CheckinReporter(journal, members_for, lambda group_key: None,
+                                   {"product_managers": "Product Managers", "developers": "Developers"},
+                                   periods=CheckinPeriods("weekly"), now=lambda: today[0].astimezone())
+        reminders = Reminders(JsonStateStore(self.path, delay=0.01), lambda: reporter.report(fresh=True),
+                              lambda group_key: None, self.send, lambda group_key: "Reminder", ["developers"],
+                              max_per_member=2)
+
+        async def scenario():
+            capped = []
+            # Tuesday to Friday, then the next Monday
+            for day in (9, 10, 11, 12, 15):
+                today[0] = datetime(2024, 1, day, 12, 0)
+                capped.append((await reminders.remind("developers"))[1])
+            return capped
+
+        try:
+            capped = asyncio.run(scenario())
+        finally:
+            journal.close()
+        self.assertEqual(capped, [0, 0, 2, 2, 0])
+        self.assertEqual(len(self.sent), 3)
+
+    def test_automatic_passes(self):
+        async def scenario():
+            reminders = self.make_reminders(interval=timedelta(hours=24))
+            for hours in (1, 23, 25, 30, 49, 100):
+                await reminders.tick(self.start + timedelta(hours=hours))
+            return reminders.passes("developers", self.start)
+
+        self.assertEqual(asyncio.run(scenario()), 2)
+        self.assertEqual(len(self.sent), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import asyncio
+import csv
+import io
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from fakes import FakeClock
+from journal import CheckinJournal
+from periods import CheckinPeriods
+from report import CheckinReporter, Member
+
+
+class TestCheckinReporter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        today = datetime.now().astimezone()
+        # The round went out at noon yesterday
+        self.start = datetime.combine(today.date() - timedelta(days=1), datetime.min.time().replace(hour=12)).astimezone()
+        self.clock = FakeClock()
+        self.journal = CheckinJournal(os.path.join(self.tmp.name, "journal.db"))
+
+    def tearDown(self):
+        self.journal.close()
+        self.tmp.cleanup()
+
+    def make_roster(self, size):
+        self.members = [Member("discord", 1, "@alice"), Member("telegram", 2, "Telegram @bob_tg"),
+                        Member("discord", 3, "@carol")]
+        self.members += [Member("discord", 100 + i, f"@user{i}") for i in range(size - 3)]
+
+    async def members_for(self, group_key):
+        return self.members if group_key == "developers" else []
+
+    def make_reporter(self, round_start=None, **kwargs):
+        kwargs.setdefault("periods", CheckinPeriods("daily"))
+        return CheckinReporter(self.journal, self.members_for, round_start or (lambda group_key: self.start),
+                               {"product_managers": "Product Managers", "developers": "Developers"},
+                               ttl=60, late_after=timedelta(hours=1), clock=self.clock, **kwargs)
+
+    async def answer(self, platform, user_id, name, period, text, received_at):
+        await self.journal.append(platform, user_id, "Developers", [name], name, period, text, received_at=received_at)
+
+    def run_report(self, size):
+        """alice answered on time, bob late, carol before the round went out, the rest never."""
+        self.make_roster(size)
+        reporter = self.make_reporter()
+        day = self.start.date().isoformat()
+
+        async def scenario():
+            start = self.start.timestamp()
+            await self.answer("discord", 3, "carol", day, "early", start - 600)
+            await self.answer("discord", 1, "alice", day, "hi", start + 600)
+            await self.answer("telegram", 2, "telegram:bob_tg", day, "sorry", start + 5 * 3600)
+            # Answered the round before, which doesn't count
+            await self.answer("discord", 100, "user0", "2000-01-01", "old", start - 2 * 86400)
+            return await reporter.report()
+
+        return asyncio.run(scenario())
+
+    def test_statuses(self):
+        report = self.run_report(5)
+        pm, dev = report.groups
+        self.assertEqual(pm.counts(), {"on_time": 0, "late": 0, "missing": 0})
+        statuses = {row.member.name: row.status for row in dev.rows}
+        self.assertEqual(statuses, {"@alice": "on_time", "Telegram @bob_tg": "late", "@carol": "on_time",
+                                    "@user0": "missing", "@user1": "missing"})
+        summary = report.summary()
+        self.assertIn("0/0 responded", summary[0])
+        self.assertIn("3/5 responded (1 late), 2 missing", summary[1])
+        self.assertEqual(summary[2], "Missing: @user0, @user1")
+
+    def test_without_a_round_counts_the_current_week(self):
+        self.make_roster(3)
+        wednesday = datetime(2024, 1, 10, 12, 0).astimezone()
+        reporter = self.make_reporter(lambda group_key: None, periods=CheckinPeriods("weekly"),
+                                      now=lambda: wednesday)
+
+        async def scenario():
+            await self.answer("telegram", 2, "telegram:bob_tg", "2024-01-01", "last week",
+                              datetime(2024, 1, 3).timestamp())
+            await self.answer("discord", 1, "alice", "2024-01-08", "this week", datetime(2024, 1, 8, 0, 30).timestamp())
+            return await reporter.report()
+
+        report = asyncio.run(scenario())
+        dev = report.group("developers")
+        self.assertEqual(dev.start, datetime(2024, 1, 8).astimezone())
+        statuses = {row.member.name: row.status for row in dev.rows}
+        self.assertEqual(statuses, {"@alice": "on_time", "Telegram @bob_tg": "missing", "@carol": "missing"})
+
+    def test_large_roster(self):
+        report = self.run_report(200)
+        self.assertEqual(report.groups[1].counts(), {"on_time": 2, "late": 1, "missing": 197})
+
+    def test_cached_and_shared(self):
+        self.make_roster(5)
+        reporter = self.make_reporter()
+
+        async def scenario():
+            first, second = await asyncio.gather(reporter.report(), reporter.report())
+            third = await reporter.report()
+            self.clock.now += 61
+            fourth = await reporter.report()
+            return first, second, third, fourth
+
+        first, second, third, fourth = asyncio.run(scenario())
+        self.assertIs(first, second)
+        self.assertIs(first, third)
+        self.assertIsNot(first, fourth)
+
+    def test_csv(self):
+        report = self.run_report(4)
+        rows = list(csv.DictReader(io.StringIO(report.to_csv())))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual((rows[1]["platform"], rows[1]["user_id"], rows[1]["status"]), ("telegram", "2", "late"))
+        self.assertTrue(rows[1]["first_response"].endswith("+00:00"))
+        self.assertEqual(rows[3]["first_response"], "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from broadcast import Recipient
+from scheduler import CheckinScheduler, CronSchedule
+from state_store import JsonStateStore
+
+
+class TestCronSchedule(unittest.TestCase):
+    def test_next_after(self):
+        cron = CronSchedule("0 9 * * 1")
+        # 2024-01-03 is a Wednesday
+        start = datetime(2024, 1, 3, 12, 0, tzinfo=timezone.utc)
+        self.assertEqual(cron.next_after(start), datetime(2024, 1, 8, 9, 0, tzinfo=timezone.utc))
+
+    def test_steps_lists_and_timezone(self):
+        cron = CronSchedule("*/30 8-9 * * 1-5")
+        tz = ZoneInfo("America/New_York")
+        start = datetime(2024, 3, 8, 9, 45, tzinfo=tz)
+        # Friday 09:45 -> next weekday is Monday, after the DST change
+        nxt = cron.next_after(start)
+        self.assertEqual((nxt.year, nxt.month, nxt.day, nxt.hour, nxt.minute), (2024, 3, 11, 8, 0))
+        self.assertEqual(nxt.utcoffset(), timedelta(hours=-4))
+
+    def test_invalid(self):
+        for expr in ("* * * *", "60 * * * *", "* 24 * * *", "* * * * 8"):
+            with self.assertRaises(ValueError):
+                CronSchedule(expr)
+
+
+class TestCheckinScheduler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "schedules.json")
+        self.recipients = [Recipient("discord", i, f"Discord {i}") for i in range(4)]
+        self.delivered = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_scheduler(self, fail_after=None):
+        async def deliver(recipient, text):
+            if fail_after is not None and len(self.delivered) >= fail_after:
+                raise asyncio.CancelledError()
+            self.delivered.append(recipient.address)
+            return True
+
+        return CheckinScheduler(JsonStateStore(self.path, delay=0.01, changelog=True), lambda g: self.recipients,
+                                lambda g: "hello", deliver)
+
+    def test_due_slot_and_missed_window(self):
+        scheduler = self.make_scheduler()
+        set_at = datetime(2024, 1, 8, 8, 0, tzinfo=timezone.utc)
+        scheduler.set_schedule("developers", "0 9 * * 1", "UTC", window_minutes=30, now=set_at)
+        self.assertIsNone(scheduler.due_slot("developers", set_at + timedelta(minutes=30)))
+        due = scheduler.due_slot("developers", set_at + timedelta(minutes=70))
+        self.assertEqual(due, datetime(2024, 1, 8, 9, 0, tzinfo=timezone.utc))
+        # Two hours late: the window has closed, so the slot is skipped
+        self.assertIsNone(scheduler.due_slot("developers", set_at + timedelta(hours=3)))
+        self.assertEqual(scheduler.schedules["developers"]["last_slot"], due.isoformat())
+
+    def test_never_firing_cron_is_rejected_before_saving(self):
+        scheduler = self.make_scheduler()
+        with self.assertRaises(ValueError):
+            scheduler.set_schedule("developers", "0 9 31 2 *", "UTC")
+        self.assertEqual(scheduler.schedules, {})
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_marks_are_appended_not_rewritten(self):
+        async def scenario():
+            scheduler = self.make_scheduler()
+            scheduler.schedules["developers"] = {"window_minutes": 0, "paused": False}
+            full_writes = []
+            original = scheduler.store._write
+
+            def write(full_text, changes):
+                full_writes.append(full_text is not None)
+                original(full_text, changes)
+
+            scheduler.store._write = write
+            scheduler.trigger("developers")
+            await scheduler._tasks["developers"]
+            return full_writes
+
+        full_writes = asyncio.run(scenario())
+        # The run record and the finished run; the four marks are appends
+        self.assertEqual(full_writes.count(True), 2)
+        self.assertEqual(full_writes.count(False), 4)
+        self.assertEqual(self.delivered, [0, 1, 2, 3])
+
+    def test_staggered_run_resumes_without_double_send(self):
+        async def first_process():
+            scheduler = self.make_scheduler(fail_after=2)
+            scheduler.schedules["developers"] = {"window_minutes": 0, "paused": False}
+            scheduler.trigger("developers")
+            try:
+                await scheduler._tasks["developers"]
+            except asyncio.CancelledError:
+                pass
+            await scheduler.store.flush()
+
+        async def second_process():
+            scheduler = self.make_scheduler()
+            await scheduler.tick()
+            await scheduler._tasks["developers"]
+            return scheduler
+
+        asyncio.run(first_process())
+        self.assertEqual(self.delivered, [0, 1])
+        scheduler = asyncio.run(second_process())
+        # Recipient 2 was marked before the crash, so only 3 is left
+        self.assertEqual(self.delivered, [0, 1, 3])
+        self.assertTrue(scheduler.schedules["developers"]["run"]["done"])
+
+    def test_spreads_over_window(self):
+        async def scenario():
+            scheduler = self.make_scheduler()
+            scheduler.schedules["developers"] = {"window_minutes": 0.01, "paused": False}
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            scheduler.trigger("developers")
+            await scheduler._tasks["developers"]
+            return loop.time() - start
+
+        elapsed = asyncio.run(scenario())
+        # Four recipients spread over 0.6s: the last one goes out ~0.45s in
+        self.assertGreater(elapsed, 0.35)
+        self.assertEqual(self.delivered, [0, 1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,346 @@
+import asyncio
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+
+import gspread
+from oauth2client.client import OAuth2Credentials
+
+import sheets
+from fakes import FakeClient, FakeClock, FakeSheetSession, FakeSpreadsheet, FakeWorksheet, QuotaResponse
+
+
+class FakeCredentials:
+    def __init__(self, expiry):
+        self.expiry = expiry
+        self.refreshes = 0
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+
+class TestSheetSession(unittest.TestCase):
+    def make_session(self, key=None, expiry=None):
+        self.spreadsheet = FakeSpreadsheet()
+        self.spreadsheet.add_tab("Developers")
+        self.spreadsheet.add_tab("Product Managers")
+        self.factory_credentials = FakeCredentials(None)
+        self.client = FakeClient(self.spreadsheet, FakeCredentials(expiry))
+        self.authorize_calls = 0
+
+        def authorize(creds):
+            self.authorize_calls += 1
+            return self.client
+
+        return sheets.SheetSession(spreadsheet_key=key, credentials_factory=lambda: self.factory_credentials,
+                                   authorize=authorize)
+
+    def test_worksheet_is_cached(self):
+        session = self.make_session(key="abc")
+        first = session.worksheet("Developers")
+        second = session.worksheet("Developers")
+        self.assertIs(first, second)
+        self.assertEqual(self.authorize_calls, 1)
+        self.assertEqual(self.spreadsheet.calls.counts["open_by_key"], 1)
+        self.assertEqual(self.spreadsheet.calls.counts["worksheet"], 1)
+
+    def test_open_by_name_only_once(self):
+        session = self.make_session()
+        session.worksheet("Developers")
+        session.invalidate()
+        session.worksheet("Developers")
+        self.assertEqual(self.spreadsheet.calls.counts["open"], 1)
+        self.assertEqual(self.spreadsheet.calls.counts["open_by_key"], 1)
+
+    def test_invalidate_tab_reopens(self):
+        session = self.make_session(key="abc")
+        session.worksheet("Developers")
+        session.invalidate("Developers")
+        session.worksheet("Developers")
+        self.assertEqual(self.spreadsheet.calls.counts["worksheet"], 2)
+        self.assertEqual(self.spreadsheet.calls.counts["open_by_key"], 1)
+
+    def test_token_expiry_margin(self):
+        session = self.make_session(key="abc", expiry=datetime.utcnow() + timedelta(minutes=2))
+        session.client()
+        self.assertTrue(session.token_expires_soon())
+        session = self.make_session(key="abc", expiry=datetime.utcnow() + timedelta(hours=1))
+        session.client()
+        self.assertFalse(session.token_expires_soon())
+        self.assertFalse(session.refresh_token())
+
+    def test_no_token_yet_is_not_refreshed(self):
+        session = self.make_session(key="abc")
+        session.client()
+        self.assertFalse(session.token_expires_soon())
+        self.assertFalse(session.refresh_token())
+        self.assertEqual(self.client.http_client.auth.refreshes, 0)
+
+    def test_refreshes_the_credentials_gspread_signs_with(self):
+        creds = OAuth2Credentials("old-token", "client-id", "secret", "refresh-token",
+                                  datetime.utcnow() + timedelta(minutes=2), "https://oauth2.googleapis.com/token", "bot")
+        session = sheets.SheetSession(spreadsheet_key="abc", credentials_factory=lambda: creds)
+        auth = session.client().http_client.auth
+        self.assertIsNot(auth, creds)
+        # As after the first request fetched a token
+        auth.expiry = datetime.utcnow() + timedelta(minutes=2)
+        refreshed = []
+        auth.refresh = refreshed.append
+        self.assertTrue(session.refresh_token())
+        self.assertEqual(len(refreshed), 1)
+
+
+class ThreadRecordingWorksheet(FakeWorksheet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = set()
+
+    def _call(self, name):
+        self.threads.add(threading.current_thread().name)
+        super()._call(name)
+
+
+def session_for(sheet):
+    spreadsheet = FakeSpreadsheet()
+    spreadsheet.tabs["Developers"] = sheet
+    return FakeSheetSession(spreadsheet)
+
+
+class TestSheetsIO(unittest.TestCase):
+    def test_calls_run_off_the_event_loop(self):
+        sheet = ThreadRecordingWorksheet("Developers", {(1, 1): "Name"}, latency=0.2)
+        io = sheets.SheetsIO(session_for(sheet), max_workers=4)
+
+        async def scenario():
+            start = time.monotonic()
+            results = await asyncio.gather(*(io.get_all_values("Developers") for _ in range(4)))
+            return results, time.monotonic() - start
+
+        results, elapsed = asyncio.run(scenario())
+        io.shutdown()
+        self.assertEqual(results, [[["Name"]]] * 4)
+        # Four 0.2s calls in parallel, not 0.8s in sequence
+        self.assertLess(elapsed, 0.6)
+        self.assertTrue(all(name.startswith("sheets-io") for name in sheet.threads))
+
+    def test_call_timeout(self):
+        io = sheets.SheetsIO(session_for(FakeWorksheet("Developers", latency=0.5)), max_workers=1, timeout=0.05)
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(io.get_all_values("Developers"))
+        io.shutdown()
+
+
+class QuotaWorksheet:
+    """Fails the first `failures` calls with a 429, then records call order."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    def col_values(self, col):
+        if self.failures:
+            self.failures -= 1
+            raise gspread.exceptions.APIError(QuotaResponse())
+        self.calls.append(col)
+        return []
+
+
+class TestSheetsQuota(unittest.TestCase):
+    def test_token_bucket(self):
+        clock = FakeClock()
+        bucket = sheets.TokenBucket(per_minute=60, burst=2, clock=clock)
+        for _ in range(2):
+            self.assertEqual(bucket.wait_time(), 0)
+            bucket.take()
+        self.assertAlmostEqual(bucket.wait_time(), 1.0)
+        clock.now = 0.5
+        self.assertAlmostEqual(bucket.wait_time(), 0.5)
+        clock.now = 10
+        self.assertEqual(bucket.wait_time(), 0)
+        # Refill stops at the burst size
+        self.assertEqual(bucket.tokens, 2)
+
+    def test_share(self):
+        quota = sheets.SheetsQuota(reads_per_minute=60, writes_per_minute=40, burst=10).share(0.25)
+        self.assertEqual((quota.buckets["read"].per_minute, quota.buckets["write"].per_minute), (15, 10))
+        self.assertEqual(quota.buckets["read"].capacity, 2)
+        # No limit stays no limit
+        self.assertEqual(sheets.SheetsQuota(reads_per_minute=0).share(0.5).buckets["read"].per_minute, 0)
+
+    def test_user_calls_go_before_background(self):
+        sheet = QuotaWorksheet()
+        io = sheets.SheetsIO(session_for(sheet), max_workers=1,
+                             quota=sheets.SheetsQuota(reads_per_minute=600, burst=1))
+
+        async def scenario():
+            await io.col_values("Developers", 0)
+            # The bucket is empty now: queue background work first, then a user call
+            background = [asyncio.create_task(io.col_values("Developers", i, priority=sheets.PRIORITY_BACKGROUND))
+                          for i in (1, 2)]
+            await asyncio.sleep(0)
+            user = asyncio.create_task(io.col_values("Developers", 3))
+            await asyncio.gather(*background, user)
+
+        try:
+            asyncio.run(scenario())
+        finally:
+            io.shutdown()
+        self.assertEqual(sheet.calls, [0, 3, 1, 2])
+
+    def test_quota_error_pauses_every_caller(self):
+        sheet = QuotaWorksheet(failures=1)
+        quota = sheets.SheetsQuota(reads_per_minute=6000, burst=10)
+        io = sheets.SheetsIO(session_for(sheet), max_workers=1, quota=quota)
+        pauses = []
+        original = quota.backoff
+
+        def short_backoff(kind, exc=None):
+            pauses.append(original(kind, exc))
+            # Keep the test fast: shorten the pause that was just set
+            quota._paused_until[kind] = quota.clock() + 0.2
+            return 0.2
+
+        quota.backoff = short_backoff
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            first = asyncio.create_task(io.col_values("Developers", 1))
+            await asyncio.sleep(0.05)
+            # Arrives while the first call is backing off and has to wait out the same pause
+            second = asyncio.create_task(io.col_values("Developers", 2))
+            await asyncio.gather(first, second)
+            return loop.time() - start
+
+        try:
+            elapsed = asyncio.run(scenario())
+        finally:
+            io.shutdown()
+        self.assertEqual(len(pauses), 1)
+        self.assertTrue(0.5 <= pauses[0] <= 1.0)
+        self.assertEqual(sorted(sheet.calls), [1, 2])
+        self.assertGreaterEqual(elapsed, 0.2)
+
+    def test_gives_up_after_retries(self):
+        sheet = QuotaWorksheet(failures=10)
+        quota = sheets.SheetsQuota(reads_per_minute=6000, burst=10)
+        quota.backoff = lambda kind, exc=None: 0
+        io = sheets.SheetsIO(session_for(sheet), max_workers=1, quota=quota, quota_retries=2)
+        try:
+            with self.assertRaises(gspread.exceptions.APIError):
+                asyncio.run(io.col_values("Developers", 1))
+        finally:
+            io.shutdown()
+        self.assertEqual(sheet.failures, 7)
+
+
+class TestTabIndex(unittest.TestCase):
+    def make_index(self):
+        names = ["Name", "alice#0", "bob#1234", "", "telegram:carol"]
+        header = ["Name", "2024-01-01", "2024-01-08"]
+        return sheets.TabIndex("Developers", names, header)
+
+    def test_lookup(self):
+        index = self.make_index()
+        self.assertEqual(index.find_row("alice"), 2)
+        self.assertEqual(index.find_row("bob#1234", "bob"), 3)
+        self.assertEqual(index.find_row("telegram:carol"), 5)
+        self.assertIsNone(index.find_row("dave"))
+        self.assertEqual(index.find_column("2024-01-08"), 3)
+        self.assertIsNone(index.find_column("2024-01-15"))
+
+    def test_append_updates_in_place(self):
+        index = self.make_index()
+        self.assertEqual(index.add_row("dave"), 6)
+        self.assertEqual(index.find_row("dave"), 6)
+        self.assertEqual(index.add_column("2024-01-15"), 4)
+        self.assertEqual(index.find_column("2024-01-15"), 4)
+        self.assertIn(4, index.loaded_columns)
+        self.assertEqual(index.get_cell(6, 4), "")
+
+    def test_cell_cache(self):
+        index = self.make_index()
+        index.load_column(2, ["2024-01-01", "did things"])
+        self.assertEqual(index.get_cell(2, 2), "did things")
+        index.set_cell(2, 2, "did things\nmore")
+        self.assertEqual(index.get_cell(2, 2), "did things\nmore")
+
+    def test_same_layout(self):
+        self.assertTrue(self.make_index().same_layout(self.make_index()))
+        changed = self.make_index()
+        changed.add_row("erin")
+        self.assertFalse(self.make_index().same_layout(changed))
+
+
+class TestTabWriter(unittest.TestCase):
+    def run_writes(self, sheet, writes, **kwargs):
+        io = sheets.SheetsIO(session_for(sheet), max_workers=2)
+        index = sheets.SheetIndex(io)
+        writer = sheets.TabWriter("Developers", io, index, **kwargs)
+
+        async def scenario():
+            results = await asyncio.gather(*(writer.submit(*w) for w in writes), return_exceptions=True)
+            await writer.close()
+            return results
+
+        try:
+            return asyncio.run(scenario())
+        finally:
+            io.shutdown()
+
+    def test_concurrent_new_users_get_distinct_rows(self):
+        sheet = FakeWorksheet("Developers", {(1, 1): "Name", (2, 1): "alice", (1, 2): "2024-01-01"})
+        writes = [(["alice"], "alice", "2024-01-01", "one"),
+                  (["bob"], "bob", "2024-01-01", "two"),
+                  (["carol"], "carol", "2024-01-01", "three"),
+                  (["alice"], "alice", "2024-01-01", "four")]
+        results = self.run_writes(sheet, writes, flush_interval=0.05)
+        self.assertEqual(results, [(2, 2), (3, 2), (4, 2), (2, 2)])
+        self.assertEqual(sheet.cells[(2, 2)], "one\nfour")
+        self.assertEqual(sheet.cells[(3, 1)], "bob")
+        self.assertEqual(sheet.cells[(4, 1)], "carol")
+        self.assertEqual(sheet.calls.counts["batch_update"], 1)
+
+    def test_new_period_column(self):
+        sheet = FakeWorksheet("Developers", {(1, 1): "Name", (2, 1): "alice", (1, 2): "2024-01-01"})
+        results = self.run_writes(sheet, [(["alice"], "alice", "2024-01-08", "hi")], flush_interval=0.01)
+        self.assertEqual(results, [(2, 3)])
+        self.assertEqual(sheet.cells[(1, 3)], "2024-01-08")
+        self.assertEqual(sheet.cells[(2, 3)], "hi")
+
+    def test_reads_only_the_cells_it_appends_to(self):
+        cells = {(1, 1): "Name", (1, 2): "2024-01-01", (1, 3): "2024-01-08"}
+        for row in range(2, 202):
+            cells[(row, 1)] = f"user{row}"
+            cells[(row, 2)] = "last week"
+        cells[(5, 3)] = "earlier today"
+        sheet = FakeWorksheet("Developers", cells)
+        writes = [(["user5"], "user5", "2024-01-08", "more"), (["user6"], "user6", "2024-01-08", "hi"),
+                  (["new"], "new", "2024-01-08", "hello")]
+        self.run_writes(sheet, writes, flush_interval=0.05)
+        # One read for the index (column A and row 1), one for the free slot and the two target cells
+        self.assertEqual(sheet.calls.snapshot(), {"batch_get": 2, "batch_update": 1})
+        self.assertEqual(sheet.cells[(5, 3)], "earlier today\nmore")
+        self.assertEqual(sheet.cells[(6, 3)], "hi")
+        self.assertEqual(sheet.cells[(202, 1)], "new")
+
+    def test_replace_overwrites_without_reading_the_cell(self):
+        sheet = FakeWorksheet("Developers", {(1, 1): "Name", (1, 2): "2024-01-08", (2, 1): "alice",
+                                             (2, 2): "edited by hand"})
+        results = self.run_writes(sheet, [(["alice"], "alice", "2024-01-08", "one\ntwo", True)], flush_interval=0.01)
+        self.assertEqual(results, [(2, 2)])
+        self.assertEqual(sheet.cells[(2, 2)], "one\ntwo")
+        # Only the index was read
+        self.assertEqual(sheet.calls.snapshot(), {"batch_get": 1, "batch_update": 1})
+
+    def test_size_trigger(self):
+        sheet = FakeWorksheet("Developers", {(1, 1): "Name", (1, 2): "2024-01-01"})
+        writes = [([f"user{i}"], f"user{i}", "2024-01-01", "x") for i in range(4)]
+        self.run_writes(sheet, writes, flush_interval=10, max_batch=2)
+        self.assertEqual(sheet.calls.counts["batch_update"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
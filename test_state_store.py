@@ -0,0 +1,217 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from state_store import JsonStateStore, StateWatcher, apply_change
+
+
+class TestJsonStateStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "state.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def test_save_without_loop_writes_immediately(self):
+        store = JsonStateStore(self.path)
+        store.save({"users": [1]})
+        self.assertEqual(self.read(), {"users": [1]})
+        self.assertEqual(os.listdir(self.tmp.name), ["state.json"])
+
+    def test_debounced_writes_coalesce(self):
+        store = JsonStateStore(self.path, delay=0.05)
+        writes = []
+        original = store._write
+
+        def counting_write(full_text, changes):
+            writes.append(full_text)
+            original(full_text, changes)
+
+        store._write = counting_write
+
+        async def scenario():
+            data = {"users": []}
+            for i in range(20):
+                data["users"].append(i)
+                store.save(data)
+            self.assertFalse(os.path.exists(self.path))
+            await asyncio.sleep(0.2)
+
+        asyncio.run(scenario())
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(self.read(), {"users": list(range(20))})
+
+    def test_changelog_replay_and_compaction(self):
+        store = JsonStateStore(self.path, changelog=True, compact_after=3)
+        data = {"devs": {"discord": []}}
+        store.save(data)
+        for user_id in (1, 2):
+            data["devs"]["discord"].append(user_id)
+            store.save(data, {"op": "append", "path": ["devs", "discord"], "value": user_id})
+        # Base file untouched, edits only in the log
+        self.assertEqual(self.read(), {"devs": {"discord": []}})
+        reloaded = JsonStateStore(self.path, changelog=True).load({})
+        self.assertEqual(reloaded, {"devs": {"discord": [1, 2]}})
+
+        data["devs"]["discord"].remove(1)
+        store.save(data, {"op": "remove", "path": ["devs", "discord"], "value": 1})
+        # Third record triggers a full rewrite and drops the log
+        self.assertEqual(self.read(), {"devs": {"discord": [2]}})
+        self.assertFalse(os.path.exists(self.path + ".log"))
+
+    def test_idle_compaction(self):
+        store = JsonStateStore(self.path, delay=0.01, changelog=True, compact_idle=0.1)
+
+        async def scenario():
+            data = {"a": []}
+            store.save(data)
+            await store.flush()
+            for i in range(3):
+                data["a"].append(i)
+                store.save(data, {"op": "append", "path": ["a"], "value": i})
+            await asyncio.sleep(0.05)
+            logged = os.path.exists(self.path + ".log")
+            await asyncio.sleep(0.2)
+            return logged
+
+        self.assertTrue(asyncio.run(scenario()))
+        self.assertEqual(self.read(), {"a": [0, 1, 2]})
+        self.assertFalse(os.path.exists(self.path + ".log"))
+
+    def test_log_older_than_the_file_is_not_replayed(self):
+        store = JsonStateStore(self.path, changelog=True, compact_idle=None)
+        data = {"a": [1]}
+        store.save(data)
+        data["a"].append(2)
+        store.save(data, {"op": "append", "path": ["a"], "value": 2})
+        # Edited by hand after the log was written
+        with open(self.path, "w") as f:
+            f.write('{"a": []}')
+        st = os.stat(self.path)
+        os.utime(self.path + ".log", ns=(st.st_atime_ns, st.st_mtime_ns - 1_000_000_000))
+        data = store.load({})
+        self.assertEqual(data, {"a": []})
+        self.assertEqual(JsonStateStore(self.path, changelog=True).load({}), {"a": []})
+
+        # The next change starts a new log instead of adding to the stale one
+        data["a"].append(3)
+        store.save(data, {"op": "append", "path": ["a"], "value": 3})
+        self.assertEqual(JsonStateStore(self.path, changelog=True).load({}), {"a": [3]})
+
+    def test_flush(self):
+        store = JsonStateStore(self.path, delay=60)
+
+        async def scenario():
+            store.save({"a": 1})
+            await store.flush()
+
+        asyncio.run(scenario())
+        self.assertEqual(self.read(), {"a": 1})
+
+    def test_stamp_changes_on_write(self):
+        store = JsonStateStore(self.path, changelog=True)
+        self.assertEqual(store.stamp(), (None, None))
+        store.save({"a": []})
+        written = store.stamp()
+        self.assertIsNotNone(written[0])
+        # Another process appending a change record
+        JsonStateStore(self.path, changelog=True).save({"a": [1]}, {"op": "append", "path": ["a"], "value": 1})
+        self.assertNotEqual(store.stamp(), written)
+        self.assertEqual(store.load({}), {"a": [1]})
+
+
+class TestStateWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "state.json")
+        self.store = JsonStateStore(self.path, delay=60)
+        self.store.save({"users": [1]})
+        self.live = {"users": [1]}
+        self.watcher = StateWatcher()
+        self.watcher.watch(self.store, self.load, self.live.update)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def load(self):
+        data = self.store.load({})
+        if not isinstance(data.get("users"), list):
+            raise ValueError("users must be a list")
+        return data
+
+    def edit(self, text):
+        with open(self.path, "w") as f:
+            f.write(text)
+        # Make sure the stamp moves even on coarse mtime clocks
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    def test_reloads_external_edits_and_rejects_malformed_ones(self):
+        async def scenario():
+            # Our own write is not a change
+            self.assertEqual(await self.watcher.check(), [])
+            self.edit('{"users": [1, 2]}')
+            self.assertEqual(await self.watcher.check(), [self.path])
+            self.assertEqual(self.live, {"users": [1, 2]})
+            self.assertEqual(await self.watcher.check(), [])
+
+            self.edit('{"users": 3}')
+            self.assertEqual(await self.watcher.check(), [])
+            self.edit('{"users": [1, 2')
+            self.assertEqual(await self.watcher.check(), [])
+            self.assertEqual(self.live, {"users": [1, 2]})
+
+        asyncio.run(scenario())
+
+    def test_leaves_files_with_unsaved_changes_alone(self):
+        async def scenario():
+            self.edit('{"users": [5]}')
+            self.store.save({"users": [1, 4]})
+            self.assertEqual(await self.watcher.check(), [])
+            await self.store.flush()
+            self.assertEqual(await self.watcher.check(), [])
+
+        asyncio.run(scenario())
+        self.assertEqual(self.live, {"users": [1]})
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), {"users": [1, 4]})
+
+
+    def test_reload_ignores_the_log_under_an_edit(self):
+        store = JsonStateStore(self.path, delay=60, changelog=True, compact_idle=None)
+        live = {}
+        watcher = StateWatcher()
+        watcher.watch(store, lambda: store.load({}), live.update)
+
+        async def scenario():
+            store.save({"users": [1]})
+            await store.flush()
+            store.save({"users": [1, 2]}, {"op": "append", "path": ["users"], "value": 2})
+            await store.flush()
+            # The operator replaces the list; replaying the log would add user 2 back
+            self.edit('{"users": [3]}')
+            return await watcher.check()
+
+        self.assertEqual(asyncio.run(scenario()), [self.path])
+        self.assertEqual(live, {"users": [3]})
+
+
+class TestApplyChange(unittest.TestCase):
+    def test_ops(self):
+        data = {"g": {"telegram": [{"id": 1, "username": "a"}, {"id": 2, "username": "b"}]}}
+        apply_change(data, {"op": "remove", "path": ["g", "telegram"], "match": {"id": 1}})
+        apply_change(data, {"op": "set", "path": ["users", "5"], "value": "e"})
+        self.assertEqual(data, {"g": {"telegram": [{"id": 2, "username": "b"}]}, "users": {"5": "e"}})
+        with self.assertRaises(ValueError):
+            apply_change(data, {"op": "explode", "path": ["g"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
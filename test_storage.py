@@ -0,0 +1,18 @@
+import inspect
+import unittest
+
+from journal import CheckinJournal
+from storage import CheckinStore
+
+
+class TestCheckinStore(unittest.TestCase):
+    def test_journal_implements_the_whole_interface(self):
+        self.assertTrue(issubclass(CheckinJournal, CheckinStore))
+        for name, method in inspect.getmembers(CheckinStore, inspect.isfunction):
+            implementation = getattr(CheckinJournal, name)
+            self.assertIsNot(implementation, method, name)
+            self.assertEqual(inspect.iscoroutinefunction(implementation), inspect.iscoroutinefunction(method), name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import asyncio
+import unittest
+
+from aiohttp import ClientSession
+
+from telegram_webhook import TelegramWebhook
+
+SECRET = "s3cret"
+
+
+def message_update(update_id, user_id, text):
+    user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+    return {"update_id": update_id, "message": {"message_id": update_id, "date": 0, "text": text, "from": user,
+                                                "chat": {"id": user_id, "type": "private"}}}
+
+
+class FakeApplication:
+    """Records the updates it is asked to process, with how many ran at once."""
+
+    def __init__(self, delay=0.02, failures=0):
+        self.bot = None
+        self.delay = delay
+        self.failures = failures
+        self.processed = []
+        self.running = 0
+        self.max_running = 0
+
+    async def process_update(self, update):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("handler blew up")
+            self.processed.append((update.effective_user.id, update.message.text))
+        finally:
+            self.running -= 1
+
+
+class TestTelegramWebhook(unittest.TestCase):
+    def run_posts(self, app, updates, secret=SECRET, concurrency=2):
+        """POST the updates concurrently, like Telegram with several connections. Returns the statuses."""
+        async def scenario():
+            webhook = TelegramWebhook(app, SECRET, port=0, concurrency=concurrency)
+            await webhook.start()
+            port = webhook._runner.addresses[0][1]
+            try:
+                async with ClientSession() as session:
+                    async def post(update, stagger):
+                        # Arrive in order, but while earlier updates are still being handled
+                        await asyncio.sleep(stagger)
+                        async with session.post(f"http://127.0.0.1:{port}/telegram", json=update,
+                                                headers={"X-Telegram-Bot-Api-Secret-Token": secret}) as response:
+                            return response.status
+
+                    statuses = []
+                    for batch in updates:
+                        statuses += await asyncio.gather(*(post(update, i * 0.002) for i, update in enumerate(batch)))
+                    return statuses
+            finally:
+                await webhook.stop()
+
+        return asyncio.run(scenario())
+
+    def test_bounded_and_ordered_per_user(self):
+        app = FakeApplication()
+        updates = [message_update(i, 10 + i % 3, f"part {i // 3}") for i in range(9)]
+        statuses = self.run_posts(app, [updates])
+        self.assertEqual(statuses, [200] * 9)
+        self.assertEqual(app.max_running, 2)
+        for user_id in (10, 11, 12):
+            self.assertEqual([text for uid, text in app.processed if uid == user_id], ["part 0", "part 1", "part 2"])
+
+    def test_rejects_bad_secret(self):
+        app = FakeApplication()
+        self.assertEqual(self.run_posts(app, [[message_update(1, 10, "hi")]], secret="wrong"), [403])
+        self.assertEqual(app.processed, [])
+
+    def test_redelivery(self):
+        app = FakeApplication(failures=1)
+        update = message_update(1, 10, "hi")
+        # A failed update is left for Telegram to resend; one that went through is only handled once
+        self.assertEqual(self.run_posts(app, [[update], [update], [update]]), [500, 200, 200])
+        self.assertEqual(app.processed, [(10, "hi")])
+
+
+if __name__ == "__main__":
+    unittest.main()